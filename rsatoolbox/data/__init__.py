@@ -5,9 +5,12 @@ from .dataset import dataset_from_dict
 from .dataset import merge_subsets
 from .computations import average_dataset
 from .computations import average_dataset_by
+from .computations import group_means
 from .noise import cov_from_residuals
 from .noise import prec_from_residuals
 from .noise import cov_from_measurements
 from .noise import prec_from_measurements
 from .noise import cov_from_unbalanced
 from .noise import prec_from_unbalanced
+from .noise import NoiseModel
+from .noise import get_noise_model
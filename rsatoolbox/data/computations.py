@@ -5,6 +5,7 @@ Dataset computations
 """
 
 import numpy as np
+from scipy.sparse import csr_matrix
 from rsatoolbox.util.data_utils import get_unique_inverse
 
 
@@ -31,13 +32,67 @@ def average_dataset_by(dataset, by):
 
     Returns:
         numpy.ndarray: average: average activation vector
+        numpy.ndarray: values: unique descriptor values
+        numpy.ndarray: n_obs: number of observations per value
     """
-    unique_values, inverse = get_unique_inverse(dataset.obs_descriptors[by])
-    average = np.nan * np.empty(
-        (len(unique_values), dataset.measurements.shape[1]))
-    n_obs = np.nan * np.empty(len(unique_values))
-    for i_v, _ in enumerate(unique_values):
-        measurements = dataset.measurements[inverse == i_v, :]
-        average[i_v] = np.mean(measurements, axis=0)
-        n_obs[i_v] = measurements.shape[0]
-    return average, unique_values, n_obs
+    return group_means(dataset, by)
+
+
+def group_means(dataset, by, weights=None, sum_sq=False):
+    """
+    computes the (weighted) mean of the measurements for each value of an
+    obs_descriptor in a single pass over the data.
+
+    The group sums are computed as one product of a sparse
+    n_group x n_obs indicator matrix with the measurements. Measurements
+    with more than two dimensions (e.g. from a TemporalDataset) are
+    averaged over the first axis only.
+
+    Args:
+        dataset(rsatoolbox.data.Dataset): the dataset to operate on
+        by(String): which obs_descriptor to split by
+        weights(numpy.ndarray): optional weight for each observation
+            defaults to equal weights
+        sum_sq(bool): whether to also return the per-group sums of
+            squared deviations from the group means
+
+    Returns:
+        numpy.ndarray: means: n_group x n_channel (x ...) group means
+        numpy.ndarray: values: unique descriptor values in order of
+            first occurrence
+        numpy.ndarray: counts: number of observations per group
+        numpy.ndarray: sum_sq: n_group x n_channel (x ...) weighted
+            sum of squared deviations from the group means,
+            only returned if sum_sq is True
+
+    """
+    values, inverse = get_unique_inverse(dataset.obs_descriptors[by])
+    measurements = dataset.measurements
+    n_obs = measurements.shape[0]
+    n_group = len(values)
+    counts = np.bincount(inverse, minlength=n_group)
+    if weights is None:
+        weights = np.ones(n_obs)
+        weight_sum = counts
+    else:
+        weights = np.asarray(weights, dtype=float)
+        weight_sum = np.bincount(inverse, weights=weights,
+                                 minlength=n_group)
+    indicator = _group_indicator(inverse, n_group, weights)
+    shape = (n_group,) + measurements.shape[1:]
+    flat = measurements.reshape(n_obs, -1)
+    means = (indicator @ flat) / weight_sum[:, None]
+    if sum_sq:
+        residuals = flat - means[inverse]
+        sums = (indicator @ residuals ** 2).reshape(shape)
+        return means.reshape(shape), values, counts, sums
+    return means.reshape(shape), values, counts
+
+
+def _group_indicator(inverse, n_group, weights):
+    """ sparse n_group x n_obs matrix which contains the weight of each
+    observation in the row of its group
+    """
+    n_obs = len(inverse)
+    return csr_matrix((weights, (inverse, np.arange(n_obs))),
+                      shape=(n_group, n_obs))
@@ -628,6 +628,50 @@ class TemporalDataset(Dataset):
             time_descriptors=time_descriptors)
         return dataset
 
+    def sliding_window(self, width, step=1, by='time'):
+        """ Returns an object TemporalDataset with data averaged in
+        sliding windows along time.
+
+        The window means are computed from prefix sums along the time axis,
+        such that each window costs O(1) per sample independent of width.
+
+        Args:
+            width(int): number of time-points in each window
+            step(int): number of time-points between window starts
+            by(String): the time_descriptor to average within windows
+
+        Returns:
+            a single TemporalDataset object
+                Data is averaged within each window.
+                The by descriptor and all other numeric time_descriptors
+                are set to their average within the window, other
+                descriptors to their value at the window start.
+        """
+        width = int(width)
+        step = int(step)
+        if width < 1 or width > self.n_time:
+            raise ValueError(
+                'width must be between 1 and the number of time-points')
+        if step < 1:
+            raise ValueError('step must be a positive integer')
+        starts = np.arange(0, self.n_time - width + 1, step)
+        windowed_measurements = _window_means(
+            self.measurements, starts, width)
+        time_descriptors = {}
+        for key, value in self.time_descriptors.items():
+            value = np.asarray(value)
+            if key == by or np.issubdtype(value.dtype, np.number):
+                time_descriptors[key] = _window_means(value, starts, width)
+            else:
+                time_descriptors[key] = value[starts]
+        dataset = TemporalDataset(
+            measurements=windowed_measurements,
+            descriptors=self.descriptors,
+            obs_descriptors=self.obs_descriptors,
+            channel_descriptors=self.channel_descriptors,
+            time_descriptors=time_descriptors)
+        return dataset
+
     def subset_obs(self, by, value):
         """ Returns a subsetted TemporalDataset defined by certain obs value
 
@@ -899,3 +943,21 @@ def merge_subsets(dataset_list):
                              obs_descriptors=obs_descriptors,
                              channel_descriptors=channel_descriptors)
     return merged_dataset
+
+
+def _window_means(values, starts, width):
+    """ averages values along the last axis in windows of width samples
+    beginning at starts, using prefix sums along that axis
+
+    Args:
+        values (numpy.ndarray): array with time as last axis
+        starts (numpy.ndarray): first sample of each window
+        width (int): number of samples per window
+
+    Returns:
+        numpy.ndarray: window means with len(starts) entries in the last axis
+    """
+    values = np.asarray(values, dtype=np.float64)
+    cumsum = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+    np.cumsum(values, axis=-1, out=cumsum[..., 1:])
+    return (cumsum[..., starts + width] - cumsum[..., starts]) / width
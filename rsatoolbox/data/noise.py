@@ -6,9 +6,11 @@ either the residuals (temporal based precision matrix) or of the measurements
 (instance based precision matrix)
 """
 
+from collections import OrderedDict
 from collections.abc import Iterable
+import hashlib
 import numpy as np
-from rsatoolbox.data import average_dataset_by
+from rsatoolbox.data import group_means
 from rsatoolbox.util.data_utils import get_unique_inverse
 
 
@@ -409,10 +411,9 @@ def cov_from_unbalanced(dataset, obs_desc, dof=None, method='shrinkage_diag'):
         assert "Dataset" in str(type(dataset)), "Provided object is not a dataset"
         assert obs_desc in dataset.obs_descriptors.keys(), \
             "obs_desc not contained in the dataset's obs_descriptors"
-        matrix = dataset.measurements
-        means, values, _ = average_dataset_by(dataset, obs_desc)
-        values, inverse = get_unique_inverse(dataset.obs_descriptors[obs_desc])
-        matrix -= means[inverse]
+        means, values, _ = group_means(dataset, obs_desc)
+        _, inverse = get_unique_inverse(dataset.obs_descriptors[obs_desc])
+        matrix = dataset.measurements - means[inverse]
         # calculate sample covariance matrix s
         if dof is None:
             dof = matrix.shape[0] - len(values)
@@ -454,3 +455,223 @@ def prec_from_unbalanced(dataset, obs_desc, dof=None, method='shrinkage_diag'):
     else:
         prec = np.linalg.inv(cov)
     return prec
+
+
+class NoiseModel:
+    """
+    Precision matrix with a factorization that is computed only once.
+
+    The factor W fulfills W @ W.T = precision, such that
+    x @ precision @ y.T = whiten(x) @ whiten(y).T. Mahalanobis and
+    crossnobis distances can thus be computed as euclidean distances
+    between whitened measurements. The Cholesky factor is used if the
+    precision is positive definite, otherwise the factor is derived
+    from an eigendecomposition.
+
+    Besides dense matrices, the precision can be diagonal, i.e. passed as
+    a vector, or diagonal plus low rank, i.e.
+    precision = diag(precision) + U @ S @ U.T for a vector precision, an
+    n_channel x k matrix U and a k x k matrix (or vector of diagonal
+    entries) S. For these structured precisions the dense n_channel x
+    n_channel matrix is never formed; whitening and inversion only use
+    k x k matrices (Woodbury identity). A noise covariance of the same
+    structure can be converted with NoiseModel(diag, U, S).inverse().
+
+    Args:
+        precision (numpy.ndarray): n_channel x n_channel precision matrix
+            or vector of n_channel diagonal entries
+        U (numpy.ndarray): n_channel x k low rank component
+        S (numpy.ndarray): k x k matrix or vector of k diagonal entries
+
+    """
+
+    def __init__(self, precision, U=None, S=None):
+        precision = np.asarray(precision)
+        if precision.ndim == 2:
+            if precision.shape[0] != precision.shape[1]:
+                raise ValueError('precision must be a square matrix')
+            if U is not None:
+                raise ValueError(
+                    'a low rank component requires a diagonal precision')
+            self.diag = None
+            self._precision = precision
+        elif precision.ndim == 1:
+            self.diag = precision
+            self._precision = None
+        else:
+            raise ValueError('precision must be a square matrix or a vector')
+        self.n_channel = precision.shape[0]
+        if U is not None:
+            U = np.asarray(U)
+            if U.ndim == 1:
+                U = U[:, None]
+            if S is None:
+                S = np.eye(U.shape[1])
+            S = np.asarray(S)
+            if S.ndim < 2:
+                S = np.diag(np.broadcast_to(S, (U.shape[1],)))
+            if U.shape[0] != self.n_channel or \
+                    S.shape != (U.shape[1], U.shape[1]):
+                raise ValueError('U must be n_channel x k and S k x k')
+        self.U = U
+        self.S = S
+        self._factor = None
+        self._whitener = None
+
+    @property
+    def structured(self):
+        """ whether the precision is diagonal or diagonal plus low rank """
+        return self._precision is None
+
+    @property
+    def precision(self):
+        """ dense n_channel x n_channel precision matrix. For structured
+        precisions this forms the dense matrix.
+        """
+        if self._precision is not None:
+            return self._precision
+        precision = np.diag(self.diag)
+        if self.U is not None:
+            precision = precision + self.U @ self.S @ self.U.T
+        return precision
+
+    @property
+    def factor(self):
+        """ n_channel x n_channel matrix W with W @ W.T = precision """
+        if self._factor is None:
+            if self.structured:
+                self._factor = self.whiten(np.eye(self.n_channel))
+                return self._factor
+            try:
+                self._factor = np.linalg.cholesky(self.precision)
+            except np.linalg.LinAlgError:
+                eigval, eigvec = np.linalg.eigh(
+                    (self.precision + self.precision.T) / 2)
+                self._factor = eigvec * np.sqrt(np.maximum(eigval, 0))
+        return self._factor
+
+    def whiten(self, measurements):
+        """ whitens measurements with channels along the last axis
+
+        Args:
+            measurements (numpy.ndarray): ... x n_channel array
+
+        Returns:
+            numpy.ndarray: whitened measurements of the same shape
+
+        """
+        if not self.structured:
+            return measurements @ self.factor
+        whitened = measurements * np.sqrt(self.diag)
+        if self.U is not None:
+            # precision = D^1/2 (I + Q B Q.T) D^1/2 with orthonormal Q,
+            # whose symmetric square root is I + Q (B^1/2 - I) Q.T
+            basis, correction = self._get_whitener()
+            whitened = whitened \
+                + ((whitened @ basis) @ correction) @ basis.T
+        return whitened
+
+    def _get_whitener(self):
+        if self._whitener is None:
+            basis, triangle = np.linalg.qr(
+                self.U / np.sqrt(self.diag)[:, None])
+            inner = np.eye(basis.shape[1]) + triangle @ self.S @ triangle.T
+            eigval, eigvec = np.linalg.eigh((inner + inner.T) / 2)
+            correction = (eigvec * np.sqrt(np.maximum(eigval, 0))) \
+                @ eigvec.T - np.eye(basis.shape[1])
+            self._whitener = (basis, correction)
+        return self._whitener
+
+    def inverse(self):
+        """ the inverse, e.g. the covariance for a precision, as a
+        NoiseModel of the same structure
+
+        Returns:
+            NoiseModel: the inverse noise model
+
+        """
+        if not self.structured:
+            return NoiseModel(np.linalg.inv(self.precision))
+        diag_inv = 1 / self.diag
+        if self.U is None:
+            return NoiseModel(diag_inv)
+        # (D + U S U^T)^-1 = D^-1 - D^-1 U S (I + U^T D^-1 U S)^-1 U^T D^-1
+        u_scaled = self.U * diag_inv[:, None]
+        inner = np.eye(self.S.shape[0]) + self.U.T @ u_scaled @ self.S
+        S = -self.S @ np.linalg.inv(inner)
+        return NoiseModel(diag_inv, u_scaled, (S + S.T) / 2)
+
+    def to_descriptor(self):
+        """ representation of the precision to store in descriptors:
+        the dense matrix, the diagonal vector or a dict with the entries
+        diag, U and S
+        """
+        if not self.structured:
+            return self._precision
+        if self.U is None:
+            return self.diag
+        return {'diag': self.diag, 'U': self.U, 'S': self.S}
+
+
+def _mean_noise_model(noise_models):
+    """ computes the average precision of several noise models. For
+    structured models the low rank components are concatenated, such that
+    the dense matrix is never formed.
+
+    Args:
+        noise_models (list of NoiseModel): models with equal n_channel
+
+    Returns:
+        NoiseModel: model of the mean precision
+
+    """
+    n_model = len(noise_models)
+    if not all(model.structured for model in noise_models):
+        return NoiseModel(sum(model.precision for model in noise_models)
+                          / n_model)
+    diag = sum(model.diag for model in noise_models) / n_model
+    low_rank = [model for model in noise_models if model.U is not None]
+    if not low_rank:
+        return NoiseModel(diag)
+    U = np.concatenate([model.U for model in low_rank], axis=1)
+    S = np.zeros((U.shape[1], U.shape[1]))
+    start = 0
+    for model in low_rank:
+        stop = start + model.S.shape[0]
+        S[start:stop, start:stop] = model.S / n_model
+        start = stop
+    return NoiseModel(diag, U, S)
+
+
+_NOISE_MODEL_CACHE = OrderedDict()
+_NOISE_MODEL_CACHE_SIZE = 16
+
+
+def get_noise_model(noise):
+    """
+    returns a NoiseModel for a precision matrix. NoiseModels passed in are
+    returned as they are. For arrays the models are cached by content, such
+    that repeated calls with the same precision matrix factorize it
+    only once.
+
+    Args:
+        noise (numpy.ndarray or NoiseModel): precision matrix or vector of
+            its diagonal
+
+    Returns:
+        NoiseModel: noise model for the precision matrix
+
+    """
+    if isinstance(noise, NoiseModel):
+        return noise
+    noise = np.asarray(noise)
+    key = (noise.shape, noise.dtype.str,
+           hashlib.sha1(np.ascontiguousarray(noise).tobytes()).hexdigest())
+    if key in _NOISE_MODEL_CACHE:
+        _NOISE_MODEL_CACHE.move_to_end(key)
+        return _NOISE_MODEL_CACHE[key]
+    model = NoiseModel(noise.copy())
+    _NOISE_MODEL_CACHE[key] = model
+    if len(_NOISE_MODEL_CACHE) > _NOISE_MODEL_CACHE_SIZE:
+        _NOISE_MODEL_CACHE.popitem(last=False)
+    return model
@@ -7,6 +7,7 @@ evaluate model performance
 import numpy as np
 import tqdm
 from rsatoolbox.rdm import compare
+from rsatoolbox.rdm import ComparisonPlan
 from rsatoolbox.inference import bootstrap_sample
 from rsatoolbox.inference import bootstrap_sample_rdm
 from rsatoolbox.inference import bootstrap_sample_pattern
@@ -284,13 +285,14 @@ def eval_bootstrap(models, data, theta=None, method='cosine', N=1000,
         input_check_model(models, theta, None, N)
     noise_min = []
     noise_max = []
+    rdm_preds = [mod.predict_rdm(theta=theta[j])
+                 for j, mod in enumerate(models)]
     for i in tqdm.trange(N):
         sample, rdm_idx, pattern_idx = \
             bootstrap_sample(data, rdm_descriptor=rdm_descriptor,
                              pattern_descriptor=pattern_descriptor)
         if len(np.unique(pattern_idx)) >= 3:
-            for j, mod in enumerate(models):
-                rdm_pred = mod.predict_rdm(theta=theta[j])
+            for j, rdm_pred in enumerate(rdm_preds):
                 rdm_pred = rdm_pred.subsample_pattern(pattern_descriptor,
                                                       pattern_idx)
                 evaluations[i, j] = np.mean(compare(rdm_pred, sample,
@@ -345,12 +347,13 @@ def eval_bootstrap_pattern(models, data, theta=None, method='cosine', N=1000,
         input_check_model(models, theta, None, N)
     noise_min = []
     noise_max = []
+    rdm_preds = [mod.predict_rdm(theta=theta[j])
+                 for j, mod in enumerate(models)]
     for i in tqdm.trange(N):
         sample, pattern_idx = \
             bootstrap_sample_pattern(data, pattern_descriptor)
         if len(np.unique(pattern_idx)) >= 3:
-            for j, mod in enumerate(models):
-                rdm_pred = mod.predict_rdm(theta=theta[j])
+            for j, rdm_pred in enumerate(rdm_preds):
                 rdm_pred = rdm_pred.subsample_pattern(pattern_descriptor,
                                                       pattern_idx)
                 evaluations[i, j] = np.mean(compare(rdm_pred, sample,
@@ -401,12 +404,14 @@ def eval_bootstrap_rdm(models, data, theta=None, method='cosine', N=1000,
     models, evaluations, theta, _ = input_check_model(models, theta, None, N)
     noise_min = []
     noise_max = []
+    # the predictions are the same for all samples, such that they are
+    # parsed and normalized only once
+    plans = [ComparisonPlan(mod.predict_rdm(theta=theta[j]), method)
+             for j, mod in enumerate(models)]
     for i in tqdm.trange(N):
         sample, rdm_idx = bootstrap_sample_rdm(data, rdm_descriptor)
-        for j, mod in enumerate(models):
-            rdm_pred = mod.predict_rdm(theta=theta[j])
-            evaluations[i, j] = np.mean(compare(rdm_pred, sample,
-                                                method))
+        for j, plan in enumerate(plans):
+            evaluations[i, j] = np.mean(plan.compare(sample))
         if boot_noise_ceil:
             noise_min_sample, noise_max_sample = boot_noise_ceiling(
                 sample, method=method, rdm_descriptor=rdm_descriptor)
@@ -8,7 +8,7 @@ import numpy as np
 import scipy.optimize as opt
 import scipy.sparse
 from rsatoolbox.rdm import compare
-from rsatoolbox.util.matrix import get_v
+from rsatoolbox.util.matrix import get_v_solver
 from rsatoolbox.util.pooling import pool_rdm
 from rsatoolbox.util.rdm_utils import _parse_input_rdms
 
@@ -259,22 +259,18 @@ def fit_regress(model, data, method='cosine', pattern_idx=None,
         vectors = vectors - np.mean(vectors, 1, keepdims=True)
         v = None
     elif method == 'cosine_cov':
-        v = get_v(pred.n_cond, sigma_k)
-        v = v[nan_idx[0]][:, nan_idx[0]]
+        v = get_v_solver(pred.n_cond, sigma_k, nan_idx[0])
     elif method == 'corr_cov':
         vectors = vectors - np.mean(vectors, 1, keepdims=True)
         y = y - np.mean(y)
-        v = get_v(pred.n_cond, sigma_k)
-        v = v[nan_idx[0]][:, nan_idx[0]]
+        v = get_v_solver(pred.n_cond, sigma_k, nan_idx[0])
     else:
         raise ValueError('method argument invalid')
     if v is None:
         X = vectors @ vectors.T + ridge_weight * np.eye(vectors.shape[0])
         y = vectors @ y.T
     else:
-        v_inv_x = np.array([scipy.sparse.linalg.cg(v, vectors[i],
-                                                   atol=10 ** -9)[0]
-                            for i in range(vectors.shape[0])])
+        v_inv_x = v.solve(vectors)
         y = v_inv_x @ y.T
         X = vectors @ v_inv_x.T + ridge_weight * np.eye(vectors.shape[0])
     theta = np.linalg.solve(X, y)
@@ -327,16 +323,15 @@ def fit_regress_nn(model, data, method='cosine', pattern_idx=None,
         vectors = vectors - np.mean(vectors, 1, keepdims=True)
         v = None
     elif method == 'cosine_cov':
-        v = get_v(pred.n_cond, sigma_k)
-        v = v[nan_idx[0]][:, nan_idx[0]]
+        v = get_v_solver(pred.n_cond, sigma_k, nan_idx[0])
     elif method == 'corr_cov':
         vectors = vectors - np.mean(vectors, 1, keepdims=True)
         y = y - np.mean(y)
-        v = get_v(pred.n_cond, sigma_k)
-        v = v[nan_idx[0]][:, nan_idx[0]]
+        v = get_v_solver(pred.n_cond, sigma_k, nan_idx[0])
     else:
         raise ValueError('method argument invalid')
-    theta = _nn_least_squares(vectors, y, ridge_weight=ridge_weight, V=v)
+    theta, _ = _nn_least_squares(vectors.T, y[0], ridge_weight=ridge_weight,
+                                 v_solver=v)
     return theta.flatten() / np.sqrt(np.sum(theta ** 2))
 
 
@@ -371,7 +366,7 @@ def _loss(theta, model, data, method='cosine', sigma_k=None,
         + np.sum(theta * theta) * ridge_weight
 
 
-def _nn_least_squares(A, y, ridge_weight=0, V=None):
+def _nn_least_squares(A, y, ridge_weight=0, V=None, v_solver=None):
     """ non-negative least squares
     essentially scipy.optimize.nnls extended to accept a ridge_regression
     regularisation and/or a covariance matrix V.
@@ -382,30 +377,38 @@ def _nn_least_squares(A, y, ridge_weight=0, V=None):
 
 
     This is an active set algorithm which is somewhat optimized by
-    precomputing A^T V^-1 A and A^T V y such that during the optimization
+    precomputing A^T V^-1 A and A^T V^-1 y such that during the optimization
     only matricies of rank r need to be inverted.
 
     This is tested against the scipy solution for ridge_weight=0 and V=None.
     For other V the validation comes from fitting the same models using
     general optimization.
+
+    If a v_solver (rsatoolbox.util.matrix.VSolver) for V is passed,
+    V^-1 A is computed with it instead of iteratively and V need not be
+    given.
     """
     assert A.shape[0] == y.shape[0]
     assert y.ndim == 1
     x = np.zeros(A.shape[1])
     p = np.zeros(A.shape[1], np.bool)
-    if V is None:
+    whitened = V is not None or v_solver is not None
+    if not whitened:
         w = A.T @ y
         ATA = A.T @ A + ridge_weight * np.eye(A.shape[1])
     else:
-        V_A = np.array([scipy.sparse.linalg.cg(V, A[:, i],
-                                               atol=10 ** -9)[0]
-                        for i in range(A.shape[1])])
+        if v_solver is None:
+            V_A = np.array([scipy.sparse.linalg.cg(V, A[:, i],
+                                                   atol=10 ** -9)[0]
+                            for i in range(A.shape[1])])
+        else:
+            V_A = v_solver.solve(A.T)
         y_V_A = V_A @ y
-        w = A.T @ V @ y
+        w = y_V_A
         ATA = A.T @ V_A.T + ridge_weight * np.eye(A.shape[1])
     while np.max(w) > 100 * np.finfo(np.float).eps:
         p[np.argmax(w)] = True
-        if V is None:
+        if not whitened:
             s_p = np.linalg.solve(ATA[p][:, p], A[:, p].T @ y)
         else:
             s_p = np.linalg.solve(ATA[p][:, p], y_V_A[p])
@@ -418,17 +421,21 @@ def _nn_least_squares(A, y, ridge_weight=0, V=None):
             i_alpha = np.where(p)[0][i_alpha]
             x[i_alpha] = 0
             p[i_alpha] = False
-            if V is None:
+            if not whitened:
                 s_p = np.linalg.solve(ATA[p][:, p], A[:, p].T @ y)
             else:
                 s_p = np.linalg.solve(ATA[p][:, p], y_V_A[p])
         x[p] = s_p
-        if V is None:
+        if not whitened:
             w = A.T @ y - ATA @ x
         else:
             w = y_V_A - ATA @ x
-    if V is None:
-        loss = np.sum((y - A @ x) ** 2)
+    residual = y - A @ x
+    if not whitened:
+        loss = np.sum(residual ** 2)
+    elif v_solver is None:
+        loss = residual @ scipy.sparse.linalg.cg(V, residual,
+                                                 atol=10 ** -9)[0]
     else:
-        loss = (y - A @ x).T @ V @ (y - A @ x)
+        loss = residual @ v_solver.solve(residual)
     return x, loss
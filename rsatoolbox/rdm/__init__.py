@@ -1,4 +1,5 @@
 from .rdms import RDMs
+from .rdms import RDMsView
 from .rdms import concat
 from .rdms import get_categorical_rdm
 from .rdms import load_rdm
@@ -14,7 +15,14 @@ from .calc import calc_rdm_mahalanobis
 from .calc import calc_rdm_crossnobis
 from .calc import calc_rdm_correlation
 from .calc_unbalanced import calc_rdm_unbalanced
+from .accumulator import RDMAccumulator
+from .index import RDMIndex
+from .index import load_rdm_index
 from .compare import compare
+from .compare import ComparisonPlan
+from .compare import compare_library
+from .compare import compare_datasets
+from .compare import compare_blocked
 from .compare import compare_correlation
 from .compare import compare_cosine
 from .compare import compare_kendall_tau
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Online calculation of RDMs from incrementally arriving trials
+"""
+
+from copy import deepcopy
+import numpy as np
+from rsatoolbox.rdm.rdms import RDMs
+from rsatoolbox.rdm.calc import _condensed_rdm
+from rsatoolbox.rdm.calc import _calc_rdm_crossnobis
+from rsatoolbox.rdm.calc import _check_noise
+from rsatoolbox.data import get_noise_model
+from rsatoolbox.data.computations import _group_indicator
+
+
+class RDMAccumulator:
+    """
+    Accumulates trials into per-condition running sums and counts, such
+    that the current RDM can be computed at any time without revisiting
+    old trials. If a cv_descriptor is given, the sums are kept separately
+    for each crossvalidation fold, which additionally allows crossnobis
+    RDMs.
+
+    Args:
+        descriptor (String):
+            obs_descriptor used to define the rows/columns of the RDM
+        cv_descriptor (String):
+            obs_descriptor which determines the cross-validation folds
+            required for crossnobis RDMs
+        descriptors (dict):
+            descriptors of the data, which become rdm_descriptors
+
+    """
+
+    def __init__(self, descriptor, cv_descriptor=None, descriptors=None):
+        self.descriptor = descriptor
+        self.cv_descriptor = cv_descriptor
+        if descriptors is None:
+            descriptors = {}
+        self.descriptors = descriptors
+        self.n_channel = None
+        self.n_obs = 0
+        self._conditions = []
+        self._cond_index = {}
+        self._folds = []
+        self._fold_index = {}
+        self._sums = np.zeros((0, 0, 0))
+        self._counts = np.zeros((0, 0))
+
+    @property
+    def n_cond(self):
+        """ number of conditions seen so far """
+        return len(self._conditions)
+
+    def update(self, measurements, obs_descriptors):
+        """ adds a batch of trials to the running sums
+
+        Args:
+            measurements (numpy.ndarray): n_obs x n_channel measurements
+            obs_descriptors (dict): observation descriptors of the batch,
+                which must contain descriptor and cv_descriptor if set
+
+        """
+        measurements = np.asarray(measurements)
+        if measurements.ndim == 1:
+            measurements = measurements[None]
+        if self.n_channel is not None \
+                and measurements.shape[1] != self.n_channel:
+            raise ValueError('measurements must have n_channel columns')
+        conditions = obs_descriptors[self.descriptor]
+        if self.cv_descriptor is None:
+            folds = np.zeros(len(conditions), dtype=int)
+        else:
+            folds = obs_descriptors[self.cv_descriptor]
+        if len(conditions) != measurements.shape[0] \
+                or len(folds) != measurements.shape[0]:
+            raise ValueError('obs_descriptors must have one entry per trial')
+        # the batch is only added to the state once it passed all checks
+        if self.n_channel is None:
+            self.n_channel = measurements.shape[1]
+            self._sums = np.zeros((0, 0, self.n_channel))
+        cond_idx = _add_values(self._conditions, self._cond_index,
+                               conditions)
+        fold_idx = _add_values(self._folds, self._fold_index, folds)
+        n_fold, n_cond = len(self._folds), len(self._conditions)
+        self._sums = _pad(self._sums, n_fold, n_cond)
+        self._counts = _pad(self._counts, n_fold, n_cond)
+        indicator = _group_indicator(fold_idx * n_cond + cond_idx,
+                                     n_fold * n_cond, np.ones(len(cond_idx)))
+        self._sums += (indicator @ measurements).reshape(
+            n_fold, n_cond, self.n_channel)
+        self._counts += np.asarray(indicator.sum(axis=1)).reshape(
+            n_fold, n_cond)
+        self.n_obs += measurements.shape[0]
+
+    def get_rdm(self, method='euclidean', noise=None, block_size=None):
+        """ computes the RDM of all trials seen so far
+
+        Args:
+            method (String):
+                'euclidean', 'correlation', 'mahalanobis' or 'crossnobis'
+            noise (numpy.ndarray or rsatoolbox.data.NoiseModel):
+                n_channel x n_channel precision matrix used for
+                mahalanobis and crossnobis RDMs, or a list of one
+                precision per fold for crossnobis
+            block_size (int):
+                number of RDM rows computed at once, see calc_rdm
+
+        Returns:
+            rsatoolbox.rdm.rdms.RDMs: RDMs object with the one RDM
+
+        """
+        if self.n_obs == 0:
+            raise ValueError('no trials have been added yet')
+        order = np.argsort(np.array(self._conditions))
+        desc = np.array(self._conditions)[order]
+        sums = self._sums[:, order]
+        counts = self._counts[:, order]
+        descriptors = {}
+        if method == 'crossnobis':
+            if self.cv_descriptor is None:
+                raise ValueError(
+                    'crossnobis requires the accumulator to be created '
+                    + 'with a cv_descriptor')
+            noise = _check_noise(noise, self.n_channel)
+            measurements_test = sums / counts[..., None]
+            measurements_train = \
+                (np.sum(sums, axis=0, keepdims=True) - sums) \
+                / (np.sum(counts, axis=0, keepdims=True) - counts)[..., None]
+            dissimilarities, noise = _calc_rdm_crossnobis(
+                measurements_train, measurements_test, noise, block_size)
+            descriptors['noise'] = noise
+            descriptors['cv_descriptor'] = self.cv_descriptor
+            measure = 'crossnobis'
+        else:
+            means = np.sum(sums, axis=0) \
+                / np.sum(counts, axis=0)[:, None]
+            if method == 'euclidean' or (
+                    method == 'mahalanobis' and noise is None):
+                dissimilarities = _condensed_rdm(
+                    means, scale=1 / self.n_channel, block_size=block_size)
+                measure = 'squared euclidean'
+            elif method == 'mahalanobis':
+                noise = get_noise_model(_check_noise(noise, self.n_channel))
+                dissimilarities = _condensed_rdm(
+                    noise.whiten(means), scale=1 / self.n_channel,
+                    block_size=block_size)
+                descriptors['noise'] = noise.to_descriptor()
+                measure = 'squared mahalanobis'
+            elif method == 'correlation':
+                means = means - means.mean(axis=1, keepdims=True)
+                means /= np.sqrt(np.einsum('ij,ij->i', means, means))[:, None]
+                dissimilarities = _condensed_rdm(
+                    means, scale=0.5, block_size=block_size)
+                measure = 'correlation'
+            else:
+                raise NotImplementedError(
+                    'method must be euclidean, correlation, mahalanobis '
+                    + 'or crossnobis')
+        rdm = RDMs(dissimilarities=np.array([dissimilarities]),
+                   dissimilarity_measure=measure,
+                   descriptors=descriptors,
+                   rdm_descriptors=deepcopy(self.descriptors),
+                   pattern_descriptors={self.descriptor: desc})
+        return rdm
+
+
+def _add_values(values, index, new_values):
+    """ maps new_values to their positions in values, appending unseen
+    values to values and index
+
+    Returns:
+        numpy.ndarray: the position of each of the new_values
+    """
+    positions = []
+    for value in new_values:
+        if value not in index:
+            index[value] = len(values)
+            values.append(value)
+        positions.append(index[value])
+    return np.array(positions, dtype=int)
+
+
+def _pad(array, n_fold, n_cond):
+    """ zero pads the first two dimensions of array to n_fold x n_cond """
+    padding = [(0, n_fold - array.shape[0]), (0, n_cond - array.shape[1])] \
+        + [(0, 0)] * (array.ndim - 2)
+    return np.pad(array, padding)
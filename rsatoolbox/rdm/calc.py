@@ -8,15 +8,23 @@ Calculation of RDMs from datasets
 from collections.abc import Iterable
 from copy import deepcopy
 import numpy as np
+from scipy.sparse import csr_matrix
+from joblib import Parallel, delayed, effective_n_jobs
 from rsatoolbox.rdm.rdms import RDMs
 from rsatoolbox.rdm.rdms import concat
 from rsatoolbox.rdm.combine import from_partials
 from rsatoolbox.data import average_dataset_by
-from rsatoolbox.util.rdm_utils import _extract_triu_
+from rsatoolbox.data import NoiseModel
+from rsatoolbox.data import get_noise_model
+from rsatoolbox.data.noise import _mean_noise_model
+from rsatoolbox.data.computations import _group_indicator
+from rsatoolbox.util.data_utils import get_unique_inverse
 
 
 def calc_rdm(dataset, method='euclidean', descriptor=None, noise=None,
-             cv_descriptor=None, prior_lambda=1, prior_weight=0.1):
+             cv_descriptor=None, prior_lambda=1, prior_weight=0.1,
+             block_size=None, n_jobs=1, approx=None, approx_dim=None,
+             approx_eps=0.1, approx_seed=0):
     """
     calculates an RDM from an input dataset
 
@@ -24,6 +32,11 @@ def calc_rdm(dataset, method='euclidean', descriptor=None, noise=None,
     to specify the dissimilarity measure and which observations in the dataset
     belong to which condition.
 
+    If a list of datasets with the same conditions is passed, the
+    euclidean, correlation, mahalanobis and poisson RDMs are computed
+    for all datasets at once and the descriptors of the datasets become
+    rdm_descriptors of the result.
+
     Args:
         dataset (rsatoolbox.data.dataset.DatasetBase):
             The dataset the RDM is computed from
@@ -31,62 +44,86 @@ def calc_rdm(dataset, method='euclidean', descriptor=None, noise=None,
             a description of the dissimilarity measure (e.g. 'Euclidean')
         descriptor (String):
             obs_descriptor used to define the rows/columns of the RDM
-        noise (numpy.ndarray):
+        noise (numpy.ndarray or rsatoolbox.data.NoiseModel):
             dataset.n_channel x dataset.n_channel
             precision matrix used to calculate the RDM
             used only for Mahalanobis and Crossnobis estimators
             defaults to an identity matrix, i.e. euclidean distance
+        block_size (int):
+            number of RDM rows computed at once. Limits the memory used
+            for the kernel matrices to block_size x n_cond entries.
+            Defaults to computing all rows at once.
+        n_jobs (int):
+            number of processes over which a list of datasets is
+            distributed, see _map_datasets. Defaults to 1, i.e.
+            sequential computation.
+        approx (String):
+            'jl' to compute euclidean or correlation RDMs approximately
+            from a sparse random projection of the patterns, see
+            calc_rdm_euclid. Defaults to None, i.e. exact computation.
+        approx_dim (int):
+            target dimension of the projection. Defaults to the
+            dimension required for approx_eps.
+        approx_eps (float):
+            tolerated relative error of the dissimilarities
+        approx_seed (int):
+            seed of the random projection
 
     Returns:
         rsatoolbox.rdm.rdms.RDMs: RDMs object with the one RDM
 
     """
     if isinstance(dataset, Iterable):
-        rdms = []
-        for i_dat in range(len(dataset)):
-            if noise is None:
-                rdms.append(calc_rdm(
-                    dataset[i_dat], method=method,
-                    descriptor=descriptor,
-                    cv_descriptor=cv_descriptor,
-                    prior_lambda=prior_lambda, prior_weight=prior_weight))
-            elif isinstance(noise, np.ndarray) and noise.ndim == 2:
-                rdms.append(calc_rdm(
-                    dataset[i_dat], method=method,
-                    descriptor=descriptor,
-                    noise=noise,
-                    cv_descriptor=cv_descriptor,
-                    prior_lambda=prior_lambda, prior_weight=prior_weight))
-            elif isinstance(noise, Iterable):
-                rdms.append(calc_rdm(
-                    dataset[i_dat], method=method,
-                    descriptor=descriptor,
-                    noise=noise[i_dat],
-                    cv_descriptor=cv_descriptor,
-                    prior_lambda=prior_lambda, prior_weight=prior_weight))
+        if effective_n_jobs(n_jobs) == 1 and approx is None \
+                and _can_batch(dataset, method, descriptor, noise):
+            return _calc_rdm_batched(
+                dataset, method=method, descriptor=descriptor, noise=noise,
+                prior_lambda=prior_lambda, prior_weight=prior_weight,
+                block_size=block_size)
+        rdms = _map_datasets(
+            calc_rdm, dataset, noise, n_jobs=n_jobs,
+            method=method, descriptor=descriptor,
+            cv_descriptor=cv_descriptor,
+            prior_lambda=prior_lambda, prior_weight=prior_weight,
+            block_size=block_size, approx=approx, approx_dim=approx_dim,
+            approx_eps=approx_eps, approx_seed=approx_seed)
         if descriptor is None:
             rdm = concat(rdms)
         else:
             rdm = from_partials(rdms, descriptor=descriptor)
     else:
+        if approx is not None and method not in ['euclidean', 'correlation']:
+            raise ValueError('approx is only available for the euclidean'
+                             + ' and correlation methods')
         if method == 'euclidean':
-            rdm = calc_rdm_euclid(dataset, descriptor)
+            rdm = calc_rdm_euclid(dataset, descriptor,
+                                  block_size=block_size, approx=approx,
+                                  approx_dim=approx_dim,
+                                  approx_eps=approx_eps,
+                                  approx_seed=approx_seed)
         elif method == 'correlation':
-            rdm = calc_rdm_correlation(dataset, descriptor)
+            rdm = calc_rdm_correlation(dataset, descriptor,
+                                       block_size=block_size, approx=approx,
+                                       approx_dim=approx_dim,
+                                       approx_eps=approx_eps,
+                                       approx_seed=approx_seed)
         elif method == 'mahalanobis':
-            rdm = calc_rdm_mahalanobis(dataset, descriptor, noise)
+            rdm = calc_rdm_mahalanobis(dataset, descriptor, noise,
+                                       block_size=block_size)
         elif method == 'crossnobis':
             rdm = calc_rdm_crossnobis(dataset, descriptor, noise,
-                                      cv_descriptor)
+                                      cv_descriptor, block_size=block_size)
         elif method == 'poisson':
             rdm = calc_rdm_poisson(dataset, descriptor,
                                    prior_lambda=prior_lambda,
-                                   prior_weight=prior_weight)
+                                   prior_weight=prior_weight,
+                                   block_size=block_size)
         elif method == 'poisson_cv':
             rdm = calc_rdm_poisson_cv(dataset, descriptor,
                                       cv_descriptor=cv_descriptor,
                                       prior_lambda=prior_lambda,
-                                      prior_weight=prior_weight)
+                                      prior_weight=prior_weight,
+                                      block_size=block_size)
         else:
             raise(NotImplementedError)
         if descriptor is not None:
@@ -97,7 +134,8 @@ def calc_rdm(dataset, method='euclidean', descriptor=None, noise=None,
 def calc_rdm_movie(
         dataset, method='euclidean', descriptor=None, noise=None,
         cv_descriptor=None, prior_lambda=1, prior_weight=0.1,
-        time_descriptor='time', bins=None):
+        time_descriptor='time', bins=None, window=None, window_step=1,
+        block_size=None, n_jobs=1):
     """
     calculates an RDM movie from an input TemporalDataset
 
@@ -108,7 +146,7 @@ def calc_rdm_movie(
             a description of the dissimilarity measure (e.g. 'Euclidean')
         descriptor (String):
             obs_descriptor used to define the rows/columns of the RDM
-        noise (numpy.ndarray):
+        noise (numpy.ndarray or rsatoolbox.data.NoiseModel):
             dataset.n_channel x dataset.n_channel
             precision matrix used to calculate the RDM
             used only for Mahalanobis and Crossnobis estimators
@@ -117,88 +155,207 @@ def calc_rdm_movie(
             dataset.time_descriptors. Defaults to 'time'.
         bins (array-like): list of bins, with bins[i] containing the vector
             of time-points for the i-th bin. Defaults to no binning.
+        window (int): width of sliding windows in time-points, within which
+            the data is averaged before computing the RDMs,
+            see TemporalDataset.sliding_window. Defaults to no windowing.
+        window_step (int): number of time-points between the starts of
+            successive windows. Defaults to 1.
+        block_size (int): number of RDM rows computed at once,
+            see calc_rdm. Defaults to computing all rows at once.
+        n_jobs (int): number of processes over which a list of datasets
+            is distributed, see calc_rdm. Defaults to 1.
 
     Returns:
         rsatoolbox.rdm.rdms.RDMs: RDMs object with RDM movie
     """
 
     if isinstance(dataset, Iterable):
-        rdms = []
-        for i_dat, _ in enumerate(dataset):
-            if noise is None:
-                rdms.append(calc_rdm_movie(
-                    dataset[i_dat], method=method,
-                    descriptor=descriptor))
-            elif isinstance(noise, np.ndarray) and noise.ndim == 2:
-                rdms.append(calc_rdm_movie(
-                    dataset[i_dat], method=method,
-                    descriptor=descriptor,
-                    noise=noise))
-            elif isinstance(noise, Iterable):
-                rdms.append(calc_rdm_movie(
-                    dataset[i_dat], method=method,
-                    descriptor=descriptor,
-                    noise=noise[i_dat]))
+        rdms = _map_datasets(
+            calc_rdm_movie, dataset, noise, n_jobs=n_jobs,
+            method=method, descriptor=descriptor,
+            cv_descriptor=cv_descriptor,
+            prior_lambda=prior_lambda, prior_weight=prior_weight,
+            time_descriptor=time_descriptor, bins=bins,
+            window=window, window_step=window_step,
+            block_size=block_size)
         rdm = concat(rdms)
     else:
         if bins is not None:
-            binned_data = dataset.bin_time(time_descriptor, bins)
-            splited_data = binned_data.split_time(time_descriptor)
-            time = binned_data.time_descriptors[time_descriptor]
+            dataset = dataset.bin_time(time_descriptor, bins)
+        if window is not None:
+            dataset = dataset.sliding_window(
+                window, window_step, by=time_descriptor)
+        if method in _MOVIE_METHODS:
+            rdm = _calc_rdm_movie_vectorized(
+                dataset, method=method, descriptor=descriptor, noise=noise,
+                cv_descriptor=cv_descriptor, prior_lambda=prior_lambda,
+                prior_weight=prior_weight, block_size=block_size)
         else:
-            splited_data = dataset.split_time(time_descriptor)
-            time = dataset.time_descriptors[time_descriptor]
-
-        rdms = []
-        for dat in splited_data:
-            dat_single = dat.convert_to_dataset(time_descriptor)
-            rdms.append(calc_rdm(dat_single, method=method,
-                                 descriptor=descriptor, noise=noise,
-                                 cv_descriptor=cv_descriptor,
-                                 prior_lambda=prior_lambda,
-                                 prior_weight=prior_weight))
+            rdms = []
+            for dat in dataset.split_time(time_descriptor):
+                dat_single = dat.convert_to_dataset(time_descriptor)
+                rdms.append(calc_rdm(dat_single, method=method,
+                                     descriptor=descriptor, noise=noise,
+                                     cv_descriptor=cv_descriptor,
+                                     prior_lambda=prior_lambda,
+                                     prior_weight=prior_weight,
+                                     block_size=block_size))
+            rdm = concat(rdms)
+        for key, value in dataset.time_descriptors.items():
+            rdm.rdm_descriptors[key] = list(value)
+    return rdm
 
-        rdm = concat(rdms)
-        rdm.rdm_descriptors[time_descriptor] = time
+
+def _calc_rdm_movie_vectorized(
+        dataset, method='euclidean', descriptor=None, noise=None,
+        cv_descriptor=None, prior_lambda=1, prior_weight=0.1,
+        block_size=None):
+    """
+    calculates the RDMs for all time points of a TemporalDataset at once.
+    The conditions are averaged once on the n_obs x n_channel x n_time
+    tensor and the RDMs for all time points are computed with batched
+    products over the time axis.
+
+    Args:
+        dataset (rsatoolbox.data.dataset.TemporalDataset):
+            The dataset the RDM is computed from
+        method (String):
+            one of 'euclidean', 'correlation', 'mahalanobis', 'poisson',
+            'crossnobis' and 'poisson_cv'
+        descriptor (String):
+            obs_descriptor used to define the rows/columns of the RDM
+
+    Returns:
+        rsatoolbox.rdm.rdms.RDMs: RDMs object with one RDM per time point
+    """
+    descriptors = {}
+    if method in ['crossnobis', 'poisson_cv']:
+        if descriptor is None:
+            raise ValueError('descriptor must be a string! Crossvalidation' +
+                             'requires multiple measurements to be grouped')
+        if cv_descriptor is None:
+            folds = _gen_default_cv_descriptor(dataset, descriptor)
+            cv_descriptor = 'cv_desc'
+        else:
+            folds = dataset.obs_descriptors[cv_descriptor]
+        measurements_test, measurements_train, desc = _fold_means(
+            dataset.measurements, dataset.obs_descriptors[descriptor], folds)
+        order = np.argsort(desc)
+        desc = desc[order]
+        # n_time x n_fold x n_cond x n_channel
+        measurements_test = measurements_test[:, order].transpose(3, 0, 1, 2)
+        measurements_train = measurements_train[:, order].transpose(
+            3, 0, 1, 2)
+        if method == 'poisson_cv':
+            dissimilarities = _calc_rdm_poisson_cv(
+                measurements_train, measurements_test, prior_lambda,
+                prior_weight, block_size)
+        else:
+            noise = _check_noise(noise, dataset.n_channel)
+            dissimilarities, noise = _calc_rdm_crossnobis(
+                measurements_train, measurements_test, noise, block_size)
+            descriptors['noise'] = noise
+            descriptors['cv_descriptor'] = cv_descriptor
+        measure = method
+    else:
+        measurements, desc, descriptor = _parse_input(dataset, descriptor)
+        if descriptor != 'pattern':
+            order = np.argsort(desc)
+            measurements = measurements[order]
+            desc = desc[order]
+        # n_time x n_cond x n_channel
+        measurements = measurements.transpose(2, 0, 1)
+        measure = _BATCHED_METHODS[method]
+        if method == 'mahalanobis' and noise is not None:
+            noise = get_noise_model(_check_noise(noise, dataset.n_channel))
+            measurements = noise.whiten(measurements)
+            descriptors['noise'] = noise.to_descriptor()
+            measure = 'squared mahalanobis'
+        dissimilarities = _calc_kernel_batched(
+            measurements, method, prior_lambda, prior_weight, block_size)
+    n_time = dissimilarities.shape[0]
+    rdm_descriptors = {
+        k: [deepcopy(v) for _ in range(n_time)]
+        for k, v in dataset.descriptors.items()}
+    rdm = RDMs(dissimilarities=dissimilarities,
+               dissimilarity_measure=measure,
+               descriptors=descriptors,
+               rdm_descriptors=rdm_descriptors,
+               pattern_descriptors={descriptor: desc})
     return rdm
 
 
-def calc_rdm_euclid(dataset, descriptor=None):
+def calc_rdm_euclid(dataset, descriptor=None, block_size=None,
+                    approx=None, approx_dim=None, approx_eps=0.1,
+                    approx_seed=0):
     """
+    If approx='jl' the condition means are first projected to approx_dim
+    dimensions with a seeded sparse Johnson-Lindenstrauss projection.
+    With high probability all dissimilarities then lie within a relative
+    error of approx_eps, which is stored in the descriptors together with
+    the dimension and seed of the projection.
+
     Args:
         dataset (rsatoolbox.data.DatasetBase):
             The dataset the RDM is computed from
         descriptor (String):
             obs_descriptor used to define the rows/columns of the RDM
             defaults to one row/column per row in the dataset
+        block_size (int):
+            number of RDM rows computed at once
+        approx (String):
+            None for exact computation or 'jl' for a random projection
+        approx_dim (int):
+            target dimension, defaults to the dimension for approx_eps
+        approx_eps (float):
+            tolerated relative error, used if approx_dim is None
+        approx_seed (int):
+            seed of the random projection
     Returns:
         rsatoolbox.rdm.rdms.RDMs: RDMs object with the one RDM
     """
 
     measurements, desc, descriptor = _parse_input(dataset, descriptor)
-    sum_sq_measurements = np.sum(measurements**2, axis=1, keepdims=True)
-    rdm = sum_sq_measurements + sum_sq_measurements.T \
-        - 2 * np.dot(measurements, measurements.T)
-    rdm = _extract_triu_(rdm) / measurements.shape[1]
+    n_channel = measurements.shape[1]
+    measurements, descriptors = _approx_measurements(
+        measurements, approx, approx_dim, approx_eps, approx_seed)
+    rdm = _condensed_rdm(measurements, scale=1 / n_channel,
+                         block_size=block_size)
     rdm = RDMs(dissimilarities=np.array([rdm]),
                dissimilarity_measure='squared euclidean',
+               descriptors=descriptors,
                rdm_descriptors=deepcopy(dataset.descriptors))
     rdm.pattern_descriptors[descriptor] = desc
     return rdm
 
 
-def calc_rdm_correlation(dataset, descriptor=None):
+def calc_rdm_correlation(dataset, descriptor=None, block_size=None,
+                         approx=None, approx_dim=None, approx_eps=0.1,
+                         approx_seed=0):
     """
     calculates an RDM from an input dataset using correlation distance
     If multiple instances of the same condition are found in the dataset
     they are averaged.
 
+    If approx='jl' the centered condition means are projected with a
+    sparse random projection before normalization, see calc_rdm_euclid.
+
     Args:
         dataset (rsatoolbox.data.DatasetBase):
             The dataset the RDM is computed from
         descriptor (String):
             obs_descriptor used to define the rows/columns of the RDM
             defaults to one row/column per row in the dataset
+        block_size (int):
+            number of RDM rows computed at once
+        approx (String):
+            None for exact computation or 'jl' for a random projection
+        approx_dim (int):
+            target dimension, defaults to the dimension for approx_eps
+        approx_eps (float):
+            tolerated relative error, used if approx_dim is None
+        approx_seed (int):
+            seed of the random projection
 
     Returns:
         rsatoolbox.rdm.rdms.RDMs: RDMs object with the one RDM
@@ -206,16 +363,21 @@ def calc_rdm_correlation(dataset, descriptor=None):
     """
     ma, desc, descriptor = _parse_input(dataset, descriptor)
     ma = ma - ma.mean(axis=1, keepdims=True)
+    ma, descriptors = _approx_measurements(
+        ma, approx, approx_dim, approx_eps, approx_seed)
     ma /= np.sqrt(np.einsum('ij,ij->i', ma, ma))[:, None]
-    rdm = 1 - np.einsum('ik,jk', ma, ma)
+    # 1 - r = (|a|^2 + |b|^2 - 2 a.b) / 2 for normalized patterns
+    rdm = _condensed_rdm(ma, scale=0.5, block_size=block_size)
     rdm = RDMs(dissimilarities=np.array([rdm]),
                dissimilarity_measure='correlation',
+               descriptors=descriptors,
                rdm_descriptors=deepcopy(dataset.descriptors))
     rdm.pattern_descriptors[descriptor] = desc
     return rdm
 
 
-def calc_rdm_mahalanobis(dataset, descriptor=None, noise=None):
+def calc_rdm_mahalanobis(dataset, descriptor=None, noise=None,
+                         block_size=None):
     """
     calculates an RDM from an input dataset using mahalanobis distance
     If multiple instances of the same condition are found in the dataset
@@ -227,34 +389,37 @@ def calc_rdm_mahalanobis(dataset, descriptor=None, noise=None):
         descriptor (String):
             obs_descriptor used to define the rows/columns of the RDM
             defaults to one row/column per row in the dataset
-        noise (numpy.ndarray):
+        noise (numpy.ndarray or rsatoolbox.data.NoiseModel):
             dataset.n_channel x dataset.n_channel
-            precision matrix used to calculate the RDM
+            precision matrix used to calculate the RDM,
+            a vector of its diagonal or a NoiseModel, which may be
+            diagonal plus low rank
             default: identity matrix, i.e. euclidean distance
+        block_size (int):
+            number of RDM rows computed at once
 
     Returns:
         rsatoolbox.rdm.rdms.RDMs: RDMs object with the one RDM
 
     """
     if noise is None:
-        rdm = calc_rdm_euclid(dataset, descriptor)
+        rdm = calc_rdm_euclid(dataset, descriptor, block_size=block_size)
     else:
         measurements, desc, descriptor = _parse_input(dataset, descriptor)
-        noise = _check_noise(noise, dataset.n_channel)
-        kernel = measurements @ noise @ measurements.T
-        rdm = np.expand_dims(np.diag(kernel), 0) + np.expand_dims(np.diag(kernel), 1)\
-            - 2 * kernel
-        rdm = _extract_triu_(rdm) / measurements.shape[1]
+        noise = get_noise_model(_check_noise(noise, dataset.n_channel))
+        measurements = noise.whiten(measurements)
+        rdm = _condensed_rdm(measurements, scale=1 / measurements.shape[1],
+                             block_size=block_size)
         rdm = RDMs(dissimilarities=np.array([rdm]),
                    dissimilarity_measure='squared mahalanobis',
                    rdm_descriptors=deepcopy(dataset.descriptors))
         rdm.pattern_descriptors[descriptor] = desc
-        rdm.descriptors['noise'] = noise
+        rdm.descriptors['noise'] = noise.to_descriptor()
     return rdm
 
 
 def calc_rdm_crossnobis(dataset, descriptor, noise=None,
-                        cv_descriptor=None):
+                        cv_descriptor=None, block_size=None):
     """
     calculates an RDM from an input dataset using Cross-nobis distance
     This performs leave one out crossvalidation over the cv_descriptor.
@@ -281,20 +446,22 @@ def calc_rdm_crossnobis(dataset, descriptor, noise=None,
         descriptor (String):
             obs_descriptor used to define the rows/columns of the RDM
             defaults to one row/column per row in the dataset
-        noise (numpy.ndarray):
+        noise (numpy.ndarray or rsatoolbox.data.NoiseModel):
             dataset.n_channel x dataset.n_channel
-            precision matrix used to calculate the RDM
+            precision matrix used to calculate the RDM,
+            a vector of its diagonal or a NoiseModel, which may be
+            diagonal plus low rank
             default: identity matrix, i.e. euclidean distance
         cv_descriptor (String):
             obs_descriptor which determines the cross-validation folds
+        block_size (int):
+            number of RDM rows computed at once
 
     Returns:
         rsatoolbox.rdm.rdms.RDMs: RDMs object with the one RDM
 
     """
     noise = _check_noise(noise, dataset.n_channel)
-    if noise is None:
-        noise = np.eye(dataset.n_channel)
     if descriptor is None:
         raise ValueError('descriptor must be a string! Crossvalidation' +
                          'requires multiple measurements to be grouped')
@@ -303,43 +470,14 @@ def calc_rdm_crossnobis(dataset, descriptor, noise=None,
         dataset.obs_descriptors['cv_desc'] = cv_desc
         cv_descriptor = 'cv_desc'
     dataset.sort_by(descriptor)
-    cv_folds = np.unique(np.array(dataset.obs_descriptors[cv_descriptor]))
-    rdms = []
-    if (noise is None) or (isinstance(noise, np.ndarray) and noise.ndim == 2):
-        for i_fold in range(len(cv_folds)):
-            fold = cv_folds[i_fold]
-            data_test = dataset.subset_obs(cv_descriptor, fold)
-            data_train = dataset.subset_obs(cv_descriptor,
-                                            np.setdiff1d(cv_folds, fold))
-            measurements_train, _, _ = \
-                average_dataset_by(data_train, descriptor)
-            measurements_test, _, _ = \
-                average_dataset_by(data_test, descriptor)
-            rdm = _calc_rdm_crossnobis_single(
-                measurements_train, measurements_test, noise)
-            rdms.append(rdm)
-    else:  # a list of noises was provided
-        measurements = []
-        variances = []
-        for i_fold in range(len(cv_folds)):
-            data = dataset.subset_obs(cv_descriptor, cv_folds[i_fold])
-            measurements.append(average_dataset_by(data, descriptor)[0])
-            variances.append(np.linalg.inv(noise[i_fold]))
-        for i_fold in range(len(cv_folds)):
-            for j_fold in range(i_fold + 1, len(cv_folds)):
-                if i_fold != j_fold:
-                    rdm = _calc_rdm_crossnobis_single(
-                        measurements[i_fold], measurements[j_fold],
-                        np.linalg.inv(
-                            (variances[i_fold] + variances[j_fold]) / 2)
-                        )
-                    rdms.append(rdm)
-    rdms = np.array(rdms)
-    rdm = np.einsum('ij->j', rdms) / rdms.shape[0]
+    measurements_test, measurements_train, desc = _fold_means(
+        dataset.measurements, dataset.obs_descriptors[descriptor],
+        dataset.obs_descriptors[cv_descriptor])
+    rdm, noise = _calc_rdm_crossnobis(
+        measurements_train, measurements_test, noise, block_size)
     rdm = RDMs(dissimilarities=np.array([rdm]),
                dissimilarity_measure='crossnobis',
                rdm_descriptors=deepcopy(dataset.descriptors))
-    _, desc, _ = average_dataset_by(dataset, descriptor)
     rdm.pattern_descriptors[descriptor] = desc
     rdm.descriptors['noise'] = noise
     rdm.descriptors['cv_descriptor'] = cv_descriptor
@@ -347,7 +485,7 @@ def calc_rdm_crossnobis(dataset, descriptor, noise=None,
 
 
 def calc_rdm_poisson(dataset, descriptor=None, prior_lambda=1,
-                     prior_weight=0.1):
+                     prior_weight=0.1, block_size=None):
     """
     calculates an RDM from an input dataset using the symmetrized
     KL-divergence assuming a poisson distribution.
@@ -360,6 +498,8 @@ def calc_rdm_poisson(dataset, descriptor=None, prior_lambda=1,
         descriptor (String):
             obs_descriptor used to define the rows/columns of the RDM
             defaults to one row/column per row in the dataset
+        block_size (int):
+            number of RDM rows computed at once
 
     Returns:
         rsatoolbox.rdm.rdms.RDMs: RDMs object with the one RDM
@@ -368,10 +508,9 @@ def calc_rdm_poisson(dataset, descriptor=None, prior_lambda=1,
     measurements, desc, descriptor = _parse_input(dataset, descriptor)
     measurements = (measurements + prior_lambda * prior_weight) \
         / (1 + prior_weight)
-    kernel = measurements @ np.log(measurements).T
-    rdm = np.expand_dims(np.diag(kernel), 0) + np.expand_dims(np.diag(kernel), 1)\
-        - kernel - kernel.T
-    rdm = _extract_triu_(rdm) / measurements.shape[1]
+    rdm = _condensed_rdm(measurements, np.log(measurements),
+                         scale=1 / measurements.shape[1],
+                         block_size=block_size)
     rdm = RDMs(dissimilarities=np.array([rdm]),
                dissimilarity_measure='poisson',
                rdm_descriptors=deepcopy(dataset.descriptors))
@@ -380,7 +519,8 @@ def calc_rdm_poisson(dataset, descriptor=None, prior_lambda=1,
 
 
 def calc_rdm_poisson_cv(dataset, descriptor=None, prior_lambda=1,
-                        prior_weight=0.1, cv_descriptor=None):
+                        prior_weight=0.1, cv_descriptor=None,
+                        block_size=None):
     """
     calculates an RDM from an input dataset using the crossvalidated
     symmetrized KL-divergence assuming a poisson distribution
@@ -396,6 +536,8 @@ def calc_rdm_poisson_cv(dataset, descriptor=None, prior_lambda=1,
             defaults to one row/column per row in the dataset
         cv_descriptor (str): The descriptor that indicates the folds
             to use for crossvalidation
+        block_size (int):
+            number of RDM rows computed at once
 
     Returns:
         rsatoolbox.rdm.rdms.RDMs: RDMs object with the one RDM
@@ -410,37 +552,434 @@ def calc_rdm_poisson_cv(dataset, descriptor=None, prior_lambda=1,
         cv_descriptor = 'cv_desc'
 
     dataset.sort_by(descriptor)
-    cv_folds = np.unique(np.array(dataset.obs_descriptors[cv_descriptor]))
-    for i_fold in range(len(cv_folds)):
-        fold = cv_folds[i_fold]
-        data_test = dataset.subset_obs(cv_descriptor, fold)
-        data_train = dataset.subset_obs(cv_descriptor,
-                                        np.setdiff1d(cv_folds, fold))
-        measurements_train, _, _ = average_dataset_by(data_train, descriptor)
-        measurements_test, _, _ = average_dataset_by(data_test, descriptor)
-        measurements_train = (measurements_train
-                              + prior_lambda * prior_weight) \
-            / (1 + prior_weight)
-        measurements_test = (measurements_test
-                             + prior_lambda * prior_weight) \
-            / (1 + prior_weight)
-        kernel = measurements_train @ np.log(measurements_test).T
-        rdm = np.expand_dims(np.diag(kernel), 0) + np.expand_dims(np.diag(kernel), 1)\
-            - kernel - kernel.T
-        rdm = _extract_triu_(rdm) / measurements_train.shape[1]
+    measurements_test, measurements_train, desc = _fold_means(
+        dataset.measurements, dataset.obs_descriptors[descriptor],
+        dataset.obs_descriptors[cv_descriptor])
+    rdm = _calc_rdm_poisson_cv(measurements_train, measurements_test,
+                               prior_lambda, prior_weight, block_size)
     rdm = RDMs(dissimilarities=np.array([rdm]),
                dissimilarity_measure='poisson_cv',
                rdm_descriptors=deepcopy(dataset.descriptors))
-    _, desc, _ = average_dataset_by(dataset, descriptor)
     rdm.pattern_descriptors[descriptor] = desc
     return rdm
 
 
-def _calc_rdm_crossnobis_single(measurements1, measurements2, noise):
-    kernel = measurements1 @ noise @ measurements2.T
-    rdm = np.expand_dims(np.diag(kernel), 0) + np.expand_dims(np.diag(kernel), 1)\
-        - kernel - kernel.T
-    return _extract_triu_(rdm) / measurements1.shape[1]
+def _calc_rdm_poisson_cv(measurements_train, measurements_test,
+                         prior_lambda=1, prior_weight=0.1, block_size=None):
+    """ computes the poisson_cv RDM vector averaged over folds from the
+    training and test means of all folds (... x n_fold x n_cond x n_channel)
+    The smoothed means and their logs are computed once and all fold
+    kernels are evaluated together as for crossnobis.
+    """
+    measurements_train = (measurements_train + prior_lambda * prior_weight) \
+        / (1 + prior_weight)
+    measurements_test = (measurements_test + prior_lambda * prior_weight) \
+        / (1 + prior_weight)
+    return _calc_rdm_crossnobis_folds(
+        measurements_train, np.log(measurements_test), block_size)
+
+
+# methods supported by the batched engine with the dissimilarity_measure
+# they produce (mahalanobis without noise is euclidean)
+_BATCHED_METHODS = {
+    'euclidean': 'squared euclidean',
+    'correlation': 'correlation',
+    'mahalanobis': 'squared euclidean',
+    'poisson': 'poisson',
+}
+
+
+def _map_datasets(function, datasets, noise, n_jobs=1, **kwargs):
+    """
+    applies an RDM calculation function to each dataset of a list,
+    passing each dataset its noise, i.e. the single shared noise or the
+    corresponding element of a list of noises.
+
+    If n_jobs is not 1, the datasets are distributed over a joblib process
+    pool. Large measurement arrays are handed to the workers as shared
+    memory maps and the results are returned in the order of the datasets,
+    such that the merged RDMs do not depend on n_jobs. The backend can be
+    chosen with a joblib.parallel_backend context.
+
+    Args:
+        function (callable): calc_rdm, calc_rdm_movie or calc_rdm_unbalanced
+        datasets (list): the datasets
+        noise: None, a single noise or one noise per dataset
+        n_jobs (int): number of jobs as in joblib.Parallel
+
+    Returns:
+        list: the result of function for each dataset
+
+    """
+    datasets = list(datasets)
+    if noise is None or _is_single_noise(noise):
+        noises = [noise] * len(datasets)
+    else:
+        noises = list(noise)
+    if effective_n_jobs(n_jobs) == 1:
+        return [function(dat, noise=noise_dat, **kwargs)
+                for dat, noise_dat in zip(datasets, noises)]
+    return Parallel(n_jobs=n_jobs)(
+        delayed(function)(dat, noise=noise_dat, **kwargs)
+        for dat, noise_dat in zip(datasets, noises))
+
+
+# methods supported by the time-vectorized calc_rdm_movie
+_MOVIE_METHODS = ('euclidean', 'correlation', 'mahalanobis', 'poisson',
+                  'crossnobis', 'poisson_cv')
+
+
+def _can_batch(datasets, method, descriptor, noise):
+    """ checks whether a list of datasets can be processed by the batched
+    engine, i.e. whether all datasets are plain 2D datasets with the same
+    conditions and the method is one of the non-crossvalidated ones.
+    """
+    if method not in _BATCHED_METHODS or len(datasets) == 0:
+        return False
+    if not all(hasattr(dat, 'measurements')
+               and dat.measurements.ndim == 2 for dat in datasets):
+        return False
+    if (noise is not None and method == 'mahalanobis'
+            and not _is_single_noise(noise)):
+        if len(noise) != len(datasets):
+            return False
+    if descriptor is None:
+        n_obs = datasets[0].n_obs
+        return all(dat.n_obs == n_obs for dat in datasets)
+    values = np.unique(datasets[0].obs_descriptors[descriptor])
+    for dat in datasets[1:]:
+        values_dat = np.unique(dat.obs_descriptors[descriptor])
+        if (values_dat.shape != values.shape
+                or not np.all(values_dat == values)):
+            return False
+    return True
+
+
+def _calc_rdm_batched(datasets, method='euclidean', descriptor=None,
+                      noise=None, prior_lambda=1, prior_weight=0.1,
+                      block_size=None):
+    """
+    calculates the RDMs for a list of datasets with the same conditions
+    by stacking the condition averages into a
+    n_dataset x n_cond x n_channel tensor. Datasets with equal numbers of
+    channels are processed together with one batched matrix product.
+
+    The descriptors of the datasets are carried over as rdm_descriptors.
+
+    Args:
+        datasets (list of rsatoolbox.data.dataset.DatasetBase):
+            The datasets the RDMs are computed from
+        method (String):
+            'euclidean', 'correlation', 'mahalanobis' or 'poisson'
+        descriptor (String):
+            obs_descriptor used to define the rows/columns of the RDM
+        noise (numpy.ndarray or list):
+            precision matrix or one precision matrix per dataset
+            used only for 'mahalanobis'
+        block_size (int):
+            number of RDM rows computed at once
+
+    Returns:
+        rsatoolbox.rdm.rdms.RDMs: RDMs object with one RDM per dataset
+
+    """
+    n_dataset = len(datasets)
+    shared_noise = noise is None or _is_single_noise(noise)
+    if method != 'mahalanobis':
+        noise = None
+        shared_noise = True
+    measurements = []
+    for i_dat, dat in enumerate(datasets):
+        ma, desc, desc_name = _parse_input(dat, descriptor)
+        if descriptor is not None:
+            order = np.argsort(desc)
+            ma = ma[order]
+            desc = desc[order]
+        if noise is not None:
+            # mahalanobis distances are euclidean on whitened data
+            noise_dat = noise if shared_noise else noise[i_dat]
+            ma = get_noise_model(
+                _check_noise(noise_dat, ma.shape[1])).whiten(ma)
+        measurements.append(ma)
+    n_cond = measurements[0].shape[0]
+    dissimilarities = np.empty((n_dataset, int(n_cond * (n_cond - 1) / 2)))
+    n_channels = np.array([ma.shape[1] for ma in measurements])
+    for n_channel in np.unique(n_channels):
+        idx = np.where(n_channels == n_channel)[0]
+        ma = np.stack([measurements[i] for i in idx])
+        dissimilarities[idx] = _calc_kernel_batched(
+            ma, method, prior_lambda, prior_weight, block_size)
+    rdm_descriptors = {}
+    for dat in datasets:
+        for k in dat.descriptors.keys():
+            rdm_descriptors.setdefault(k, [None] * n_dataset)
+    for i_dat, dat in enumerate(datasets):
+        for k, v in dat.descriptors.items():
+            rdm_descriptors[k][i_dat] = deepcopy(v)
+    descriptors = {}
+    if noise is not None:
+        if shared_noise:
+            descriptors['noise'] = get_noise_model(noise).to_descriptor()
+        else:
+            rdm_descriptors['noise'] = [
+                get_noise_model(noise[i]).to_descriptor()
+                for i in range(n_dataset)]
+    if method == 'mahalanobis' and noise is not None:
+        measure = 'squared mahalanobis'
+    else:
+        measure = _BATCHED_METHODS[method]
+    rdm = RDMs(dissimilarities=dissimilarities,
+               dissimilarity_measure=measure,
+               descriptors=descriptors,
+               rdm_descriptors=rdm_descriptors,
+               pattern_descriptors={desc_name: desc})
+    return rdm
+
+
+def _calc_kernel_batched(measurements, method,
+                         prior_lambda=1, prior_weight=0.1, block_size=None):
+    """ computes the vectorized RDMs for a stack of condition averages
+    n_dataset x n_cond x n_channel with batched matrix products.
+    For mahalanobis the measurements must already be whitened.
+    """
+    n_channel = measurements.shape[2]
+    if method == 'correlation':
+        ma = measurements - measurements.mean(axis=2, keepdims=True)
+        ma /= np.sqrt(np.einsum('dij,dij->di', ma, ma))[:, :, None]
+        return _condensed_rdm(ma, scale=0.5, block_size=block_size)
+    if method == 'poisson':
+        ma = (measurements + prior_lambda * prior_weight) \
+            / (1 + prior_weight)
+        return _condensed_rdm(ma, np.log(ma), scale=1 / n_channel,
+                              block_size=block_size)
+    return _condensed_rdm(measurements, scale=1 / n_channel,
+                          block_size=block_size)
+
+
+def _condensed_rdm(measurements1, measurements2=None, scale=1,
+                   block_size=None):
+    """ computes RDM vectors of the form
+    scale * (k_ii + k_jj - k_ij - k_ji) with kernel k = m1 @ m2.T
+    directly in condensed form.
+
+    The rows of the RDM are processed in blocks of block_size rows and
+    written into the preallocated output, such that the kernel is never
+    held in memory for more than block_size x n_cond entries.
+    Leading dimensions of the measurements are treated as a batch of
+    independent RDMs.
+
+    Args:
+        measurements1 (numpy.ndarray): ... x n_cond x n_channel
+        measurements2 (numpy.ndarray): ... x n_cond x n_channel
+            defaults to measurements1, i.e. a symmetric kernel
+        scale (float): factor applied to all dissimilarities
+        block_size (int): number of RDM rows computed at once
+            defaults to all rows
+
+    Returns:
+        numpy.ndarray: ... x n_cond * (n_cond - 1) / 2 RDM vectors
+
+    """
+    if block_size is not None and \
+            (not isinstance(block_size, (int, np.integer)) or block_size < 1):
+        raise ValueError('block_size must be a positive integer')
+    symmetric = measurements2 is None
+    if symmetric:
+        measurements2 = measurements1
+    n_cond = measurements1.shape[-2]
+    if block_size is None:
+        block_size = max(n_cond, 1)
+    diag = np.einsum('...ij,...ij->...i', measurements1, measurements2)
+    rdm = np.empty(measurements1.shape[:-2] + (n_cond * (n_cond - 1) // 2,))
+    m2_t = np.swapaxes(measurements2, -1, -2)
+    m1_t = np.swapaxes(measurements1, -1, -2)
+    for start in range(0, n_cond - 1, block_size):
+        stop = min(start + block_size, n_cond - 1)
+        # the rows start:stop only need the columns start + 1:n_cond
+        kernel = measurements1[..., start:stop, :] @ m2_t[..., start:]
+        if symmetric:
+            kernel *= 2
+        else:
+            kernel += measurements2[..., start:stop, :] @ m1_t[..., start:]
+        kernel = diag[..., start:stop, None] + diag[..., None, start:] \
+            - kernel
+        mask = np.triu(np.ones(kernel.shape[-2:], dtype=bool), k=1)
+        rdm[..., _condensed_index(start, n_cond):
+            _condensed_index(stop, n_cond)] = kernel[..., mask]
+    rdm *= scale
+    return rdm
+
+
+def _condensed_index(row, n_cond):
+    """ position of the first entry of an RDM row in the condensed vector
+    """
+    return row * n_cond - row * (row + 1) // 2
+
+
+def _approx_measurements(measurements, approx=None, approx_dim=None,
+                         approx_eps=0.1, approx_seed=0):
+    """ applies the requested approximation to the n_cond x n_channel
+    pattern matrix
+
+    Returns:
+        numpy.ndarray: the (projected) measurements
+        dict: descriptors describing the approximation
+
+    """
+    if approx is None:
+        return measurements, {}
+    if approx != 'jl':
+        raise ValueError('approx must be None or "jl"')
+    n_cond, n_channel = measurements.shape
+    if approx_dim is None:
+        approx_dim = _jl_dim(n_cond, approx_eps)
+    approx_dim = int(approx_dim)
+    descriptors = {'approx': approx, 'approx_seed': approx_seed}
+    if approx_dim >= n_channel:
+        # projecting would not reduce the dimension, compute exactly
+        descriptors['approx_dim'] = n_channel
+        descriptors['approx_eps'] = 0.0
+        return measurements, descriptors
+    projection = _jl_projection(n_channel, approx_dim, approx_seed)
+    measurements = (projection.T @ measurements.T).T
+    descriptors['approx_dim'] = approx_dim
+    descriptors['approx_eps'] = _jl_eps(n_cond, approx_dim)
+    return measurements, descriptors
+
+
+def _jl_dim(n_cond, eps):
+    """ number of dimensions required to preserve all squared distances
+    between n_cond points within a relative error of eps with probability
+    at least 1 - 1/n_cond (Dasgupta & Gupta, 2003)
+    """
+    if not 0 < eps < 1:
+        raise ValueError('approx_eps must be between 0 and 1')
+    return int(np.ceil(4 * np.log(max(n_cond, 2))
+                       / (eps ** 2 / 2 - eps ** 3 / 3)))
+
+
+def _jl_eps(n_cond, dim):
+    """ relative error guaranteed by the bound of _jl_dim for dim
+    dimensions. 1 signals that the bound guarantees nothing.
+    """
+    target = 4 * np.log(max(n_cond, 2)) / dim
+    if target >= 1 / 6:
+        return 1.0
+    # solve eps^2 / 2 - eps^3 / 3 = target for eps in (0, 1)
+    roots = np.roots([-1 / 3, 1 / 2, 0, -target])
+    roots = np.real(roots[np.isreal(roots)])
+    return float(np.min(roots[(roots > 0) & (roots <= 1)]))
+
+
+def _jl_projection(n_channel, dim, seed=0):
+    """ seeded sparse n_channel x dim Johnson-Lindenstrauss projection.
+    Each channel is mapped to one random output dimension with a random
+    sign in each of n_nonzero blocks of the output (Kane & Nelson, 2014),
+    with n_nonzero chosen as in very sparse random projections
+    (Li, Hastie & Church, 2006).
+    """
+    rng = np.random.default_rng(seed)
+    n_nonzero = int(min(dim, max(1, np.ceil(dim / np.sqrt(n_channel)))))
+    block = dim // n_nonzero
+    cols = rng.integers(0, block, size=(n_channel, n_nonzero)) \
+        + block * np.arange(n_nonzero)
+    values = rng.choice([-1.0, 1.0], size=(n_channel, n_nonzero)) \
+        / np.sqrt(n_nonzero)
+    rows = np.repeat(np.arange(n_channel), n_nonzero)
+    return csr_matrix((values.ravel(), (rows, cols.ravel())),
+                      shape=(n_channel, dim))
+
+
+def _calc_rdm_crossnobis(measurements_train, measurements_test, noise,
+                         block_size=None):
+    """ computes the crossnobis RDM vector from the training and test means
+    of all folds (... x n_fold x n_cond x n_channel). Leading dimensions
+    are treated as a batch of independent RDMs.
+
+    Returns:
+        numpy.ndarray: ... x n_dist RDM vectors averaged over folds
+        numpy.ndarray: the noise precision to store in the descriptors
+
+    """
+    n_channel = measurements_test.shape[-1]
+    if noise is None:
+        rdm = _calc_rdm_crossnobis_folds(
+            measurements_train, measurements_test, block_size)
+        noise = np.eye(n_channel)
+    elif _is_single_noise(noise):
+        noise = get_noise_model(noise)
+        rdm = _calc_rdm_crossnobis_folds(
+            noise.whiten(measurements_train),
+            noise.whiten(measurements_test), block_size)
+        noise = noise.to_descriptor()
+    else:  # a list of noises was provided
+        n_fold = measurements_test.shape[-3]
+        # invert each fold's precision only once
+        variances = [get_noise_model(noise[i_fold]).inverse()
+                     for i_fold in range(n_fold)]
+        i_fold, j_fold = np.triu_indices(n_fold, 1)
+        pair_noises = [
+            _mean_noise_model([variances[i], variances[j]]).inverse()
+            for i, j in zip(i_fold, j_fold)]
+        rdm = _calc_rdm_crossnobis_folds(
+            np.stack([pair_noise.whiten(measurements_test[..., i, :, :])
+                      for pair_noise, i in zip(pair_noises, i_fold)],
+                     axis=-3),
+            np.stack([pair_noise.whiten(measurements_test[..., j, :, :])
+                      for pair_noise, j in zip(pair_noises, j_fold)],
+                     axis=-3),
+            block_size)
+    return rdm, noise
+
+
+def _calc_rdm_crossnobis_folds(measurements1, measurements2,
+                               block_size=None):
+    """ computes the crossvalidated RDM vector averaged over a stack of
+    ... x n_fold x n_cond x n_channel measurement pairs. As the RDM is linear
+    in the kernel the folds are concatenated along the channels, such that
+    all folds are evaluated with a single kernel.
+    """
+    n_fold, n_cond, n_channel = measurements1.shape[-3:]
+    shape = measurements1.shape[:-3] + (n_cond, n_fold * n_channel)
+    measurements1 = np.swapaxes(measurements1, -3, -2).reshape(shape)
+    measurements2 = np.swapaxes(measurements2, -3, -2).reshape(shape)
+    return _condensed_rdm(measurements1, measurements2,
+                          scale=1 / (n_fold * n_channel),
+                          block_size=block_size)
+
+
+def _fold_means(measurements, conds, folds):
+    """ computes the condition means within each crossvalidation fold and
+    the leave-one-fold-out training means from a single pass over the data.
+    The training means are derived by subtracting each fold's sums from
+    the overall sums.
+
+    Args:
+        measurements (numpy.ndarray): n_obs x n_channel (x ...)
+        conds (array-like): condition of each observation
+        folds (array-like): crossvalidation fold of each observation
+
+    Returns:
+        numpy.ndarray: measurements_test: n_fold x n_cond x n_channel (x ...)
+            condition means within each fold
+        numpy.ndarray: measurements_train: n_fold x n_cond x n_channel (x ...)
+            condition means over all other folds
+        numpy.ndarray: desc: the condition values in order of the rows
+    """
+    desc, cond_idx = get_unique_inverse(conds)
+    _, fold_idx = np.unique(np.array(folds), return_inverse=True)
+    n_cond = len(desc)
+    n_fold = np.max(fold_idx) + 1
+    indicator = _group_indicator(fold_idx * n_cond + cond_idx,
+                                 n_fold * n_cond, np.ones(len(cond_idx)))
+    sums = (indicator @ measurements.reshape(measurements.shape[0], -1)
+            ).reshape((n_fold, n_cond) + measurements.shape[1:])
+    counts = np.asarray(indicator.sum(axis=1)).reshape(
+        (n_fold, n_cond) + (1,) * (measurements.ndim - 1))
+    measurements_test = sums / counts
+    measurements_train = (np.sum(sums, axis=0, keepdims=True) - sums) \
+        / (np.sum(counts, axis=0, keepdims=True) - counts)
+    return measurements_test, measurements_train, desc
 
 
 def _gen_default_cv_descriptor(dataset, descriptor):
@@ -481,10 +1020,18 @@ def _parse_input(dataset, descriptor):
     return measurements, desc, descriptor
 
 
+def _is_single_noise(noise):
+    """ whether noise is a single precision matrix, diagonal precision
+    vector or NoiseModel, as opposed to a list of those
+    """
+    return isinstance(noise, NoiseModel) or (
+        isinstance(noise, np.ndarray) and noise.ndim in (1, 2))
+
+
 def _check_noise(noise, n_channel):
     """
     checks that a noise pattern is a matrix with correct dimension
-    n_channel x n_channel
+    n_channel x n_channel or a vector of its n_channel diagonal entries
 
     Args:
         noise: noise input to be checked
@@ -495,8 +1042,12 @@ def _check_noise(noise, n_channel):
     """
     if noise is None:
         pass
+    elif isinstance(noise, NoiseModel):
+        assert noise.n_channel == n_channel
     elif isinstance(noise, np.ndarray) and noise.ndim == 2:
         assert np.all(noise.shape == (n_channel, n_channel))
+    elif isinstance(noise, np.ndarray) and noise.ndim == 1:
+        assert noise.shape == (n_channel,)
     elif isinstance(noise, Iterable):
         for i in range(len(noise)):
             noise[i] = _check_noise(noise[i], n_channel)
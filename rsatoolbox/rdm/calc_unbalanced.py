@@ -13,13 +13,16 @@ import warnings
 import numpy as np
 from rsatoolbox.rdm.rdms import RDMs
 from rsatoolbox.rdm.rdms import concat
-from rsatoolbox.util.matrix import row_col_indicator_rdm
+from rsatoolbox.data import NoiseModel
+from rsatoolbox.data import get_noise_model
+from rsatoolbox.data.computations import _group_indicator
+from rsatoolbox.rdm.calc import _map_datasets
 
 
 def calc_rdm_unbalanced(dataset, method='euclidean', descriptor=None,
                         noise=None, cv_descriptor=None,
                         prior_lambda=1, prior_weight=0.1,
-                        weighting='number', enforce_same=False):
+                        weighting='number', enforce_same=False, n_jobs=1):
     """
     calculate a RDM from an input dataset for unbalanced datasets.
 
@@ -30,11 +33,16 @@ def calc_rdm_unbalanced(dataset, method='euclidean', descriptor=None,
             a description of the dissimilarity measure (e.g. 'Euclidean')
         descriptor (String):
             obs_descriptor used to define the rows/columns of the RDM
-        noise (numpy.ndarray):
+        noise (numpy.ndarray or rsatoolbox.data.NoiseModel):
             dataset.n_channel x dataset.n_channel
-            precision matrix used to calculate the RDM
+            precision matrix used to calculate the RDM,
+            a vector of its diagonal or a NoiseModel, which may be
+            diagonal plus low rank
             used only for Mahalanobis and Crossnobis estimators
             defaults to an identity matrix, i.e. euclidean distance
+        n_jobs (int):
+            number of processes over which a list of datasets is
+            distributed, see calc_rdm. Defaults to 1.
 
     Returns:
         rsatoolbox.rdm.rdms.RDMs: RDMs object with the one RDM
@@ -45,35 +53,14 @@ def calc_rdm_unbalanced(dataset, method='euclidean', descriptor=None,
         dataset.obs_descriptors['index'] = np.arange(dataset.n_obs)
         descriptor = 'index'
     if isinstance(dataset, Iterable):
-        rdms = []
-        for i_dat, dat in enumerate(dataset):
-            if noise is None:
-                rdms.append(calc_rdm_unbalanced(
-                    dat, method=method, descriptor=descriptor,
-                    cv_descriptor=cv_descriptor,
-                    prior_lambda=prior_lambda, prior_weight=prior_weight,
-                    weighting=weighting, enforce_same=enforce_same))
-            elif isinstance(noise, np.ndarray) and noise.ndim == 2:
-                rdms.append(calc_rdm_unbalanced(
-                    dat, method=method,
-                    descriptor=descriptor,
-                    noise=noise,
-                    cv_descriptor=cv_descriptor,
-                    prior_lambda=prior_lambda, prior_weight=prior_weight,
-                    weighting=weighting, enforce_same=enforce_same))
-            elif isinstance(noise, Iterable):
-                rdms.append(calc_rdm_unbalanced(
-                    dat, method=method,
-                    descriptor=descriptor,
-                    noise=noise[i_dat],
-                    cv_descriptor=cv_descriptor,
-                    prior_lambda=prior_lambda, prior_weight=prior_weight,
-                    weighting=weighting, enforce_same=enforce_same))
+        rdms = _map_datasets(
+            calc_rdm_unbalanced, dataset, noise, n_jobs=n_jobs,
+            method=method, descriptor=descriptor,
+            cv_descriptor=cv_descriptor,
+            prior_lambda=prior_lambda, prior_weight=prior_weight,
+            weighting=weighting, enforce_same=enforce_same)
         rdm = concat(rdms)
     else:
-        rdm = []
-        weights = []
-        self_sim = []
         if method == 'crossnobis' or method == 'poisson_cv':
             if cv_descriptor is None:
                 if 'index' not in dataset.obs_descriptors.keys():
@@ -82,42 +69,132 @@ def calc_rdm_unbalanced(dataset, method='euclidean', descriptor=None,
                 warnings.warn('cv_descriptor not set, using index for now.'
                               + 'This will only remove self-similarities.'
                               + 'Effectively this assumes independent trials')
-        unique_cond = set(dataset.obs_descriptors[descriptor])
-        for i, i_des in enumerate(unique_cond):
-            v, _ = calc_one_similarity(
-                dataset, descriptor, i_des, i_des, method=method,
-                noise=noise, weighting=weighting,
-                prior_lambda=prior_lambda,
-                prior_weight=prior_weight,
-                cv_descriptor=cv_descriptor)
-            self_sim.append(v)
-            for j, j_des in enumerate(unique_cond):
-                if j > i:
-                    v, w = calc_one_similarity(
-                        dataset, descriptor, i_des, j_des, method=method,
-                        noise=noise, weighting=weighting,
-                        prior_lambda=prior_lambda,
-                        prior_weight=prior_weight,
-                        cv_descriptor=cv_descriptor)
-                    rdm.append(v)
-                    weights.append(w)
-        row_idx, col_idx = row_col_indicator_rdm(len(unique_cond))
-        self_sim = np.array(self_sim)
-        rdm = np.array(rdm)
-        rdm = row_idx @ self_sim + col_idx @ self_sim - 2 * rdm
+        unique_cond = list(set(dataset.obs_descriptors[descriptor]))
+        cond_index = {cond: i for i, cond in enumerate(unique_cond)}
+        cond_idx = np.array([cond_index[cond] for cond
+                             in dataset.obs_descriptors[descriptor]])
+        if cv_descriptor is None:
+            cv_values = None
+        else:
+            cv_values = dataset.obs_descriptors[cv_descriptor]
+        sim, weights = _calc_similarities(
+            dataset.measurements, cond_idx, len(unique_cond),
+            method=method, noise=noise, weighting=weighting,
+            prior_lambda=prior_lambda, prior_weight=prior_weight,
+            cv_values=cv_values)
+        row_idx, col_idx = np.triu_indices(len(unique_cond), 1)
+        self_sim = np.diag(sim)
+        rdm = self_sim[row_idx] + self_sim[col_idx] \
+            - 2 * sim[row_idx, col_idx]
         rdm = RDMs(
             dissimilarities=np.array([rdm]),
             dissimilarity_measure=method,
             rdm_descriptors=deepcopy(dataset.descriptors))
-        rdm.pattern_descriptors[descriptor] = list(unique_cond)
-        rdm.rdm_descriptors['weights'] = [weights]
+        rdm.pattern_descriptors[descriptor] = unique_cond
+        rdm.rdm_descriptors['weights'] = [weights[row_idx, col_idx]]
     return rdm
 
 
+def _calc_similarities(measurements, cond_idx, n_cond, method='euclidean',
+                       noise=None, weighting='number',
+                       prior_lambda=1, prior_weight=0.1, cv_values=None):
+    """
+    computes the average similarities between all pairs of conditions from
+    the trial-by-trial similarities. Pairs of trials which share the same
+    cv_values or have no common finite channels are excluded.
+
+    Args:
+        measurements (numpy.ndarray): n_obs x n_channel measurements,
+            may contain NaNs
+        cond_idx (numpy.ndarray): condition index of each observation
+        n_cond (int): number of conditions
+        cv_values (array-like): crossvalidation fold of each observation,
+            None to include all pairs of trials
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray) : (value, weight)
+            n_cond x n_cond matrices of similarities and their weights
+
+    """
+    sim, counts = _trial_similarities(
+        measurements, method, noise=noise,
+        prior_lambda=prior_lambda, prior_weight=prior_weight)
+    valid = counts > 0
+    if cv_values is not None:
+        cv_values = np.asarray(cv_values)
+        valid &= cv_values[:, None] != cv_values[None, :]
+    if weighting == 'number':
+        weights = counts
+    elif weighting == 'equal':
+        weights = np.ones_like(counts)
+        sim = sim / np.where(valid, counts, 1)
+    else:
+        raise ValueError('weighting must be "number" or "equal"')
+    sim = np.where(valid, sim, 0)
+    weights = np.where(valid, weights, 0)
+    indicator = _group_indicator(cond_idx, n_cond, np.ones(len(cond_idx)))
+    sim = indicator @ (indicator @ sim.T).T
+    weights = indicator @ (indicator @ weights.T).T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sim = np.where(weights > 0, sim / weights, np.nan)
+    return sim, weights
+
+
+def _trial_similarities(measurements, method, noise=None,
+                        prior_lambda=1, prior_weight=0.1):
+    """
+    computes the similarities between all pairs of trials as defined by
+    similarity, restricted to the channels which are finite in both trials.
+    All sums over the common channels are computed as products of the
+    zero-filled measurements with the finite masks.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray) : (similarity, counts)
+            n_obs x n_obs similarities and numbers of common finite channels
+
+    """
+    finite = np.isfinite(measurements)
+    mask = finite.astype(np.float64)
+    counts = mask @ mask.T
+    if method in ['poisson', 'poisson_cv']:
+        measurements = (measurements + prior_lambda * prior_weight) \
+            / (1 + prior_weight)
+    values = np.where(finite, measurements, 0)
+    if method == 'euclidean' or (
+            method in ['mahalanobis', 'crossnobis'] and noise is None):
+        sim = values @ values.T
+    elif method in ['mahalanobis', 'crossnobis']:
+        if isinstance(noise, np.ndarray) and noise.ndim == 2:
+            sim = values @ noise @ values.T
+        else:
+            # diagonal or structured noise: never form the dense matrix
+            values = get_noise_model(noise).whiten(values)
+            sim = values @ values.T
+    elif method == 'correlation':
+        # sums[a, b] is the sum of trial a over the channels common with b
+        sums = values @ mask.T
+        cov = values @ values.T
+        var = (values ** 2) @ mask.T
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = cov - sums * sums.T / counts
+            var = var - sums ** 2 / counts
+            nonzero = (var > 0) & (var.T > 0)
+            corr = np.where(nonzero, cov / np.sqrt(var * var.T), 1)
+        sim = corr * counts / 2
+    elif method in ['poisson', 'poisson_cv']:
+        logs = np.log(np.where(finite, measurements, 1))
+        cross = logs @ values.T
+        entropy = (values * logs) @ mask.T
+        sim = (cross + cross.T - entropy - entropy.T) / 2
+    else:
+        raise ValueError('dissimilarity method not recognized!')
+    return sim, counts
+
+
 def _check_noise(noise, n_channel):
     """
     checks that a noise pattern is a matrix with correct dimension
-    n_channel x n_channel
+    n_channel x n_channel or a vector of its n_channel diagonal entries
 
     Args:
         noise: noise input to be checked
@@ -128,8 +205,12 @@ def _check_noise(noise, n_channel):
     """
     if noise is None:
         pass
+    elif isinstance(noise, NoiseModel):
+        assert noise.n_channel == n_channel
     elif isinstance(noise, np.ndarray) and noise.ndim == 2:
         assert np.all(noise.shape == (n_channel, n_channel))
+    elif isinstance(noise, np.ndarray) and noise.ndim == 1:
+        assert noise.shape == (n_channel,)
     elif isinstance(noise, Iterable):
         for i, _ in enumerate(noise):
             noise[i] = _check_noise(noise[i], n_channel)
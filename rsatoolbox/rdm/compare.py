@@ -3,20 +3,33 @@
 """
 Comparison methods for comparing two RDMs objects
 """
+from collections.abc import Iterable
+from functools import lru_cache
+import heapq
+import os
+from pathlib import Path
+import tempfile
+import h5py
 import numpy as np
 import scipy.stats
 from scipy import linalg
-from scipy.optimize import minimize
-from scipy.stats._stats import _kendall_dis
-from scipy.spatial.distance import squareform
+from joblib import Parallel, delayed, effective_n_jobs
+from rsatoolbox.data import average_dataset_by
 from rsatoolbox.util.matrix import pairwise_contrast_sparse
-from rsatoolbox.util.matrix import pairwise_contrast
+from rsatoolbox.util.matrix import get_v_solver
 from rsatoolbox.util.rdm_utils import _get_n_from_reduced_vectors
 from rsatoolbox.util.rdm_utils import _get_n_from_length
-from rsatoolbox.util.matrix import row_col_indicator_g
+from rsatoolbox.util.rdm_utils import rank_data
+from rsatoolbox.util.matrix import row_col_indicator_g_sparse
+try:
+    # private compiled helper of scipy.stats.kendalltau, which is not part
+    # of the scipy API. _discordant_pairs falls back to numpy without it.
+    from scipy.stats._stats import _kendall_dis
+except ImportError:
+    _kendall_dis = None
 
 
-def compare(rdm1, rdm2, method='cosine', sigma_k=None):
+def compare(rdm1, rdm2, method='cosine', sigma_k=None, block_size=None):
     """calculates the similarity between two RDMs objects using a chosen method
 
     Args:
@@ -51,12 +64,19 @@ def compare(rdm1, rdm2, method='cosine', sigma_k=None):
             covariance matrix of the pattern estimates.
             Used only for methods 'corr_cov' and 'cosine_cov'.
 
+        block_size (int):
+            if given, the comparison is accumulated over segments of
+            block_size entries of the RDM vectors, see compare_blocked
+
     Returns:
         numpy.ndarray: dist:
             pariwise similarities between the RDMs from the RDMs objects
 
     """
-    if method == 'cosine':
+    if block_size is not None:
+        sim = compare_blocked(rdm1, rdm2, method=method, sigma_k=sigma_k,
+                              block_size=block_size)
+    elif method == 'cosine':
         sim = compare_cosine(rdm1, rdm2)
     elif method == 'spearman':
         sim = compare_spearman(rdm1, rdm2)
@@ -79,6 +99,619 @@ def compare(rdm1, rdm2, method='cosine', sigma_k=None):
     return sim
 
 
+class ComparisonPlan:
+    """ Precomputed comparison of a fixed set of RDMs to many others
+
+    The fixed RDMs are parsed, centered, normalized and whitened once, such
+    that each call to compare only needs to prepare the other RDMs and
+    compute one matrix product. This is useful when the same model RDMs
+    are compared to many data RDMs, e.g. in bootstrap evaluations.
+
+    The methods 'cosine', 'corr', 'spearman', 'rho-a', 'cosine_cov' and
+    'corr_cov' are precomputed. All other methods and other RDMs with
+    different nan positions fall back to calling compare.
+
+    Args:
+        rdm (rsatoolbox.rdm.RDMs or numpy.ndarray):
+            the fixed set of RDMs
+        method (string):
+            comparison method, see compare
+        sigma_k (numpy.ndarray):
+            covariance matrix of the pattern estimates.
+            Used only for methods 'corr_cov' and 'cosine_cov'.
+
+    """
+
+    def __init__(self, rdm, method='cosine', sigma_k=None):
+        self.rdm = rdm
+        self.method = method
+        self.sigma_k = sigma_k
+        self.nan_idx = None
+        self._all_valid = True
+        self._vectors = None
+        if method not in _PLAN_METHODS:
+            return
+        vector = _get_vectors(_plan_input(rdm, method))
+        nan_idx = ~np.isnan(vector)
+        if not np.all(nan_idx == nan_idx[0]):
+            return
+        self.nan_idx = nan_idx[0]
+        self._all_valid = bool(np.all(self.nan_idx))
+        vector, norm = self._prepare(vector[:, self.nan_idx])
+        if self._solve_v():
+            vector = self._solver().solve(vector)
+        if method == 'rho-a':
+            n = vector.shape[1]
+            vector = vector * 12 / (n ** 3 - n)
+        else:
+            vector = vector / np.sqrt(norm).reshape((-1, 1))
+        self._vectors = vector
+
+    def compare(self, rdm):
+        """ compares the fixed RDMs to other RDMs
+
+        Args:
+            rdm (rsatoolbox.rdm.RDMs or numpy.ndarray):
+                second set of RDMs
+
+        Returns:
+            numpy.ndarray: dist:
+                pairwise similarities, equal to
+                compare(self.rdm, rdm, self.method, self.sigma_k)
+
+        """
+        if self._vectors is None:
+            return compare(self.rdm, rdm, self.method, self.sigma_k)
+        vector = _get_vectors(_plan_input(rdm, self.method))
+        if vector.shape[1] != self.nan_idx.shape[0]:
+            return compare(self.rdm, rdm, self.method, self.sigma_k)
+        if self._all_valid:
+            valid = not np.isnan(np.sum(vector))
+        else:
+            valid = np.array_equal(~np.isnan(vector),
+                                   np.broadcast_to(self.nan_idx, vector.shape))
+            vector = vector[:, self.nan_idx]
+        if not valid:
+            return compare(self.rdm, rdm, self.method, self.sigma_k)
+        vector, norm = self._prepare(vector)
+        sim = np.einsum('ij,kj->ik', self._vectors, vector)
+        if self.method != 'rho-a':
+            sim /= np.sqrt(norm).reshape((1, -1))
+        return sim
+
+    def _solve_v(self):
+        """ whether the whitening requires solving with V """
+        return self.method in ('cosine_cov', 'corr_cov') \
+            and self.sigma_k is not None and self.sigma_k.ndim >= 2
+
+    def _solver(self):
+        n_cond = _get_n_from_reduced_vectors(self.nan_idx.reshape(1, -1))
+        return get_v_solver(n_cond, self.sigma_k, self.nan_idx)
+
+    def _prepare(self, vector):
+        """ centers and whitens RDM vectors without nans
+
+        Returns:
+            numpy.ndarray: vector: the prepared vectors
+            numpy.ndarray: norm: their squared norms in the whitened space
+
+        """
+        if self.method in ('corr', 'spearman', 'rho-a', 'corr_cov'):
+            vector = vector - np.mean(vector, 1, keepdims=True)
+        if self.method == 'rho-a':
+            return vector, None
+        if self._solve_v():
+            norm = np.einsum('ij,ij->i', vector,
+                             self._solver().solve(vector))
+            return vector, norm
+        if self.method in ('cosine_cov', 'corr_cov'):
+            vector = _cov_weighting(vector, self.nan_idx, self.sigma_k)
+        return vector, np.einsum('ij,ij->i', vector, vector)
+
+
+_PLAN_METHODS = ('cosine', 'corr', 'spearman', 'rho-a', 'cosine_cov',
+                 'corr_cov')
+
+
+def _plan_input(rdm, method):
+    """ the representation of rdm compared by method """
+    if method in ('spearman', 'rho-a'):
+        return _get_ranks(rdm)
+    return rdm
+
+
+def compare_library(query, library_iter, method='cosine', top_k=10,
+                    chunk_size=1000, sigma_k=None):
+    """finds the RDMs of a large library, which are most similar to the
+    query RDMs
+
+    The library is processed in chunks of chunk_size RDMs, such that only
+    one chunk and the running top_k results need to be held in memory.
+
+    Args:
+        query (rsatoolbox.rdm.RDMs or ComparisonPlan):
+            the query RDMs
+        library_iter:
+            the library RDMs, either an RDMs object, an n_rdm x n_dist
+            array, numpy.memmap or h5py dataset, the filename, opened file
+            or group of a hdf5 file saved with RDMs.save, or an iterable of
+            RDMs objects or arrays, which are processed as they come
+        method (string):
+            comparison method, see compare
+        top_k (int):
+            number of most similar library RDMs to return for each query
+        chunk_size (int):
+            number of library RDMs compared at once
+        sigma_k (numpy.ndarray):
+            covariance matrix of the pattern estimates.
+            Used only for methods 'corr_cov' and 'cosine_cov'.
+
+    Returns:
+        numpy.ndarray: indices: n_query x top_k indices of the most similar
+            library RDMs, sorted by decreasing similarity and padded with -1
+            if the library contains fewer comparable RDMs
+        numpy.ndarray: similarities: n_query x top_k similarities of these
+            RDMs, padded with nan
+
+    """
+    if isinstance(query, ComparisonPlan):
+        plan = query
+    else:
+        plan = ComparisonPlan(query, method, sigma_k)
+    heaps = None
+    offset = 0
+    for chunk in _iter_library_chunks(library_iter, chunk_size):
+        sim = plan.compare(chunk)
+        if heaps is None:
+            heaps = [[] for _ in range(sim.shape[0])]
+        for heap, sim_query in zip(heaps, sim):
+            _push_top_k(heap, sim_query, offset, top_k)
+        offset += sim.shape[1]
+    if heaps is None:
+        heaps = [[] for _ in range(_get_vectors(plan.rdm).shape[0])]
+    indices = np.full((len(heaps), top_k), -1, dtype=int)
+    similarities = np.full((len(heaps), top_k), np.nan)
+    for i, heap in enumerate(heaps):
+        for j, (sim, neg_index) in enumerate(sorted(heap, reverse=True)):
+            indices[i, j] = -neg_index
+            similarities[i, j] = sim
+    return indices, similarities
+
+
+def _push_top_k(heap, sim, offset, top_k):
+    """ updates a heap of the top_k (similarity, -index) pairs with the
+    similarities of one chunk, which starts at index offset """
+    valid = np.flatnonzero(~np.isnan(sim))
+    if len(valid) > top_k:
+        valid = valid[np.argpartition(-sim[valid], top_k - 1)[:top_k]]
+    for idx in valid:
+        # negative indices prefer earlier library entries for equal values
+        item = (sim[idx], -(offset + idx))
+        if len(heap) < top_k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+
+def _iter_library_chunks(library, chunk_size):
+    """ yields the RDM vectors of a library in chunks of chunk_size RDMs """
+    if isinstance(library, (str, Path)) or hasattr(library, 'read'):
+        with h5py.File(library, 'r') as file:
+            yield from _iter_library_chunks(file, chunk_size)
+        return
+    if isinstance(library, h5py.Group):
+        library = library['dissimilarities']
+    elif hasattr(library, 'dissimilarities'):
+        library = library.dissimilarities
+    if hasattr(library, 'shape') and hasattr(library, '__getitem__'):
+        if len(library.shape) == 1:
+            library = library.reshape(1, -1)
+        for start in range(0, library.shape[0], chunk_size):
+            yield np.asarray(library[start:start + chunk_size])
+    else:
+        for chunk in library:
+            yield _get_vectors(chunk)
+
+
+def compare_datasets(dataset1, dataset2, method='cosine_cov', sigma_k=None,
+                     descriptor=None, sketch_dim=None, random_state=0):
+    """calculates the similarity between the squared euclidean RDMs of two
+    sets of datasets directly from their measurements
+
+    For squared euclidean RDMs the whitened RDM vectors used by
+    'cosine_cov' are the double centered second moment matrices
+    X X^T / n_channel. Their inner products are thus traces of products of
+    these matrices, which are computed as the squared Frobenius norms of
+    the n_channel1 x n_channel2 matrices X^T Y. Only datasets with fewer
+    conditions than channels are compared through their n_cond x n_cond
+    second moment matrices instead. If sketch_dim is given, datasets with
+    more channels are first projected onto sketch_dim random dimensions.
+    All datasets with the same number of channels share one projection,
+    such that the sketched similarities stay symmetric and a dataset
+    compared to itself still yields 1.
+
+    Args:
+        dataset1 (rsatoolbox.data.DatasetBase or list of these):
+            first set of datasets
+        dataset2 (rsatoolbox.data.DatasetBase or list of these):
+            second set of datasets
+        method (string):
+            'cosine_cov' = the result of compare(..., method='cosine_cov')
+            on the squared euclidean RDMs of the datasets
+            'cka' = linear centered kernel alignment, which equals
+            'cosine_cov' without sigma_k
+        sigma_k (numpy.ndarray):
+            covariance matrix of the pattern estimates, as a full matrix
+            or the vector of its diagonal. Used only for method 'cosine_cov'.
+        descriptor (String):
+            obs_descriptor used to define the rows/columns of the RDMs
+            defaults to one row/column per row in the dataset
+        sketch_dim (int):
+            number of random dimensions the measurements are projected to,
+            defaults to no projection
+        random_state (int):
+            seed for the random projections
+
+    Returns:
+        numpy.ndarray: dist:
+            pairwise similarities between the datasets
+
+    """
+    if method == 'cka':
+        sigma_k = None
+    elif method != 'cosine_cov':
+        raise ValueError('compare_datasets supports cosine_cov and cka')
+    projections = {}
+    measurements = []
+    for datasets in (dataset1, dataset2):
+        if not isinstance(datasets, Iterable):
+            datasets = [datasets]
+        measurements.append([
+            _sketch(_whiten_measurements(
+                _parse_dataset(dataset, descriptor), sigma_k),
+                sketch_dim, random_state, projections)
+            for dataset in datasets])
+    n_cond = {m.shape[0] for ms in measurements for m in ms}
+    if len(n_cond) > 1:
+        raise ValueError('datasets must have the same number of conditions')
+    grams = [[_small_gram(m) for m in ms] for ms in measurements]
+    norm1 = np.array([np.linalg.norm(g) for g in grams[0]])
+    norm2 = np.array([np.linalg.norm(g) for g in grams[1]])
+    sim = np.array([[_gram_inner(m1, m2, g1, g2)
+                     for m2, g2 in zip(measurements[1], grams[1])]
+                    for m1, g1 in zip(measurements[0], grams[0])])
+    sim /= norm1.reshape((-1, 1))
+    sim /= norm2.reshape((1, -1))
+    return sim
+
+
+def _parse_dataset(dataset, descriptor):
+    """ the measurements of a dataset, averaged by descriptor if given """
+    if descriptor is None:
+        return dataset.measurements
+    measurements, _, _ = average_dataset_by(dataset, descriptor)
+    return measurements
+
+
+def _whiten_measurements(measurements, sigma_k=None):
+    """ transforms measurements X into W, such that W W^T is the whitened
+    second moment matrix used by _cov_weighting for the squared euclidean
+    RDM of X. For a full sigma_k the whitening uses
+    T = sigma_k^-1 - sigma_k^-1 1 1^T sigma_k^-1 / (1^T sigma_k^-1 1) as in
+    the RDM covariance solver, which equals W W^T with W = P L^-1 for the
+    cholesky factor L of sigma_k and the projection P removing L^-1 1.
+    """
+    if sigma_k is not None and sigma_k.ndim == 2:
+        chol = linalg.cholesky(sigma_k, lower=True)
+        whitened = linalg.solve_triangular(chol, measurements, lower=True)
+        ones = linalg.solve_triangular(
+            chol, np.ones(measurements.shape[0]), lower=True)
+        return whitened - np.outer(ones, ones @ whitened) / (ones @ ones)
+    centered = measurements - np.mean(measurements, axis=0, keepdims=True)
+    if sigma_k is not None:
+        centered = centered / np.sqrt(sigma_k).reshape((-1, 1))
+    return centered
+
+
+def _small_gram(measurements):
+    """ the smaller of X X^T and X^T X, which have the same Frobenius norm
+    """
+    if measurements.shape[0] < measurements.shape[1]:
+        return measurements @ measurements.T
+    return measurements.T @ measurements
+
+
+def _gram_inner(measurements1, measurements2, gram1, gram2):
+    """ trace(X X^T Y Y^T) using the condition side gram matrices if both
+    datasets have more channels than conditions """
+    n_cond = measurements1.shape[0]
+    if gram1.shape[0] == n_cond and gram2.shape[0] == n_cond:
+        return np.sum(gram1 * gram2)
+    return np.sum((measurements1.T @ measurements2) ** 2)
+
+
+def _sketch(measurements, sketch_dim, random_state, projections):
+    """ projects measurements onto sketch_dim random dimensions, keeping
+    the second moment matrix in expectation. The projection for each
+    number of channels is drawn once and stored in projections. """
+    n_channel = measurements.shape[1]
+    if sketch_dim is None or n_channel <= sketch_dim:
+        return measurements
+    if n_channel not in projections:
+        if random_state is None:
+            rng = np.random.default_rng()
+        else:
+            rng = np.random.default_rng([random_state, n_channel])
+        projections[n_channel] = rng.standard_normal(
+            (n_channel, sketch_dim)) / np.sqrt(sketch_dim)
+    return measurements @ projections[n_channel]
+
+
+def compare_blocked(rdm1, rdm2, method='cosine', sigma_k=None,
+                    block_size=1000000):
+    """calculates the similarity between two RDMs objects by accumulating
+    inner products, sums and norms over segments of block_size entries of
+    the RDM vectors, such that no full size copies of the vectors are made
+
+    The RDMs can be RDMs objects, arrays, numpy.memmaps, h5py datasets or
+    groups written by RDMs.save, or any other object with a shape
+    attribute, which returns the entries [:, start:stop] of all RDMs on
+    indexing. This allows RDMs, which are generated block by block.
+
+    For method 'rho-a' the ranks are computed by sorting the entries into
+    buckets in temporary files, such that the memory stays bounded by the
+    block size while the disk use grows with the size of the RDMs.
+
+    Args:
+        rdm1 (rsatoolbox.rdm.RDMs or array like):
+            first set of RDMs
+        rdm2 (rsatoolbox.rdm.RDMs or array like):
+            second set of RDMs
+        method (string):
+            'cosine', 'corr', 'rho-a' or 'cosine_cov', see compare
+        sigma_k (numpy.ndarray):
+            vector of the pattern variances for method 'cosine_cov'.
+            Full covariance matrices are not supported.
+        block_size (int):
+            number of RDM vector entries processed at once
+
+    Returns:
+        numpy.ndarray: dist:
+            pariwise similarities between the RDMs from the RDMs objects
+
+    """
+    source1 = _block_source(rdm1)
+    source2 = _block_source(rdm2)
+    if not source1.shape[1] == source2.shape[1]:
+        raise ValueError('rdm1 and rdm2 must be RDMs of equal shape')
+    if method == 'cosine':
+        sim = _blocked_cosine(source1, source2, block_size)
+    elif method == 'corr':
+        sim = _blocked_cosine(source1, source2, block_size, center=True)
+    elif method == 'rho-a':
+        with tempfile.TemporaryDirectory() as directory:
+            ranks1 = _blocked_ranks(source1, block_size, directory)
+            ranks2 = _blocked_ranks(source2, block_size, directory)
+            sim = _blocked_rho_a(ranks1, ranks2, block_size)
+            del ranks1, ranks2
+    elif method == 'cosine_cov':
+        if sigma_k is not None and sigma_k.ndim >= 2:
+            raise ValueError(
+                'blocked cosine_cov supports only diagonal sigma_k')
+        sim = _blocked_cosine_cov(source1, source2, sigma_k, block_size)
+    else:
+        raise ValueError('blocked comparison supports only '
+                         + 'cosine, corr, rho-a and cosine_cov')
+    return sim
+
+
+def _block_source(rdm):
+    """ the 2D array like of RDM vectors, which blocks are read from """
+    if isinstance(rdm, h5py.Group):
+        rdm = rdm['dissimilarities']
+    elif hasattr(rdm, 'dissimilarities'):
+        rdm = rdm.dissimilarities
+    if len(rdm.shape) == 1:
+        rdm = np.asarray(rdm).reshape(1, -1)
+    return rdm
+
+
+def _iter_blocks(sources, block_size):
+    """ yields the start, stop and the float blocks of all sources for
+    consecutive segments of the RDM vectors, which must have the same nan
+    positions """
+    n_dist = sources[0].shape[1]
+    for start in range(0, n_dist, block_size):
+        stop = min(start + block_size, n_dist)
+        blocks = [np.asarray(source[:, start:stop], dtype=np.float64)
+                  for source in sources]
+        valid = ~np.isnan(blocks[0][0])
+        for block in blocks:
+            if not np.all(np.isnan(block) != valid):
+                raise ValueError('rdm1 and rdm2 have different nan positions')
+        yield start, stop, valid, blocks
+
+
+def _blocked_cosine(source1, source2, block_size, center=False):
+    """ cosine similarities or correlations accumulated over blocks. For
+    correlations the sums are shifted by the means of the first block to
+    avoid cancellation """
+    dot = np.zeros((source1.shape[0], source2.shape[0]))
+    sums = [np.zeros(source1.shape[0]), np.zeros(source2.shape[0])]
+    squares = [np.zeros(source1.shape[0]), np.zeros(source2.shape[0])]
+    shifts = None
+    n = 0
+    for _, _, valid, blocks in _iter_blocks([source1, source2], block_size):
+        blocks = [block[:, valid] for block in blocks]
+        if center:
+            if shifts is None and blocks[0].shape[1] > 0:
+                shifts = [np.mean(block, axis=1, keepdims=True)
+                          for block in blocks]
+            if shifts is not None:
+                blocks = [block - shift
+                          for block, shift in zip(blocks, shifts)]
+        dot += blocks[0] @ blocks[1].T
+        for i, block in enumerate(blocks):
+            sums[i] += np.sum(block, axis=1)
+            squares[i] += np.einsum('ij,ij->i', block, block)
+        n += blocks[0].shape[1]
+    if center:
+        dot -= np.outer(sums[0], sums[1]) / n
+        squares = [sq - s ** 2 / n for sq, s in zip(squares, sums)]
+    dot /= np.sqrt(squares[0]).reshape((-1, 1))
+    dot /= np.sqrt(squares[1]).reshape((1, -1))
+    return dot
+
+
+def _blocked_rho_a(ranks1, ranks2, block_size):
+    """ spearman correlations without tie correction from rank vectors,
+    using that the ranks of n entries sum to n * (n + 1) / 2 """
+    dot = np.zeros((ranks1.shape[0], ranks2.shape[0]))
+    n = 0.0
+    for _, _, valid, blocks in _iter_blocks([ranks1, ranks2], block_size):
+        dot += blocks[0][:, valid] @ blocks[1][:, valid].T
+        n += np.sum(valid)
+    dot -= n * ((n + 1) / 2) ** 2
+    return dot / (n ** 3 - n) * 12
+
+
+def _blocked_ranks(source, block_size, directory):
+    """ ranks of the RDM vectors with bounded memory
+
+    The entries of each RDM are distributed into value buckets in temporary
+    files, whose boundaries are quantiles of a subsample of the entries.
+    Each bucket is then ranked on its own and offset by the number of
+    entries in the lower buckets. Entries equal to a boundary get a bucket
+    of their own, whose entries all share the average rank of the tie,
+    such that frequent values do not produce buckets larger than a block.
+
+    Returns:
+        numpy.memmap: the ranks of all RDMs stored in directory
+
+    """
+    n_rdm, n_dist = source.shape
+    directory = tempfile.mkdtemp(dir=directory)
+    ranks = np.memmap(os.path.join(directory, 'ranks.dat'), dtype=np.float64,
+                      mode='w+', shape=(n_rdm, n_dist))
+    record = np.dtype([('value', np.float64), ('index', np.int64)])
+    n_bucket = int(np.ceil(2 * n_dist / block_size))
+    step = max(1, n_dist // block_size)
+    starts = range(0, n_dist, block_size)
+    for i_rdm in range(n_rdm):
+        sample = np.concatenate([
+            np.asarray(source[i_rdm, start:start + block_size],
+                       dtype=np.float64)[::step] for start in starts])
+        sample = np.sort(sample[~np.isnan(sample)])
+        if len(sample) > 0:
+            bounds = np.unique(sample[np.linspace(
+                0, len(sample) - 1, n_bucket + 1).astype(int)[1:-1]])
+        else:
+            bounds = np.zeros(0)
+        # even buckets hold the values between two boundaries, odd buckets
+        # the values equal to a boundary
+        n_files = 2 * len(bounds) + 1
+        files = [os.path.join(directory, f'{i_rdm}_{k}.bin')
+                 for k in range(n_files)]
+        for start in starts:
+            values = np.asarray(source[i_rdm, start:start + block_size],
+                                dtype=np.float64)
+            ranks[i_rdm, start:start + len(values)] = np.nan
+            index = np.flatnonzero(~np.isnan(values))
+            position = np.searchsorted(bounds, values[index], side='left')
+            on_bound = np.zeros(len(index), dtype=bool)
+            inner = position < len(bounds)
+            on_bound[inner] = bounds[position[inner]] \
+                == values[index[inner]]
+            # small integer types allow a fast radix sort
+            bucket = (2 * position + on_bound) \
+                .astype(np.min_scalar_type(n_files))
+            order = np.argsort(bucket, kind='stable')
+            splits = np.searchsorted(bucket[order], np.arange(n_files + 1))
+            for k in np.flatnonzero(np.diff(splits)):
+                in_bucket = order[splits[k]:splits[k + 1]]
+                records = np.empty(len(in_bucket), dtype=record)
+                records['value'] = values[index[in_bucket]]
+                records['index'] = start + index[in_bucket]
+                with open(files[k], 'ab') as file:
+                    records.tofile(file)
+        offset = 0
+        for k, file in enumerate(files):
+            if not os.path.exists(file):
+                continue
+            n_records = os.path.getsize(file) // record.itemsize
+            if k % 2 == 1:
+                for start in range(0, n_records, block_size):
+                    records = np.fromfile(
+                        file, dtype=record, count=block_size,
+                        offset=start * record.itemsize)
+                    ranks[i_rdm, records['index']] = \
+                        offset + (n_records + 1) / 2
+            else:
+                records = np.fromfile(file, dtype=record)
+                ranks[i_rdm, records['index']] = \
+                    rank_data(records['value']) + offset
+            offset += n_records
+            os.remove(file)
+    ranks.flush()
+    return ranks
+
+
+def _blocked_cosine_cov(source1, source2, sigma_k, block_size):
+    """ cosine_cov similarities accumulated over blocks: the first pass
+    collects the row sums for the double centering, the second pass
+    accumulates the inner products of the whitened off-diagonal entries
+    and the diagonal entries are added at the end. """
+    sources = [source1, source2]
+    n_cond = _get_n_from_length(source1.shape[1])
+    row_start = np.concatenate(
+        [[0], np.cumsum(np.arange(n_cond - 1, 0, -1))])
+    if sigma_k is None:
+        scale = np.ones(n_cond)
+    else:
+        scale = 1 / np.sqrt(sigma_k)
+    row_sums = [np.zeros((source.shape[0], n_cond)) for source in sources]
+    for start, stop, valid, blocks in _iter_blocks(sources, block_size):
+        if not np.all(valid):
+            raise ValueError('blocked cosine_cov cannot handle nans')
+        rows, cols = _condensed_indices(start, stop, row_start)
+        for sums, block in zip(row_sums, blocks):
+            for i, vector in enumerate(block):
+                sums[i] += np.bincount(rows, vector, n_cond) \
+                    + np.bincount(cols, vector, n_cond)
+    # row means and overall means of the second moment matrix -0.5 * D
+    means = [-0.5 * sums / n_cond for sums in row_sums]
+    overall = [-np.sum(sums, axis=1, keepdims=True) / (2 * n_cond * n_cond)
+               for sums in row_sums]
+    dot = np.zeros((source1.shape[0], source2.shape[0]))
+    squares = [np.zeros(source.shape[0]) for source in sources]
+    for start, stop, _, blocks in _iter_blocks(sources, block_size):
+        rows, cols = _condensed_indices(start, stop, row_start)
+        weighted = [
+            (-0.5 * block - mean[:, rows] - mean[:, cols] + mm)
+            * (scale[rows] * scale[cols])
+            for block, mean, mm in zip(blocks, means, overall)]
+        # off-diagonal entries appear twice in the second moment matrix
+        dot += 2 * weighted[0] @ weighted[1].T
+        for i, block in enumerate(weighted):
+            squares[i] += 2 * np.einsum('ij,ij->i', block, block)
+    diagonal = [(-2 * mean + mm) * scale ** 2
+                for mean, mm in zip(means, overall)]
+    dot += diagonal[0] @ diagonal[1].T
+    for i, block in enumerate(diagonal):
+        squares[i] += np.einsum('ij,ij->i', block, block)
+    dot /= np.sqrt(squares[0]).reshape((-1, 1))
+    dot /= np.sqrt(squares[1]).reshape((1, -1))
+    return dot
+
+
+def _condensed_indices(start, stop, row_start):
+    """ rows and columns of the condensed RDM entries start to stop """
+    index = np.arange(start, stop)
+    rows = np.searchsorted(row_start, index, side='right') - 1
+    cols = index - row_start[rows] + rows + 1
+    return rows, cols
+
+
 def compare_cosine(rdm1, rdm2):
     """calculates the cosine similarities between two RDMs objects
 
@@ -173,9 +806,8 @@ def compare_spearman(rdm1, rdm2):
             rank correlations between the two RDMs
 
     """
-    vector1, vector2, _ = _parse_input_rdms(rdm1, rdm2)
-    vector1 = np.apply_along_axis(scipy.stats.rankdata, 1, vector1)
-    vector2 = np.apply_along_axis(scipy.stats.rankdata, 1, vector2)
+    vector1, vector2, _ = _parse_input_rdms(_get_ranks(rdm1),
+                                            _get_ranks(rdm2))
     vector1 = vector1 - np.mean(vector1, 1, keepdims=True)
     vector2 = vector2 - np.mean(vector2, 1, keepdims=True)
     sim = _cosine(vector1, vector2)
@@ -196,9 +828,8 @@ def compare_rho_a(rdm1, rdm2):
             rank correlations between the two RDMs
 
     """
-    vector1, vector2, _ = _parse_input_rdms(rdm1, rdm2)
-    vector1 = np.apply_along_axis(scipy.stats.rankdata, 1, vector1)
-    vector2 = np.apply_along_axis(scipy.stats.rankdata, 1, vector2)
+    vector1, vector2, _ = _parse_input_rdms(_get_ranks(rdm1),
+                                            _get_ranks(rdm2))
     vector1 = vector1 - np.mean(vector1, 1, keepdims=True)
     vector2 = vector2 - np.mean(vector2, 1, keepdims=True)
     n = vector1.shape[1]
@@ -221,7 +852,7 @@ def compare_kendall_tau(rdm1, rdm2):
             kendall-tau correlation between the two RDMs
     """
     vector1, vector2, _ = _parse_input_rdms(rdm1, rdm2)
-    sim = _all_combinations(vector1, vector2, _kendall_tau)
+    sim = _kendall_tau_batched(vector1, vector2, variant='b')
     return sim
 
 
@@ -239,18 +870,25 @@ def compare_kendall_tau_a(rdm1, rdm2):
             kendall-tau a between the two RDMs
     """
     vector1, vector2, _ = _parse_input_rdms(rdm1, rdm2)
-    sim = _all_combinations(vector1, vector2, _tau_a)
+    sim = _kendall_tau_batched(vector1, vector2, variant='a')
     return sim
 
 
-def compare_neg_riemannian_distance(rdm1, rdm2, sigma_k=None):
+def compare_neg_riemannian_distance(rdm1, rdm2, sigma_k=None, n_jobs=1):
     """calculates the negative Riemannian distance between two RDMs objects.
 
+    The scale parameters are fitted for all RDMs of rdm1 at once for each
+    RDM of rdm2, starting from the fit for the previous RDM of rdm2.
+
     Args:
         rdm1 (rsatoolbox.rdm.RDMs):
             first set of RDMs
         rdm2 (rsatoolbox.rdm.RDMs):
             second set of RDMs
+        sigma_k (numpy.ndarray):
+            optional, covariance between pattern estimates
+        n_jobs (int):
+            number of joblib jobs the RDMs of rdm2 are distributed over
     Returns:
         numpy.ndarray: dist:
             negative Riemannian distance between the two RDMs
@@ -261,16 +899,23 @@ def compare_neg_riemannian_distance(rdm1, rdm2, sigma_k=None):
         sigma_k = np.eye(n_cond)
     P = np.block([-1*np.ones((n_cond - 1, 1)), np.eye(n_cond - 1)])
     sigma_k_hat = P@sigma_k@P.T
-    # construct RDM to 2nd-moment (G) transformation
-    pairs = pairwise_contrast(np.arange(n_cond-1))
-    pairs[pairs == -1] = 1
-    T = np.block([
-        [np.eye(n_cond - 1), np.zeros((n_cond-1, vector1.shape[1] - n_cond + 1))],
-        [0.5 * pairs, np.diag(-0.5 * np.ones(vector1.shape[1] - n_cond + 1))]])
-    vec_G1 = vector1@np.transpose(T)
-    vec_G2 = vector2@np.transpose(T)
-
-    sim = _all_combinations(vec_G1, vec_G2, _riemannian_distance, sigma_k_hat)
+    # construct sparse RDM to 2nd-moment (G) transformation
+    pairs = abs(pairwise_contrast_sparse(np.arange(n_cond-1)))
+    n_pairs = vector1.shape[1] - n_cond + 1
+    T = scipy.sparse.bmat([
+        [scipy.sparse.identity(n_cond - 1), None],
+        [0.5 * pairs, scipy.sparse.diags(-0.5 * np.ones(n_pairs))]],
+        format='csr')
+    G1 = _vec_to_g((T @ vector1.T).T, n_cond - 1)
+    G2 = _vec_to_g((T @ vector2.T).T, n_cond - 1)
+    if effective_n_jobs(n_jobs) == 1:
+        sim = _neg_riemannian_distance(G1, G2, sigma_k_hat)
+    else:
+        chunks = np.array_split(
+            np.arange(len(G2)), min(effective_n_jobs(n_jobs), len(G2)))
+        sim = np.concatenate(Parallel(n_jobs=n_jobs)(
+            delayed(_neg_riemannian_distance)(G1, G2[chunk], sigma_k_hat)
+            for chunk in chunks), axis=1)
     return sim
 
 
@@ -322,16 +967,12 @@ def _cosine_cov_weighted_slow(vector1, vector2, sigma_k=None, nan_idx=None):
     """
     if nan_idx is not None:
         n_cond = _get_n_from_reduced_vectors(nan_idx.reshape(1, -1))
-        v = _get_v(n_cond, sigma_k)
-        v = v[nan_idx][:, nan_idx]
     else:
         n_cond = _get_n_from_reduced_vectors(vector1)
-        v = _get_v(n_cond, sigma_k)
-    # compute V^-1 vector1/2 for all vectors by solving Vx = vector1/2
-    vector1_m = np.array([scipy.sparse.linalg.cg(v, vector1[i], atol=0)[0]
-                          for i in range(vector1.shape[0])])
-    vector2_m = np.array([scipy.sparse.linalg.cg(v, vector2[i], atol=0)[0]
-                          for i in range(vector2.shape[0])])
+    # compute V^-1 vector1/2 for all vectors at once
+    v_solver = get_v_solver(n_cond, sigma_k, nan_idx)
+    vector1_m = v_solver.solve(vector1)
+    vector2_m = v_solver.solve(vector2)
     # compute the inner products v1^T (V^-1 v2) for all combinations
     cos = np.einsum('ij,kj->ik', vector1, vector2_m)
     # divide by sqrt(v1^T (V^-1 v1))
@@ -402,15 +1043,15 @@ def _cov_weighting(vector, nan_idx, sigma_k=None):
     N, n_dist = vector.shape
     n_cond = _get_n_from_length(nan_idx.shape[0])
     vector_w = -0.5 * np.c_[vector, np.zeros((N, n_cond))]
-    rowI, colI = row_col_indicator_g(n_cond)
-    sumI = rowI + colI
+    rowI, colI = row_col_indicator_g_sparse(n_cond)
+    sumI = (rowI + colI).tocsr()
     if np.all(nan_idx):
         # column and row means
-        m = vector_w @ sumI / n_cond
+        m = (sumI.T @ vector_w.T).T / n_cond
         # Overall mean
         mm = np.sum(vector_w * 2, axis=1, keepdims=True) / (n_cond * n_cond)
         # subtract the column and row means and add overall mean
-        vector_w = vector_w - m @ sumI.T + mm
+        vector_w = vector_w - (sumI @ m.T).T + mm
         if sigma_k is not None:
             if sigma_k.ndim == 1:
                 sigma_k_sqrt = np.sqrt(sigma_k)
@@ -418,25 +1059,21 @@ def _cov_weighting(vector, nan_idx, sigma_k=None):
                 vector_w /= colI @ sigma_k_sqrt
             elif sigma_k.ndim == 2:
                 l_sigma_k = np.linalg.inv(np.linalg.cholesky(sigma_k))
+                # one entry per row, such that the indices are the
+                # row and column of each element of G
+                rows, cols = rowI.indices, colI.indices
                 Gs = np.empty((vector.shape[0], n_cond, n_cond))
-                for i_vec in range(vector.shape[0]):
-                    G = scipy.spatial.distance.squareform(
-                        vector_w[i_vec, :n_dist])
-                    np.fill_diagonal(G, vector_w[i_vec, n_dist:])
-                    Gs[i_vec] = G
-                # These two are the slow lines for this whitening
+                Gs[:, rows, cols] = vector_w
+                Gs[:, cols, rows] = vector_w
+                # This is the slow line for this whitening
                 Gs = np.einsum('ij,mjk,lk->mil', l_sigma_k, Gs, l_sigma_k)
-                vector_w = np.einsum('ij,mjk,ik->mi', rowI, Gs, colI)
+                vector_w = Gs[:, rows, cols]
     else:
         nan_idx_ext = np.concatenate((nan_idx, np.ones(n_cond, np.bool)))
-        sumI = sumI[nan_idx_ext]
-        # get matrix for double centering with missing values:
-        sumI[n_dist:, :] /= 2
-        diag = np.concatenate((np.ones((n_dist, 1)) / 2, np.ones((n_cond, 1))))
-        # one line version much faster here!
-        vector_w = vector_w - (
-            vector_w
-            @ sumI @ np.linalg.inv(sumI.T @ (diag * sumI)) @ (diag * sumI).T)
+        # double centering with missing values:
+        sumI, projector = _nan_centering(
+            n_cond, np.asarray(nan_idx, bool).tobytes())
+        vector_w = vector_w - (sumI.T @ vector_w.T).T @ projector
         if sigma_k is not None:
             if sigma_k.ndim == 1:
                 sigma_k_sqrt = np.sqrt(sigma_k)
@@ -449,6 +1086,42 @@ def _cov_weighting(vector, nan_idx, sigma_k=None):
     return vector_w
 
 
+@lru_cache(maxsize=32)
+def _nan_centering(n_cond, nan_key):
+    """ factors of the double centering for RDM vectors with missing values
+
+    Cached for each pattern of missing values, as bootstraps over patterns
+    produce the same few patterns many times.
+
+    Args:
+        n_cond (int):
+            number of conditions
+        nan_key (bytes):
+            bytes of the boolean vector of non-nan entries
+
+    Returns:
+        sumI (scipy.sparse.csr_matrix):
+            weighted row + column indicator of the valid entries
+        projector (numpy.ndarray):
+            n_cond x (n_valid + n_cond) matrix, such that the centered
+            vectors are vector_w - (sumI.T @ vector_w.T).T @ projector
+
+    """
+    nan_idx = np.frombuffer(nan_key, dtype=bool)
+    n_dist = np.sum(nan_idx)
+    nan_idx_ext = np.concatenate((nan_idx, np.ones(n_cond, bool)))
+    rowI, colI = row_col_indicator_g_sparse(n_cond)
+    sumI = (rowI + colI).tocsr()
+    diag = np.concatenate((np.ones(n_dist) / 2, np.ones(n_cond)))
+    sumI = scipy.sparse.diags(np.concatenate(
+        (np.ones(n_dist), np.ones(n_cond) / 2))) @ sumI[nan_idx_ext]
+    sumI_w = scipy.sparse.diags(diag) @ sumI
+    projector = np.linalg.inv((sumI.T @ sumI_w).toarray())
+    projector = (sumI_w @ projector).T
+    projector.flags.writeable = False
+    return sumI.tocsr(), projector
+
+
 def _cosine(vector1, vector2):
     """computes the cosine angles between two sets of vectors
 
@@ -470,115 +1143,262 @@ def _cosine(vector1, vector2):
     return cos
 
 
-def _riemannian_distance(vec_G1, vec_G2, sigma_k):
-    """computes the Riemannian distance between two vectorized second moments
+def _vec_to_g(vec_G, n_dim):
+    """ second moment matrices from vectors with the diagonal first and the
+    off-diagonal elements in squareform order afterwards """
+    G = np.zeros((vec_G.shape[0], n_dim, n_dim))
+    rows, cols = np.triu_indices(n_dim, 1)
+    G[:, rows, cols] = vec_G[:, n_dim:]
+    G += G.transpose(0, 2, 1)
+    G[:, np.arange(n_dim), np.arange(n_dim)] = vec_G[:, :n_dim]
+    return G
+
+
+def _neg_riemannian_distance(G1, G2, sigma_k):
+    """computes the negative Riemannian distances between all pairs of
+    second moments, minimized over the scales of G1 and sigma_k
+
+    Each G2 is whitened once by its Cholesky factor L, such that the
+    generalized eigenvalues of (exp(t0) G1 + exp(t1) sigma_k, G2) become the
+    eigenvalues of the symmetric exp(t0) W1 + exp(t1) W_sigma with
+    W = L^-1 . L^-T. The overall scale t1 has a closed form solution for
+    each ratio s = t0 - t1, such that only a line search over s remains,
+    which is run for all G1 together and includes the optimum for the
+    previous G2 as a candidate.
 
     Args:
-        vec_G1 (numpy.ndarray):
-            first vectorized second-moment
-        vec_G2 (numpy.ndarray):
-            second vectorized second-moment
+        G1 (numpy.ndarray):
+            first second moments (3D)
+        G2 (numpy.ndarray):
+            second second moments (3D)
+        sigma_k (numpy.ndarray):
+            covariance between pattern estimates in the same space
+
+    Returns:
+        numpy.ndarray: neg_riem: negative riemannian distances
 
-        Returns:
-            neg_riem (float):
-                negative riemannian distance
     """
-    n_cond = _get_n_from_length(len(vec_G1))
-    G1 = np.diag(vec_G1[0:(n_cond-1)])+squareform(vec_G1[(n_cond-1):len(vec_G1)])
-    G2 = np.diag(vec_G2[0:(n_cond-1)])+squareform(vec_G2[(n_cond-1):len(vec_G2)])
-
-    def fun(theta):
-        return np.sqrt((np.log(linalg.eigvalsh(
-            np.exp(theta[0]) * G1 + np.exp(theta[1]) * sigma_k, G2))**2).sum())
-    theta = minimize(fun, (0, 0), method='Nelder-Mead')
-    neg_riem = -1 * theta.fun
+    neg_riem = np.empty((len(G1), len(G2)))
+    ratio = None
+    for i_g, g2 in enumerate(G2):
+        l_inv = linalg.solve_triangular(
+            linalg.cholesky(g2, lower=True), np.eye(len(g2)), lower=True)
+        W1 = l_inv @ G1 @ l_inv.T
+        W_sigma = l_inv @ sigma_k @ l_inv.T
+        ratio, dist = _fit_riemannian_ratio(W1, W_sigma, ratio)
+        neg_riem[:, i_g] = -dist
     return neg_riem
 
 
-def _kendall_tau(vector1, vector2):
-    """computes the kendall-tau between two vectors
+def _riemannian_loss(W1, W_sigma, ratio):
+    """ squared Riemannian distance of exp(ratio) W1 + W_sigma to the
+    identity after the optimal rescaling, i.e. n * variance of the log
+    eigenvalues, for a stack of W1 and ratios """
+    with np.errstate(over='ignore'):
+        eigval = np.linalg.eigvalsh(np.exp(ratio)[:, None, None] * W1
+                                    + W_sigma)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_eig = np.log(eigval)
+    loss = np.sum((log_eig - np.mean(log_eig, axis=1, keepdims=True)) ** 2,
+                  axis=1)
+    loss[~np.all(eigval > 0, axis=1) | ~np.isfinite(loss)] = np.inf
+    return loss
+
+
+def _fit_riemannian_ratio(W1, W_sigma, ratio=None, width=24, n_iter=40):
+    """ minimizes the Riemannian distance over the log scale ratio of W1
+    and W_sigma for a stack of W1
+
+    A coarse grid of ratios around the ratio of the traces and the
+    previous optimum (if given) are evaluated first, followed by a golden
+    section search between the neighbours of the best grid point.
 
     Args:
-        vector1 (numpy.ndarray):
-            first vector
-        vector1 (numpy.ndarray):
-            second vector
+        W1 (numpy.ndarray):
+            whitened first second moments (3D)
+        W_sigma (numpy.ndarray):
+            whitened pattern covariance (2D)
+        ratio (numpy.ndarray):
+            optional previous optimum for each W1
+        width (float):
+            half width of the grid in log units
+        n_iter (int):
+            number of golden section steps
+
     Returns:
-        tau (float):
-            kendall-tau
+        ratio (numpy.ndarray): fitted log scale ratio for each W1
+        dist (numpy.ndarray): Riemannian distance at the optimum
 
     """
-    tau = scipy.stats.kendalltau(vector1, vector2).correlation
-    return tau
-
-
-def _tau_a(vector1, vector2):
-    """computes kendall-tau a between two vectors
-    based on modifying scipy.stats.kendalltau
+    n_w = len(W1)
+    center = np.log(np.trace(W_sigma)) - np.log(np.abs(
+        np.trace(W1, axis1=1, axis2=2)) + np.finfo(float).tiny)
+    grid = center[:, None] + np.arange(-width, width + 1, 2.)
+    if ratio is not None:
+        grid = np.concatenate((grid, ratio[:, None]), axis=1)
+    losses = np.stack([_riemannian_loss(W1, W_sigma, grid[:, k])
+                       for k in range(grid.shape[1])], axis=1)
+    best = np.argmin(losses, axis=1)
+    ratio = grid[np.arange(n_w), best]
+    # golden section search in [ratio - 2, ratio + 2]
+    lower, upper = ratio - 2, ratio + 2
+    golden = (np.sqrt(5) - 1) / 2
+    x1 = upper - golden * (upper - lower)
+    x2 = lower + golden * (upper - lower)
+    f1 = _riemannian_loss(W1, W_sigma, x1)
+    f2 = _riemannian_loss(W1, W_sigma, x2)
+    for _ in range(n_iter):
+        left = f1 < f2
+        upper = np.where(left, x2, upper)
+        lower = np.where(left, lower, x1)
+        x_new = np.where(left, upper - golden * (upper - lower),
+                         lower + golden * (upper - lower))
+        f_new = _riemannian_loss(W1, W_sigma, x_new)
+        x2, f2, x1, f1 = (np.where(left, x1, x_new), np.where(left, f1, f_new),
+                          np.where(left, x_new, x2), np.where(left, f_new, f2))
+    loss = np.min(losses, axis=1)
+    improved = np.minimum(f1, f2) < loss
+    ratio = np.where(improved, np.where(f1 < f2, x1, x2), ratio)
+    loss = np.where(improved, np.minimum(f1, f2), loss)
+    dist = np.sqrt(loss)
+    dist[~np.isfinite(dist)] = np.nan
+    return ratio, dist
+
+
+def _kendall_tau_batched(vectors1, vectors2, variant='b'):
+    """computes kendall-tau a or b between all pairs of vectors
+    following the tie handling of scipy.stats.kendalltau
+
+    All vectors are ranked and their ties counted only once. Each vector
+    of the shorter set is then sorted once and this ordering is reused to
+    count the discordant and jointly tied pairs with all vectors of the
+    other set.
 
     Args:
-        vector1 (numpy.ndarray):
-            first vector
-        vector1 (numpy.ndarray):
-            second vector
+        vectors1 (numpy.ndarray):
+            first set of vectors (2D)
+        vectors2 (numpy.ndarray):
+            second set of vectors (2D)
+        variant (String):
+            'a' for kendall-tau a or 'b' for the tie corrected tau b
+
     Returns:
-        tau (float):
-            kendall-tau a
+        numpy.ndarray: tau: kendall-tau values for all pairs
 
     """
-    size = vector1.size
-    vector1, vector2 = _sort_and_rank(vector1, vector2)
-    vector2, vector1 = _sort_and_rank(vector2, vector1)
-    dis = _kendall_dis(vector1, vector2)  # discordant pairs
-    obs = np.r_[True, (vector1[1:] != vector1[:-1]) |
-                      (vector2[1:] != vector2[:-1]), True]
-    cnt = np.diff(np.nonzero(obs)[0]).astype('int64', copy=False)
-    ntie = (cnt * (cnt - 1) // 2).sum()  # joint ties
-    xtie, x0, x1 = _count_rank_tie(vector1)     # ties in x, stats
-    ytie, y0, y1 = _count_rank_tie(vector2)     # ties in y, stats
+    transpose = len(vectors1) > len(vectors2)
+    if transpose:
+        vectors1, vectors2 = vectors2, vectors1
+    size = vectors1.shape[1]
     tot = (size * (size - 1)) // 2
-    # Note that tot = con + dis + (xtie - ntie) + (ytie - ntie) + ntie
-    #               = con + dis + xtie + ytie - ntie
-    con_minus_dis = tot - xtie - ytie + ntie - 2 * dis
-    tau = con_minus_dis / tot
+    ranks1 = _dense_ranks(vectors1)
+    ranks2 = _dense_ranks(vectors2)
+    xtie = _tie_pairs(np.sort(ranks1, axis=1))
+    ytie = _tie_pairs(np.sort(ranks2, axis=1))
+    tau = np.empty((len(vectors1), len(vectors2)))
+    for i_vec, rank1 in enumerate(ranks1):
+        order = np.argsort(rank1, kind='stable')
+        rank1 = rank1[order]
+        ranks2_ordered = ranks2[:, order]
+        dis = _discordant_pairs(rank1, ranks2_ordered)
+        if xtie[i_vec] > 0:
+            # joint ties can only occur among entries tied in rank1
+            tied = np.bincount(rank1)[rank1] > 1
+            ntie = _tie_pairs(np.sort(
+                rank1[tied] * (size + 1) + ranks2_ordered[:, tied], axis=1))
+        else:
+            ntie = 0
+        con_minus_dis = tot - xtie[i_vec] - ytie + ntie - 2 * dis
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if variant == 'a':
+                tau[i_vec] = con_minus_dis / tot
+            else:
+                tau[i_vec] = con_minus_dis / np.sqrt(tot - xtie[i_vec]) \
+                    / np.sqrt(tot - ytie)
+                tau[i_vec, (xtie[i_vec] == tot) | (ytie == tot)] = np.nan
     # Limit range to fix computational errors
-    tau = min(1., max(-1., tau))
+    tau = np.clip(tau, -1, 1)
+    if transpose:
+        tau = tau.T
     return tau
 
 
-def _sort_and_rank(vector1, vector2):
-    """does the sort and rank step of the _tau calculation"""
-    perm = np.argsort(vector2, kind='mergesort')
-    vector1 = vector1[perm]
-    vector2 = vector2[perm]
-    vector2 = np.r_[True, vector2[1:] != vector2[:-1]].cumsum(dtype=np.intp)
-    return vector1, vector2
-
-
-def _count_rank_tie(ranks):
-    """ counts tied ranks for kendall-tau calculation"""
-    cnt = np.bincount(ranks).astype('int64', copy=False)
-    cnt = cnt[cnt > 1]
-    return ((cnt * (cnt - 1) // 2).sum(),
-            (cnt * (cnt - 1.) * (cnt - 2)).sum(),
-            (cnt * (cnt - 1.) * (2*cnt + 5)).sum())
+def _discordant_pairs(rank1, ranks2):
+    """ number of pairs i, j with rank1[i] < rank1[j] and
+    ranks2[:, i] > ranks2[:, j] for each row of ranks2
 
-
-def _get_v(n_cond, sigma_k):
-    """ get the rdm covariance from sigma_k """
-    # calculate Xi
-    c_mat = pairwise_contrast_sparse(np.arange(n_cond))
-    if sigma_k is None:
-        xi = c_mat @ c_mat.transpose()
-    elif sigma_k.ndim == 1:
-        sigma_k = scipy.sparse.diags(sigma_k)
-        xi = c_mat @ sigma_k @ c_mat.transpose()
-    else:
-        sigma_k = scipy.sparse.csr_matrix(sigma_k)
-        xi = c_mat @ sigma_k @ c_mat.transpose()
-    # calculate V
-    v = xi.multiply(xi).tocsc()
-    return v
+    rank1 must be sorted. Uses the compiled counting of
+    scipy.stats.kendalltau if available. Otherwise ranks2 is sorted within
+    the ties of rank1, such that the discordant pairs are exactly the
+    inversions of ranks2, which are counted by a bottom up merge sort of
+    all rows at once.
+    """
+    if _kendall_dis is not None:
+        return np.array([_kendall_dis(rank1, rank2) for rank2 in ranks2],
+                        dtype=np.int64)
+    scale = np.int64(ranks2.max(initial=0)) + 1
+    values = np.sort(rank1 * scale + ranks2, axis=1) % scale
+    n_row, size = values.shape
+    position = np.arange(size)
+    dis = np.zeros(n_row, dtype=np.int64)
+    width = 1
+    while width < size:
+        pair = position // (2 * width)
+        right = (position // width) % 2 == 1
+        n_pair = pair[-1] + 1
+        # offsets keep the runs of different rows and pairs apart, such
+        # that the keys of all left runs form one sorted array
+        offset = (np.arange(n_row)[:, None] * n_pair + pair) * scale
+        keys = values + offset
+        left_keys = keys[:, ~right].ravel()
+        n_left = left_keys.size // n_row
+        start = np.arange(n_row)[:, None] * n_left + pair[right] * width
+        not_greater = np.searchsorted(left_keys, keys[:, right].ravel(),
+                                      side='right').reshape(n_row, -1) \
+            - start
+        dis += np.sum(width - not_greater, axis=1)
+        values = np.sort(keys, axis=1, kind='stable') - offset
+        width *= 2
+    return dis
+
+
+def _dense_ranks(vectors):
+    """ dense ranks (1, 2, ... without gaps) of each row of vectors """
+    order = np.argsort(vectors, axis=1, kind='stable')
+    values = np.take_along_axis(vectors, order, axis=1)
+    new_value = np.ones(values.shape, dtype=bool)
+    new_value[:, 1:] = values[:, 1:] != values[:, :-1]
+    ranks = np.empty(vectors.shape, dtype=np.intp)
+    np.put_along_axis(ranks, order, np.cumsum(new_value, axis=1), axis=1)
+    return ranks
+
+
+def _tie_pairs(sorted_values):
+    """ number of tied pairs within each row of row-wise sorted values """
+    positions = np.arange(sorted_values.shape[1])
+    new_value = np.ones(sorted_values.shape, dtype=bool)
+    new_value[:, 1:] = sorted_values[:, 1:] != sorted_values[:, :-1]
+    # each entry is tied with all earlier entries of its run
+    run_start = np.maximum.accumulate(
+        np.where(new_value, positions, 0), axis=1)
+    return np.sum(positions - run_start, axis=1)
+
+
+def _get_ranks(rdm):
+    """ ranks of the dissimilarities of each RDM, using the rank cache of
+    RDMs objects """
+    if isinstance(rdm, np.ndarray):
+        return rank_data(rdm, axis=-1)
+    return rdm.get_ranks()
+
+
+def _get_vectors(rdm):
+    """ the RDM vectors of an RDMs object or array as a 2D array """
+    if not isinstance(rdm, np.ndarray):
+        return rdm._peek_vectors()
+    if len(rdm.shape) == 1:
+        return rdm.reshape(1, -1)
+    return rdm
 
 
 def _parse_input_rdms(rdm1, rdm2):
@@ -592,20 +1412,8 @@ def _parse_input_rdms(rdm1, rdm2):
             second set of RDMs
 
     """
-    if not isinstance(rdm1, np.ndarray):
-        vector1 = rdm1.get_vectors()
-    else:
-        if len(rdm1.shape) == 1:
-            vector1 = rdm1.reshape(1, -1)
-        else:
-            vector1 = rdm1
-    if not isinstance(rdm2, np.ndarray):
-        vector2 = rdm2.get_vectors()
-    else:
-        if len(rdm2.shape) == 1:
-            vector2 = rdm2.reshape(1, -1)
-        else:
-            vector2 = rdm2
+    vector1 = _get_vectors(rdm1)
+    vector2 = _get_vectors(rdm2)
     if not vector1.shape[1] == vector2.shape[1]:
         raise ValueError('rdm1 and rdm2 must be RDMs of equal shape')
     nan_idx = ~np.isnan(vector1)
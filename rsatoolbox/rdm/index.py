@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Approximate nearest neighbour search over large libraries of RDMs
+"""
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from rsatoolbox.rdm.compare import ComparisonPlan
+from rsatoolbox.rdm.compare import _get_vectors
+from rsatoolbox.util.file_io import write_dict_hdf5
+from rsatoolbox.util.file_io import write_dict_pkl
+from rsatoolbox.util.file_io import read_dict_hdf5
+from rsatoolbox.util.file_io import read_dict_pkl
+from rsatoolbox.util.file_io import remove_file
+
+
+class RDMIndex:
+    """
+    Inverted file (IVF) index for retrieving the RDMs most similar to a
+    query under cosine or correlation similarity.
+
+    The RDM vectors are centered (for 'corr'), normalized and stored in
+    single precision. They are partitioned into n_lists lists by spherical
+    k-means, which is trained on the first batch of added RDMs. A search
+    scores only the RDMs in the n_probe lists with the closest centroids,
+    and the best candidates are re-ranked in double precision. The
+    re-ranking is exact if the raw dissimilarities are stored, otherwise
+    it uses the stored single precision vectors.
+
+    Args:
+        method (String):
+            'cosine' or 'corr'
+        n_lists (int):
+            number of lists, defaults to the square root of the number of
+            RDMs in the first batch
+        n_probe (int):
+            number of lists searched per query
+        random_state (int):
+            seed for the k-means initialisation
+        store_dissimilarities (bool):
+            whether to keep a double precision copy of the added RDMs for
+            exact re-ranking, which triples the memory of the index
+
+    """
+
+    def __init__(self, method='cosine', n_lists=None, n_probe=8,
+                 random_state=None, store_dissimilarities=False):
+        if method not in ('cosine', 'corr'):
+            raise ValueError('RDMIndex supports only cosine and corr')
+        self.method = method
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.random_state = random_state
+        self.store_dissimilarities = store_dissimilarities
+        self.centroids = None
+        self._dissimilarities = []
+        self._vectors = []
+        self._lists = []
+        self._starts = np.zeros(1, dtype=int)
+        self._order = None
+        self._offsets = None
+
+    @property
+    def n_rdm(self):
+        """ number of RDMs in the index """
+        return int(self._starts[-1])
+
+    @property
+    def dissimilarities(self):
+        """ the stored RDM vectors in the order they were added, None if
+        the index does not store the raw dissimilarities """
+        if not self._dissimilarities:
+            return None
+        return np.concatenate(self._dissimilarities)
+
+    def add(self, rdms):
+        """ adds RDMs to the index. The first call trains the centroids.
+
+        Args:
+            rdms (rsatoolbox.rdm.RDMs or numpy.ndarray): RDMs to add
+
+        """
+        dissimilarities = _get_vectors(rdms)
+        if self._vectors and \
+                dissimilarities.shape[1] != self._vectors[0].shape[1]:
+            raise ValueError('RDMs must have the same shape as the index')
+        vectors = self._normalize(dissimilarities)
+        if self.centroids is None:
+            self._train(vectors)
+        if self.store_dissimilarities:
+            self._dissimilarities.append(np.array(dissimilarities))
+        self._append(vectors, np.argmax(vectors @ self.centroids.T, axis=1))
+
+    def search(self, query, k=10, n_probe=None, n_rerank=None):
+        """ finds the k stored RDMs most similar to each query RDM
+
+        Args:
+            query (rsatoolbox.rdm.RDMs or numpy.ndarray): query RDMs
+            k (int): number of RDMs to return per query
+            n_probe (int): number of lists searched, defaults to the
+                n_probe of the index
+            n_rerank (int): number of candidates re-ranked in double
+                precision, defaults to 4 * k
+
+        Returns:
+            numpy.ndarray: indices: n_query x k indices of the most similar
+                RDMs in the index, sorted by decreasing similarity and
+                padded with -1 if fewer RDMs were found
+            numpy.ndarray: similarities: n_query x k similarities, exact
+                if the raw dissimilarities are stored, padded with nan
+
+        """
+        if n_probe is None:
+            n_probe = self.n_probe
+        if n_rerank is None:
+            n_rerank = 4 * k
+        n_rerank = max(n_rerank, k)
+        query_vectors = _get_vectors(query)
+        indices = np.full((query_vectors.shape[0], k), -1, dtype=int)
+        similarities = np.full((query_vectors.shape[0], k), np.nan)
+        if self.n_rdm == 0:
+            return indices, similarities
+        self._sort_lists()
+        query_norm = self._normalize(query_vectors, dtype=np.float64)
+        n_probe = min(n_probe, self.centroids.shape[0])
+        probes = np.argsort(-(query_norm @ self.centroids.T), axis=1)
+        for i_query, query_vec in enumerate(query_norm):
+            candidates = np.concatenate([
+                self._order[self._offsets[i]:self._offsets[i + 1]]
+                for i in probes[i_query, :n_probe]])
+            vectors = self._gather(self._vectors, candidates)
+            if len(candidates) > n_rerank:
+                keep = np.argpartition(
+                    -(vectors @ query_vec.astype(np.float32)),
+                    n_rerank - 1)[:n_rerank]
+                candidates = candidates[keep]
+                vectors = vectors[keep]
+            if self._dissimilarities:
+                plan = ComparisonPlan(query_vectors[i_query], self.method)
+                sim = plan.compare(
+                    self._gather(self._dissimilarities, candidates))[0]
+            else:
+                sim = vectors.astype(np.float64) @ query_vec
+            sim = np.where(np.isnan(sim), -np.inf, sim)
+            best = np.lexsort((candidates, -sim))[:k]
+            best = best[np.isfinite(sim[best])]
+            indices[i_query, :len(best)] = candidates[best]
+            similarities[i_query, :len(best)] = sim[best]
+        return indices, similarities
+
+    def save(self, filename, file_type='hdf5', overwrite=False):
+        """ saves the index into a file
+
+        Args:
+            filename(String): path to file to save to
+                [or opened file]
+            file_type(String): Type of file to create:
+                hdf5: hdf5 file
+                pkl: pickle file
+            overwrite(Boolean): overwrites file if it already exists
+
+        """
+        index_dict = self.to_dict()
+        if overwrite:
+            remove_file(filename)
+        if file_type == 'hdf5':
+            write_dict_hdf5(filename, index_dict)
+        elif file_type == 'pkl':
+            write_dict_pkl(filename, index_dict)
+
+    def to_dict(self):
+        """ converts the index into a dictionary, which can be saved to disk
+
+        Returns:
+            index_dict(dict): dictionary containing all information required
+                to recreate the RDMIndex object
+        """
+        index_dict = {}
+        index_dict['method'] = self.method
+        index_dict['n_lists'] = self.n_lists
+        index_dict['n_probe'] = self.n_probe
+        index_dict['store_dissimilarities'] = int(self.store_dissimilarities)
+        index_dict['centroids'] = self.centroids
+        index_dict['vectors'] = _batch_dict(self._vectors)
+        index_dict['lists'] = _batch_dict(self._lists)
+        index_dict['dissimilarities'] = _batch_dict(self._dissimilarities)
+        return index_dict
+
+    def _normalize(self, dissimilarities, dtype=np.float32):
+        """ centered (for corr) unit norm vectors with nans set to 0 """
+        vectors = np.array(dissimilarities, dtype=np.float64)
+        valid = ~np.isnan(vectors)
+        vectors[~valid] = 0
+        if self.method == 'corr':
+            mean = np.sum(vectors, axis=1, keepdims=True) \
+                / np.maximum(np.sum(valid, axis=1, keepdims=True), 1)
+            vectors = (vectors - mean) * valid
+        norm = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+        norm[norm == 0] = 1
+        return (vectors / norm[:, None]).astype(dtype, copy=False)
+
+    def _train(self, vectors, n_iter=20):
+        """ spherical k-means for the list centroids """
+        n_lists = self.n_lists
+        if n_lists is None:
+            n_lists = int(np.ceil(np.sqrt(vectors.shape[0])))
+        n_lists = max(1, min(n_lists, vectors.shape[0]))
+        rng = np.random.default_rng(self.random_state)
+        centroids = vectors[rng.choice(vectors.shape[0], n_lists,
+                                       replace=False)]
+        for _ in range(n_iter):
+            labels = np.argmax(vectors @ centroids.T, axis=1)
+            sums = coo_matrix(
+                (np.ones(len(labels), np.float32),
+                 (labels, np.arange(len(labels)))),
+                shape=(n_lists, len(labels))).tocsr() @ vectors
+            norm = np.sqrt(np.einsum('ij,ij->i', sums, sums))
+            filled = norm > 0
+            centroids[filled] = sums[filled] / norm[filled, None]
+        self.n_lists = n_lists
+        self.centroids = centroids
+
+    def _append(self, vectors, lists):
+        """ adds a batch of normalized vectors and their list labels """
+        self._vectors.append(vectors)
+        self._lists.append(lists)
+        self._starts = np.append(self._starts,
+                                 self._starts[-1] + vectors.shape[0])
+        self._order = None
+
+    def _gather(self, batches, indices):
+        """ rows of the batched arrays at the given indices of the index """
+        batch = np.searchsorted(self._starts, indices, side='right') - 1
+        result = np.empty((len(indices), batches[0].shape[1]),
+                          dtype=batches[0].dtype)
+        for i_batch in np.unique(batch):
+            take = batch == i_batch
+            result[take] = batches[i_batch][
+                indices[take] - self._starts[i_batch]]
+        return result
+
+    def _sort_lists(self):
+        """ sorts the RDMs into their lists """
+        if self._order is None and self._lists:
+            lists = np.concatenate(self._lists)
+            self._order = np.argsort(lists, kind='stable')
+            self._offsets = np.searchsorted(
+                lists[self._order], np.arange(self.n_lists + 1))
+
+
+def rdm_index_from_dict(index_dict):
+    """ creates an RDMIndex object from a dictionary
+
+    Args:
+        index_dict (dict): dictionary with information
+
+    Returns:
+        rdm_index: the regenerated RDMIndex object
+
+    """
+    index = RDMIndex(
+        method=str(index_dict['method']),
+        n_lists=_to_int(index_dict['n_lists']),
+        n_probe=_to_int(index_dict['n_probe']),
+        store_dissimilarities=bool(index_dict['store_dissimilarities']))
+    if index_dict['centroids'] is not None:
+        index.centroids = np.asarray(index_dict['centroids'], np.float32)
+    index._dissimilarities = _batch_list(index_dict['dissimilarities'])
+    for vectors, lists in zip(_batch_list(index_dict['vectors']),
+                              _batch_list(index_dict['lists'])):
+        index._append(np.asarray(vectors, np.float32),
+                      np.asarray(lists, dtype=int))
+    return index
+
+
+def load_rdm_index(filename, file_type=None):
+    """ loads an RDMIndex object from disk
+
+    Args:
+        filename(String): path to file to load
+
+    """
+    if file_type is None:
+        if isinstance(filename, str):
+            if filename[-4:] == '.pkl':
+                file_type = 'pkl'
+            elif filename[-3:] == '.h5' or filename[-4:] == 'hdf5':
+                file_type = 'hdf5'
+    if file_type == 'hdf5':
+        index_dict = read_dict_hdf5(filename)
+    elif file_type == 'pkl':
+        index_dict = read_dict_pkl(filename)
+    else:
+        raise ValueError('filetype not understood')
+    return rdm_index_from_dict(index_dict)
+
+
+def _batch_dict(batches):
+    """ stores a list of batch arrays as a dict, which hdf5 saves as a group
+    """
+    return {str(i): batch for i, batch in enumerate(batches)}
+
+
+def _batch_list(batch_dict):
+    """ restores the list of batch arrays saved by _batch_dict """
+    return [batch_dict[key] for key in sorted(batch_dict, key=int)]
+
+
+def _to_int(value):
+    """ converts values read from files to int, keeping None """
+    if value is None:
+        return None
+    return int(value)
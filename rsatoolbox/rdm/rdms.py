@@ -11,9 +11,9 @@ import numpy as np
 from rsatoolbox.rdm.combine import _mean
 from rsatoolbox.util.rdm_utils import batch_to_vectors
 from rsatoolbox.util.rdm_utils import batch_to_matrices
+from rsatoolbox.util.rdm_utils import rank_data
 from rsatoolbox.util.descriptor_utils import format_descriptor
 from rsatoolbox.util.descriptor_utils import num_index
-from rsatoolbox.util.descriptor_utils import subset_descriptor
 from rsatoolbox.util.descriptor_utils import check_descriptor_length_error
 from rsatoolbox.util.descriptor_utils import append_descriptor
 from rsatoolbox.util.descriptor_utils import dict_to_list
@@ -84,6 +84,16 @@ class RDMs:
             self.rdm_descriptors['index'] = list(range(self.n_rdm))
         self.dissimilarity_measure = dissimilarity_measure
 
+    @property
+    def dissimilarities(self):
+        """ RDMs as a matrix with one row per RDM """
+        return self._dissimilarities
+
+    @dissimilarities.setter
+    def dissimilarities(self, value):
+        self._dissimilarities = value
+        self._rank_cache = None
+
     def __repr__(self):
         """
         defines string which is printed for the object
@@ -117,16 +127,9 @@ class RDMs:
         """
         allows indexing with []
         and iterating over RDMs with `for rdm in rdms:`
+        returns a lightweight RDMsView of the selected RDMs
         """
-        dissimilarities = self.dissimilarities[np.array(idx)].reshape(
-            -1, self.dissimilarities.shape[1])
-        rdm_descriptors = subset_descriptor(self.rdm_descriptors, idx)
-        rdms = RDMs(dissimilarities,
-                    dissimilarity_measure=self.dissimilarity_measure,
-                    descriptors=self.descriptors,
-                    rdm_descriptors=rdm_descriptors,
-                    pattern_descriptors=self.pattern_descriptors)
-        return rdms
+        return RDMsView(self, _view_index(idx, self.n_rdm))
 
     def __len__(self) -> int:
         """
@@ -151,9 +154,62 @@ class RDMs:
             numpy.ndarray: RDMs as a 3-Tensor with one matrix per RDM
 
         """
-        matrices, _, _ = batch_to_matrices(self.dissimilarities)
+        matrices, _, _ = batch_to_matrices(self._peek_vectors())
         return matrices
 
+    def get_ranks(self, method='average'):
+        """ Returns the ranks of the dissimilarities within each RDM
+
+        nan entries stay nan. The ranks are cached together with the array
+        they were computed from, such that repeated rank based comparisons
+        of the same RDMs reuse them. Assigning new dissimilarities
+        invalidates the cache. Changes of the dissimilarities in place are
+        not detected, such that the dissimilarities need to be assigned
+        again afterwards.
+
+        Args:
+            method(String): how ranks are assigned to tied values
+                options are: 'average', 'min', 'max', 'dense', 'ordinal'
+
+        Returns:
+            numpy.ndarray: read-only ranks with one row per RDM
+
+        """
+        source = self._rank_source()
+        if self._rank_cache is not None \
+                and self._rank_cache[0] == method \
+                and self._rank_cache[1] is source:
+            return self._rank_cache[2]
+        ranks = rank_data(self._peek_vectors(), axis=1, method=method)
+        ranks.flags.writeable = False
+        self._rank_cache = (method, source, ranks)
+        return ranks
+
+    def _peek_vectors(self):
+        """ the dissimilarities without copying them, which must not be
+        changed by the caller """
+        return self._dissimilarities
+
+    def _view_sources(self, index):
+        """ the arrays and descriptors a view of this RDMs object selects
+        from and the indices it selects """
+        return self._dissimilarities, index, self.rdm_descriptors, index
+
+    def _rank_source(self):
+        """ the array, whose replacement invalidates the cached ranks """
+        return self._dissimilarities
+
+    def _pass_rank_cache(self, rdms, selection):
+        """ passes the cached ranks of the selected RDMs on to rdms, which
+        remain valid only while rdms reads from the same array """
+        if self._rank_cache is None \
+                or self._rank_cache[1] is not self._rank_source():
+            return
+        method, source, ranks = self._rank_cache
+        ranks = ranks[selection].reshape(-1, ranks.shape[1])
+        ranks.flags.writeable = False
+        rdms._rank_cache = (method, source, ranks)
+
     def subset_pattern(self, by, value):
         """ Returns a smaller RDMs with patterns with certain descriptor values
 
@@ -243,23 +299,13 @@ class RDMs:
                         from descriptors
 
         Returns:
-            RDMs object, with fewer RDMs
+            RDMsView object, with fewer RDMs
 
         """
         if by is None:
             by = 'index'
         selection = num_index(self.rdm_descriptors[by], value)
-        dissimilarities = self.dissimilarities[selection, :]
-        descriptors = self.descriptors
-        pattern_descriptors = self.pattern_descriptors
-        rdm_descriptors = extract_dict(self.rdm_descriptors, selection)
-        dissimilarity_measure = self.dissimilarity_measure
-        rdms = RDMs(dissimilarities=dissimilarities,
-                    descriptors=descriptors,
-                    rdm_descriptors=rdm_descriptors,
-                    pattern_descriptors=pattern_descriptors,
-                    dissimilarity_measure=dissimilarity_measure)
-        return rdms
+        return RDMsView(self, _view_index(selection, self.n_rdm))
 
     def subsample(self, by, value):
         """ Returns a subsampled RDMs with repetitions if values are repeated
@@ -271,7 +317,7 @@ class RDMs:
                         from descriptors
 
         Returns:
-            RDMs object, with subsampled RDMs
+            RDMsView object, with subsampled RDMs
 
         """
         if by is None:
@@ -287,17 +333,7 @@ class RDMs:
             for j, d in enumerate(desc):
                 if d == value:
                     selection.append(j)
-        dissimilarities = self.dissimilarities[selection, :]
-        descriptors = self.descriptors
-        pattern_descriptors = self.pattern_descriptors
-        rdm_descriptors = extract_dict(self.rdm_descriptors, selection)
-        dissimilarity_measure = self.dissimilarity_measure
-        rdms = RDMs(dissimilarities=dissimilarities,
-                    descriptors=descriptors,
-                    rdm_descriptors=rdm_descriptors,
-                    pattern_descriptors=pattern_descriptors,
-                    dissimilarity_measure=dissimilarity_measure)
-        return rdms
+        return RDMsView(self, _view_index(selection, self.n_rdm))
 
     def append(self, rdm):
         """ appends an rdm to the object
@@ -440,6 +476,178 @@ class RDMs:
         )
 
 
+def _view_attribute(name, doc=None):
+    """ property of RDMsView, which is stored in the view once set """
+    return property(lambda self: self._get(name),
+                    lambda self, value: self._set(name, value), doc=doc)
+
+
+class RDMsView(RDMs):
+    """ RDMsView class
+
+    A lightweight selection of RDMs from a parent RDMs object, which is
+    returned by indexing, iteration, subset and subsample. It stores the
+    parent's dissimilarity array and descriptors as they are when the view
+    is created together with the selected indices, such that assigning new
+    values to the parent later, e.g. by sort_by, reorder or append, does not
+    change the view. The selected dissimilarities are copied into a private
+    array when they are first accessed through dissimilarities or
+    get_vectors, such that they can be changed without changing the parent.
+    Comparisons read the selected dissimilarities without copying them.
+    The descriptors and pattern_descriptors dictionaries are shared with the
+    parent as for RDMs created by subset.
+
+    Assigning an attribute stores it in the view only. to_rdms creates an
+    independent copy of the whole selection.
+
+    Args:
+        parent (RDMs): the RDMs object the view selects from
+        index (slice or numpy.ndarray): the selected RDMs, as a slice with
+            step 1 or an array of indices
+
+    """
+
+    def __init__(self, parent, index):
+        self._source, self._index, self._rdm_source, self._rdm_index = \
+            parent._view_sources(index)
+        self._own = {
+            'n_cond': parent.n_cond,
+            'descriptors': parent.descriptors,
+            'pattern_descriptors': parent.pattern_descriptors,
+            'dissimilarity_measure': parent.dissimilarity_measure}
+        self._shared = None
+        self._rank_cache = None
+        parent._pass_rank_cache(self, index)
+
+    def _get(self, name):
+        """ the attribute name of the view """
+        if name in self._own:
+            return self._own[name]
+        if name == 'dissimilarities':
+            # copy on first access, such that changes stay in the view
+            self._own[name] = np.array(self._peek_vectors())
+            self._shared = None
+            return self._own[name]
+        if name == 'rdm_descriptors':
+            self._own[name] = {
+                k: [v[i] for i in _index_range(self._rdm_index)]
+                for k, v in self._rdm_source.items()}
+            return self._own[name]
+        if name == 'n_rdm':
+            return len(_index_range(self._index))
+        raise AttributeError(name)
+
+    def _set(self, name, value):
+        """ sets the attribute name on the view only """
+        if name == 'dissimilarities':
+            self._rank_cache = None
+        self._own[name] = value
+
+    def _peek_vectors(self):
+        """ the selected dissimilarities without copying them, read-only
+        unless the view has its own dissimilarities """
+        if 'dissimilarities' in self._own:
+            return self._own['dissimilarities']
+        if isinstance(self._index, slice):
+            vectors = self._source[self._index]
+            vectors.flags.writeable = False
+            return vectors
+        if self._shared is None:
+            self._shared = self._source[self._index]
+            self._shared.flags.writeable = False
+        return self._shared
+
+    def _view_sources(self, index):
+        """ the arrays and descriptors a view of this view selects from and
+        the indices it selects """
+        if 'dissimilarities' in self._own:
+            source = self._own['dissimilarities'], index
+        else:
+            source = self._source, _compose_index(self._index, index)
+        if 'rdm_descriptors' in self._own:
+            rdm_source = self._own['rdm_descriptors'], index
+        else:
+            rdm_source = (self._rdm_source,
+                          _compose_index(self._rdm_index, index))
+        return source + rdm_source
+
+    def _rank_source(self):
+        """ the array, whose replacement invalidates the cached ranks """
+        return self._own.get('dissimilarities', self._source)
+
+    dissimilarities = _view_attribute('dissimilarities',
+                                      RDMs.dissimilarities.__doc__)
+    rdm_descriptors = _view_attribute('rdm_descriptors')
+    n_rdm = _view_attribute('n_rdm')
+    n_cond = _view_attribute('n_cond')
+    descriptors = _view_attribute('descriptors')
+    pattern_descriptors = _view_attribute('pattern_descriptors')
+    dissimilarity_measure = _view_attribute('dissimilarity_measure')
+
+    def to_rdms(self):
+        """ creates an independent RDMs object with copies of the data
+
+        Returns:
+            rsatoolbox.rdm.RDMs: the selected RDMs
+        """
+        return RDMs(np.array(self._peek_vectors()),
+                    dissimilarity_measure=self.dissimilarity_measure,
+                    descriptors=deepcopy(self.descriptors),
+                    rdm_descriptors=deepcopy(self.rdm_descriptors),
+                    pattern_descriptors=deepcopy(self.pattern_descriptors))
+
+    def __deepcopy__(self, memo):
+        """ copies only the selected RDMs instead of the parent """
+        return self.to_rdms()
+
+    def __reduce_ex__(self, protocol):
+        """ pickles only the selected RDMs as an RDMs object """
+        return (RDMs, (self._peek_vectors(), self.dissimilarity_measure,
+                       self.descriptors, self.rdm_descriptors,
+                       self.pattern_descriptors))
+
+
+def _view_index(idx, n_rdm):
+    """ converts an index for RDMs into a slice for contiguous selections
+    or an array of non-negative indices otherwise """
+    if isinstance(idx, slice):
+        start, stop, step = idx.indices(n_rdm)
+        if step == 1:
+            return slice(start, max(start, stop))
+        return np.arange(start, stop, step)
+    idx = np.asarray(idx)
+    if idx.size == 0:
+        return np.zeros(0, dtype=np.intp)
+    if idx.ndim == 0:
+        i = int(idx)
+        if not -n_rdm <= i < n_rdm:
+            raise IndexError(
+                f'index {i} is out of bounds for {n_rdm} RDMs')
+        i = i % n_rdm
+        return slice(i, i + 1)
+    index = np.arange(n_rdm)[idx].reshape(-1)
+    if len(index) > 0 and np.all(np.diff(index) == 1):
+        return slice(int(index[0]), int(index[-1]) + 1)
+    return index
+
+
+def _compose_index(outer, inner):
+    """ the parent indices of the selection inner from the selection outer
+    """
+    if isinstance(outer, slice) and isinstance(inner, slice):
+        return slice(outer.start + inner.start, outer.start + inner.stop)
+    if isinstance(outer, slice):
+        return outer.start + inner
+    return outer[inner]
+
+
+def _index_range(index):
+    """ the selected indices as a range or array """
+    if isinstance(index, slice):
+        return range(index.start, index.stop)
+    return index
+
+
 def rdms_from_dict(rdm_dict):
     """ creates a RDMs object from a dictionary
 
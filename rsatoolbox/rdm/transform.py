@@ -5,7 +5,6 @@
 
 from copy import deepcopy
 import numpy as np
-from scipy.stats import rankdata
 from .rdms import RDMs
 
 
@@ -27,9 +26,7 @@ def rank_transform(rdms, method='average'):
         rdms_new(RDMs): RDMs object with rank transformed dissimilarities
 
     """
-    dissimilarities = rdms.get_vectors()
-    dissimilarities = np.array([rankdata(dissimilarities[i], method=method)
-                                for i in range(rdms.n_rdm)])
+    dissimilarities = np.array(rdms.get_ranks(method=method))
     measure = rdms.dissimilarity_measure
     if not measure[-7:] == '(ranks)':
         measure = measure + ' (ranks)'
@@ -53,7 +50,7 @@ def sqrt_transform(rdms):
         rdms_new(RDMs): RDMs object with sqrt transformed dissimilarities
 
     """
-    dissimilarities = rdms.get_vectors()
+    dissimilarities = rdms.get_vectors().copy()
     dissimilarities[dissimilarities < 0] = 0
     dissimilarities = np.sqrt(dissimilarities)
     if rdms.dissimilarity_measure == 'squared euclidean':
@@ -80,7 +77,7 @@ def positive_transform(rdms):
         rdms_new(RDMs): RDMs object with sqrt transformed dissimilarities
 
     """
-    dissimilarities = rdms.get_vectors()
+    dissimilarities = rdms.get_vectors().copy()
     dissimilarities[dissimilarities < 0] = 0
     rdms_new = RDMs(dissimilarities,
                     dissimilarity_measure=rdms.dissimilarity_measure,
@@ -75,8 +75,8 @@ def make_dataset(model, theta, cond_vec, n_channel=30, n_sim=1,
     # Note that this step assumes that RDM uses squared Euclidean distances
     RDM = model.predict(theta)
     D = squareform(RDM)
-    H = rsatoolbox.util.matrix.centering(D.shape[0])
-    G = -0.5 * (H @ D @ H)
+    H = rsatoolbox.util.matrix.centering_operator(D.shape[0])
+    G = -0.5 * (H @ (H @ D).T).T
 
     # Make design matrix
     if cond_vec.ndim == 1:
@@ -6,7 +6,7 @@ Inference module utilities
 
 import numpy as np
 from scipy import stats
-from scipy.stats import rankdata, wilcoxon
+from scipy.stats import wilcoxon
 from collections.abc import Iterable
 from rsatoolbox.model import Model
 from rsatoolbox.rdm import RDMs
@@ -107,18 +107,18 @@ def pool_rdm(rdms, method='cosine'):
         rdm_vec = _nan_mean(rdm_vec)
         rdm_vec = rdm_vec - np.nanmin(rdm_vec)
     elif method == 'spearman' or method == 'rho-a':
-        rdm_vec = np.array([_nan_rank_data(v) for v in rdm_vec])
+        rdm_vec = rdms.get_ranks()
         rdm_vec = _nan_mean(rdm_vec)
     elif method == 'rho-a':
-        rdm_vec = np.array([_nan_rank_data(v) for v in rdm_vec])
+        rdm_vec = rdms.get_ranks()
         rdm_vec = _nan_mean(rdm_vec)
     elif method == 'kendall' or method == 'tau-b':
         Warning('Noise ceiling for tau based on averaged ranks!')
-        rdm_vec = np.array([_nan_rank_data(v) for v in rdm_vec])
+        rdm_vec = rdms.get_ranks()
         rdm_vec = _nan_mean(rdm_vec)
     elif method == 'tau-a':
         Warning('Noise ceiling for tau based on averaged ranks!')
-        rdm_vec = np.array([_nan_rank_data(v) for v in rdm_vec])
+        rdm_vec = rdms.get_ranks()
         rdm_vec = _nan_mean(rdm_vec)
     else:
         raise ValueError('Unknown RDM comparison method requested!')
@@ -147,23 +147,6 @@ def _nan_mean(rdm_vector):
     return rdm_mean
 
 
-def _nan_rank_data(rdm_vector):
-    """ rank_data for vectors with nan entries
-
-    Args:
-        rdm_vector(numpy.ndarray): the vector to be rank_transformed
-
-    Returns:
-        ranks(numpy.ndarray): the ranks with nans where the original vector
-            had nans
-
-    """
-    ranks_no_nan = rankdata(rdm_vector[~np.isnan(rdm_vector)])
-    ranks = np.ones_like(rdm_vector) * np.nan
-    ranks[~np.isnan(rdm_vector)] = ranks_no_nan
-    return ranks
-
-
 def all_tests(evaluations, noise_ceil, test_type='t-test',
               model_var=None, diff_var=None, noise_ceil_var=None,
               dof=1):
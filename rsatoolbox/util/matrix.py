@@ -4,10 +4,14 @@
 Collection of different utility Matrices
 """
 
+from collections import OrderedDict
+import hashlib
 from typing import List
 
 import numpy as np
-from scipy.sparse import coo_matrix, csr_matrix
+from scipy import linalg
+from scipy.sparse import csr_matrix, diags
+from scipy.sparse.linalg import LinearOperator
 
 
 def indicator(index_vector, positive=False):
@@ -50,21 +54,7 @@ def pairwise_contrast(index_vector):
         contrast matrix
 
     """
-    c_unique = np.unique(index_vector)
-    n_unique = c_unique.size
-    rows = np.size(index_vector)
-    cols = int(n_unique * (n_unique - 1) / 2)
-    indicator_matrix = np.zeros((cols, rows))
-    n_row = 0
-    # Now make an indicator_matrix with a pair of conditions per row
-    for i in range(n_unique):
-        for j in np.arange(i + 1, n_unique):
-            select = (index_vector == c_unique[i])
-            indicator_matrix[n_row, select] = 1. / np.sum(select)
-            select = (index_vector == c_unique[j])
-            indicator_matrix[n_row, select] = -1. / np.sum(select)
-            n_row = n_row + 1
-    return indicator_matrix
+    return pairwise_contrast_sparse(index_vector).toarray()
 
 
 def pairwise_contrast_sparse(index_vector):
@@ -79,33 +69,16 @@ def pairwise_contrast_sparse(index_vector):
             n_values * (n_values-1)/2 x n_row contrast matrix
 
     """
-    c_unique = np.unique(index_vector)
-    n_unique = c_unique.size
+    _, inverse = np.unique(index_vector, return_inverse=True)
+    inverse = inverse.ravel()
+    n_unique = np.max(inverse) + 1
     rows = np.size(index_vector)
-    cols = int(n_unique * (n_unique - 1) / 2)
-    # Now make an indicator_matrix with a pair of conditions per row
-    n_repeats = np.zeros(n_unique, dtype=int)
-    select = [None] * n_unique
-    for i in range(n_unique):
-        sel = (index_vector == c_unique[i])
-        n_repeats[i] = np.sum(sel)
-        select[i] = list(np.where(index_vector == c_unique[i])[0])
-    n_row = 0
-    dat = []
-    idx_i = []
-    idx_j = []
-    for i in range(n_unique):
-        for j in np.arange(i + 1, n_unique):
-            dat += [1/n_repeats[i]] * n_repeats[i]
-            idx_i += [n_row] * n_repeats[i]
-            idx_j += select[i]
-            dat += [-1/n_repeats[j]] * n_repeats[j]
-            idx_i += [n_row] * n_repeats[j]
-            idx_j += select[j]
-            n_row = n_row + 1
-    indicator_matrix = coo_matrix((dat, (idx_i, idx_j)),
-                                  shape=(cols, rows))
-    return indicator_matrix.asformat("csr")
+    # averaging matrix with one row per unique value
+    averaging = csr_matrix(
+        (1 / np.bincount(inverse)[inverse], (inverse, np.arange(rows))),
+        shape=(n_unique, rows))
+    row_i, col_i = row_col_indicator_rdm_sparse(n_unique)
+    return ((row_i - col_i) @ averaging).tocsr()
 
 
 def centering(size):
@@ -121,6 +94,22 @@ def centering(size):
     return centering_matrix
 
 
+def centering_operator(size):
+    """ matrix-free version of the centering matrix, which subtracts the
+    mean over the first axis and never forms the size x size matrix
+
+    Args:
+        size (int): size of the center matrix
+
+    Returns:
+        scipy.sparse.linalg.LinearOperator: size * size centering operator
+    """
+    def _center(x):
+        return x - np.mean(x, axis=0, keepdims=True)
+    return LinearOperator((size, size), matvec=_center, rmatvec=_center,
+                          matmat=_center, rmatmat=_center, dtype=float)
+
+
 def row_col_indicator_rdm(n_cond):
     """ generates a row and column indicator matrix for an RDM vector
 
@@ -131,11 +120,23 @@ def row_col_indicator_rdm(n_cond):
         row_indicator (numpy.ndarray): n_cond (n_cond-1)/2 * n_cond
         col_indicator (numpy.ndarray): n_cond (n_cond-1)/2 * n_cond
     """
-    n_dist = int(n_cond * (n_cond - 1) / 2)
-    row_i = np.zeros((n_dist, n_cond))
-    col_i = np.zeros((n_dist, n_cond))
-    _row_col_indicator(row_i, col_i, n_cond)
-    return (row_i, col_i)
+    row_i, col_i = row_col_indicator_rdm_sparse(n_cond)
+    return (row_i.toarray(), col_i.toarray())
+
+
+def row_col_indicator_rdm_sparse(n_cond):
+    """ sparse version of row_col_indicator_rdm with a single entry per
+    row, such that the memory scales with the number of distances
+
+    Args:
+        n_cond (int): Number of conditions underlying the RDM
+
+    Returns:
+        row_indicator (scipy.sparse.csr_matrix): n_cond (n_cond-1)/2 * n_cond
+        col_indicator (scipy.sparse.csr_matrix): n_cond (n_cond-1)/2 * n_cond
+    """
+    rows, cols = np.triu_indices(n_cond, 1)
+    return _indicator_pair(rows, cols, n_cond)
 
 
 def row_col_indicator_g(n_cond):
@@ -152,13 +153,26 @@ def row_col_indicator_g(n_cond):
         row_indicator (numpy.ndarray): n_cond (n_cond-1)/2+n_cond * n_cond
         col_indicator (numpy.ndarray): n_cond (n_cond-1)/2+n_cond * n_cond
     """
-    n_elem = int(n_cond * (n_cond - 1) / 2)+n_cond  # Number of elements in G
-    row_i = np.zeros((n_elem, n_cond))
-    col_i = np.zeros((n_elem, n_cond))
-    _row_col_indicator(row_i, col_i, n_cond)
-    np.fill_diagonal(row_i[-n_cond:, :], 1)
-    np.fill_diagonal(col_i[-n_cond:, :], 1)
-    return (row_i, col_i)
+    row_i, col_i = row_col_indicator_g_sparse(n_cond)
+    return (row_i.toarray(), col_i.toarray())
+
+
+def row_col_indicator_g_sparse(n_cond):
+    """ sparse version of row_col_indicator_g with a single entry per row
+
+    Args:
+        n_cond (int): Number of conditions underlying the second moment
+
+    Returns:
+        row_indicator (scipy.sparse.csr_matrix):
+            n_cond (n_cond-1)/2+n_cond * n_cond
+        col_indicator (scipy.sparse.csr_matrix):
+            n_cond (n_cond-1)/2+n_cond * n_cond
+    """
+    rows, cols = np.triu_indices(n_cond, 1)
+    diag = np.arange(n_cond)
+    return _indicator_pair(np.concatenate((rows, diag)),
+                           np.concatenate((cols, diag)), n_cond)
 
 
 def get_v(n_cond, sigma_k):
@@ -167,6 +181,8 @@ def get_v(n_cond, sigma_k):
     c_mat = pairwise_contrast_sparse(np.arange(n_cond))
     if sigma_k is None:
         xi = c_mat @ c_mat.transpose()
+    elif np.ndim(sigma_k) == 1:
+        xi = c_mat @ diags(sigma_k) @ c_mat.transpose()
     else:
         sigma_k = csr_matrix(sigma_k)
         xi = c_mat @ sigma_k @ c_mat.transpose()
@@ -175,20 +191,149 @@ def get_v(n_cond, sigma_k):
     return v
 
 
-def _row_col_indicator(row_i, col_i, n_cond):
-    """ Helper function that writes the correct pattern for the
-    row / column indicator matrix
+class VSolver:
+    """ Solves linear systems with the RDM covariance
+    V = (C sigma_k C^T) o (C sigma_k C^T) for many right hand sides.
+
+    V is never formed for positive definite sigma_k. Instead, this uses that
+    V^-1 d = 1/2 * triu(T D T) for an RDM vector d with square form D, where
+    T = sigma_k^-1 - sigma_k^-1 1 1^T sigma_k^-1 / (1^T sigma_k^-1 1),
+    such that each solve costs two n_cond x n_cond matrix products.
+    Missing entries (nan_idx) are handled by a Schur complement on the
+    missing entries of V^-1.
+    Singular sigma_k fall back to a pseudo-inverse of the dense V.
+
+    Use get_v_solver to get a cached solver instead of creating one.
 
     Args:
-        row_indicator: row_i (numpy.ndarray)
-        col_indicator: row_i (numpy.ndarray)
+        n_cond (int): number of conditions
+        sigma_k (numpy.ndarray): covariance between pattern estimates,
+            either None for the identity, a vector for a diagonal
+            or a full n_cond x n_cond matrix
+        nan_idx (numpy.ndarray): boolean vector marking the valid entries
+            of the RDM vectors, defaults to all entries
+
+    """
+
+    def __init__(self, n_cond, sigma_k=None, nan_idx=None):
+        self.n_cond = n_cond
+        self.n_dist = n_cond * (n_cond - 1) // 2
+        if nan_idx is None:
+            nan_idx = np.ones(self.n_dist, bool)
+        self.nan_idx = np.asarray(nan_idx, bool)
+        if sigma_k is None:
+            sigma_k = np.eye(n_cond)
+        elif np.ndim(sigma_k) == 1:
+            sigma_k = np.diag(sigma_k)
+        self._triu = np.triu_indices(n_cond, 1)
+        self._v_pinv = None
+        try:
+            sigma_inv = linalg.cho_solve(linalg.cho_factor(sigma_k),
+                                         np.eye(n_cond))
+        except linalg.LinAlgError:
+            v = get_v(n_cond, sigma_k)[self.nan_idx][:, self.nan_idx]
+            self._v_pinv = linalg.pinvh(v.toarray())
+            return
+        sigma_inv_1 = np.sum(sigma_inv, axis=1)
+        self._t = sigma_inv - np.outer(sigma_inv_1, sigma_inv_1) \
+            / np.sum(sigma_inv_1)
+        self._missing = np.flatnonzero(~self.nan_idx)
+        if len(self._missing):
+            unit = np.zeros((len(self._missing), self.n_dist))
+            unit[np.arange(len(self._missing)), self._missing] = 1
+            self._inv_missing = self._solve_full(unit)
+            self._inv_mm = linalg.cho_factor(
+                self._inv_missing[:, self._missing])
+
+    def _solve_full(self, vectors):
+        """ V^-1 vectors for complete RDM vectors (2D) """
+        matrices = np.zeros((vectors.shape[0], self.n_cond, self.n_cond))
+        matrices[:, self._triu[0], self._triu[1]] = vectors
+        matrices += matrices.transpose(0, 2, 1)
+        matrices = self._t @ matrices @ self._t
+        return 0.5 * matrices[:, self._triu[0], self._triu[1]]
+
+    def solve(self, vectors):
+        """ computes V^-1 v for all given RDM vectors
+
+        Args:
+            vectors (numpy.ndarray): RDM vectors restricted to the valid
+                entries, either a single vector or one vector per row
+
+        Returns:
+            numpy.ndarray: V^-1 applied to each vector, same shape as vectors
+
+        """
+        vectors = np.asarray(vectors, dtype=float)
+        shape = vectors.shape
+        vectors = vectors.reshape(-1, shape[-1])
+        if self._v_pinv is not None:
+            return (vectors @ self._v_pinv).reshape(shape)
+        full = np.zeros((vectors.shape[0], self.n_dist))
+        full[:, self.nan_idx] = vectors
+        solved = self._solve_full(full)
+        if len(self._missing):
+            correction = linalg.cho_solve(
+                self._inv_mm, solved[:, self._missing].T).T
+            solved -= correction @ self._inv_missing
+        return solved[:, self.nan_idx].reshape(shape)
+
+
+_V_SOLVERS = OrderedDict()
+_V_SOLVERS_MAXSIZE = 16
+
+
+def get_v_solver(n_cond, sigma_k=None, nan_idx=None):
+    """ cached VSolver for the RDM covariance V
+
+    Solvers are memoized by n_cond, a hash of sigma_k and the nan pattern,
+    such that repeated comparisons and fits with the same settings share
+    one solver.
+
+    Args:
+        n_cond (int): number of conditions
+        sigma_k (numpy.ndarray): covariance between pattern estimates
+        nan_idx (numpy.ndarray): boolean vector marking the valid entries
+
+    Returns:
+        VSolver: solver for V restricted to the valid entries
+
+    """
+    key = (n_cond, _array_key(sigma_k), _array_key(nan_idx))
+    if key in _V_SOLVERS:
+        _V_SOLVERS.move_to_end(key)
+        return _V_SOLVERS[key]
+    solver = VSolver(n_cond, sigma_k, nan_idx)
+    _V_SOLVERS[key] = solver
+    if len(_V_SOLVERS) > _V_SOLVERS_MAXSIZE:
+        _V_SOLVERS.popitem(last=False)
+    return solver
+
+
+def _array_key(array):
+    """ hashable key identifying the contents of an array or None """
+    if array is None:
+        return None
+    array = np.ascontiguousarray(array)
+    return (array.shape, array.dtype.str,
+            hashlib.sha1(array.view(np.uint8)).hexdigest())
+
+
+def _indicator_pair(rows, cols, n_cond):
+    """ Helper function that builds the sparse row and column indicator
+    matrices with a one in column rows[k] and cols[k] of row k respectively
+
+    Args:
+        rows (numpy.ndarray): row index of each element
+        cols (numpy.ndarray): column index of each element
         n_cond (int): Number of conditions underlying the second moment
     """
-    j = 0
-    for i in range(n_cond):
-        row_i[j:j + n_cond - i - 1, i] = 1
-        np.fill_diagonal(col_i[j:j + n_cond - i - 1, i + 1:], 1)
-        j = j + (n_cond - i - 1)
+    n_elem = len(rows)
+    elements = np.arange(n_elem)
+    ones = np.ones(n_elem)
+    row_i = csr_matrix((ones, (elements, rows)), shape=(n_elem, n_cond))
+    col_i = csr_matrix((ones, (elements, cols)), shape=(n_elem, n_cond))
+    return (row_i, col_i)
 
 
 def square_category_binary_mask(category_idxs: List[int], size: int):
@@ -7,10 +7,8 @@ Created on Tue Oct 20 23:58:28 2020
 """
 
 import numpy as np
-import scipy.sparse
-from scipy.stats import rankdata
 from rsatoolbox.rdm import RDMs
-from rsatoolbox.util.matrix import get_v
+from rsatoolbox.util.matrix import get_v_solver
 
 
 def pool_rdm(rdms, method='cosine', sigma_k=None):
@@ -42,44 +40,38 @@ def pool_rdm(rdms, method='cosine', sigma_k=None):
         rdm_vec = _nan_mean(rdm_vec)
         rdm_vec = rdm_vec - np.nanmin(rdm_vec) + 0.01
     elif method == 'cosine_cov':
-        v = get_v(rdms.n_cond, sigma_k=sigma_k)
         ok_idx = np.all(np.isfinite(rdm_vec), axis=0)
-        v = v[ok_idx][:, ok_idx]
         rdm_vec_nonan = rdm_vec[:, ok_idx]
-        v_inv_x = np.array([scipy.sparse.linalg.cg(v, rdm_vec_nonan[i],
-                                                   atol=10 ** -9)[0]
-                            for i in range(rdms.n_rdm)])
+        v_inv_x = get_v_solver(rdms.n_cond, sigma_k, ok_idx).solve(
+            rdm_vec_nonan)
         rdm_norms = np.einsum('ij, ij->i', rdm_vec_nonan, v_inv_x).reshape(
             [rdms.n_rdm, 1])
         rdm_vec = rdm_vec / np.sqrt(rdm_norms)
         rdm_vec = _nan_mean(rdm_vec)
     elif method == 'corr_cov':
         rdm_vec = rdm_vec - np.nanmean(rdm_vec, axis=1, keepdims=True)
-        v = get_v(rdms.n_cond, sigma_k=sigma_k)
         ok_idx = np.all(np.isfinite(rdm_vec), axis=0)
-        v = v[ok_idx][:, ok_idx]
         rdm_vec_nonan = rdm_vec[:, ok_idx]
-        v_inv_x = np.array([scipy.sparse.linalg.cg(v, rdm_vec_nonan[i],
-                                                   atol=10 ** -9)[0]
-                            for i in range(rdms.n_rdm)])
+        v_inv_x = get_v_solver(rdms.n_cond, sigma_k, ok_idx).solve(
+            rdm_vec_nonan)
         rdm_norms = np.einsum('ij, ij->i', rdm_vec_nonan, v_inv_x).reshape(
             [rdms.n_rdm, 1])
         rdm_vec = rdm_vec / np.sqrt(rdm_norms)
         rdm_vec = _nan_mean(rdm_vec)
         rdm_vec = rdm_vec - np.nanmin(rdm_vec) + 0.01
     elif method == 'spearman' or method == 'rho-a':
-        rdm_vec = np.array([_nan_rank_data(v) for v in rdm_vec])
+        rdm_vec = rdms.get_ranks()
         rdm_vec = _nan_mean(rdm_vec)
     elif method == 'rho-a':
-        rdm_vec = np.array([_nan_rank_data(v) for v in rdm_vec])
+        rdm_vec = rdms.get_ranks()
         rdm_vec = _nan_mean(rdm_vec)
     elif method == 'kendall' or method == 'tau-b':
         Warning('Noise ceiling for tau based on averaged ranks!')
-        rdm_vec = np.array([_nan_rank_data(v) for v in rdm_vec])
+        rdm_vec = rdms.get_ranks()
         rdm_vec = _nan_mean(rdm_vec)
     elif method == 'tau-a':
         Warning('Noise ceiling for tau based on averaged ranks!')
-        rdm_vec = np.array([_nan_rank_data(v) for v in rdm_vec])
+        rdm_vec = rdms.get_ranks()
         rdm_vec = _nan_mean(rdm_vec)
     else:
         raise ValueError('Unknown RDM comparison method requested!')
@@ -108,18 +100,3 @@ def _nan_mean(rdm_vector):
     return rdm_mean
 
 
-def _nan_rank_data(rdm_vector):
-    """ rank_data for vectors with nan entries
-
-    Args:
-        rdm_vector(numpy.ndarray): the vector to be rank_transformed
-
-    Returns:
-        ranks(numpy.ndarray): the ranks with nans where the original vector
-            had nans
-
-    """
-    ranks_no_nan = rankdata(rdm_vector[~np.isnan(rdm_vector)])
-    ranks = np.ones_like(rdm_vector) * np.nan
-    ranks[~np.isnan(rdm_vector)] = ranks_no_nan
-    return ranks
@@ -97,6 +97,57 @@ def _get_n_from_length(n):
     return int(np.ceil(np.sqrt(n * 2)))
 
 
+def rank_data(values, axis=-1, method='average'):
+    """
+    ranks values along an axis, ignoring nan entries, which stay nan.
+    This is equivalent to applying scipy.stats.rankdata to the non-nan
+    entries of each slice along axis, but ranks all slices at once.
+
+    Args:
+        **values** (np.ndarray): values to be ranked
+        **axis** (int): axis along which values are ranked
+        **method** (String): how ranks are assigned to tied values:
+            'average', 'min', 'max', 'dense' or 'ordinal'
+
+    Returns:
+        np.ndarray: ranks: ranks of the values with the shape of values
+
+    """
+    if method not in ('average', 'min', 'max', 'dense', 'ordinal'):
+        raise ValueError(f'Unknown rank method: {method}')
+    values = np.moveaxis(np.asarray(values, dtype=float), axis, -1)
+    shape = values.shape
+    values = values.reshape(int(np.prod(shape[:-1])), shape[-1])
+    positions = np.arange(shape[-1])
+    # nans are sorted to the end and thus do not shift the other ranks
+    order = np.argsort(values, axis=1, kind='stable')
+    sorted_values = np.take_along_axis(values, order, axis=1)
+    new_value = np.ones(sorted_values.shape, dtype=bool)
+    new_value[:, 1:] = sorted_values[:, 1:] != sorted_values[:, :-1]
+    if method == 'ordinal':
+        sorted_ranks = np.broadcast_to(positions + 1., values.shape)
+    elif method == 'dense':
+        sorted_ranks = np.cumsum(new_value, axis=1).astype(float)
+    else:
+        run_start = np.maximum.accumulate(
+            np.where(new_value, positions, 0), axis=1)
+        run_end = np.empty(values.shape, dtype=int)
+        run_end[:, :-1] = np.where(new_value[:, 1:], positions[:-1],
+                                   shape[-1])
+        run_end[:, -1:] = shape[-1] - 1
+        run_end = np.minimum.accumulate(run_end[:, ::-1], axis=1)[:, ::-1]
+        if method == 'min':
+            sorted_ranks = run_start + 1.
+        elif method == 'max':
+            sorted_ranks = run_end + 1.
+        else:
+            sorted_ranks = (run_start + run_end) / 2 + 1
+    ranks = np.empty(values.shape)
+    np.put_along_axis(ranks, order, sorted_ranks, axis=1)
+    ranks[np.isnan(values)] = np.nan
+    return np.moveaxis(ranks.reshape(shape), -1, axis)
+
+
 def add_pattern_index(rdms, pattern_descriptor):
     """
     adds index if pattern_descriptor is None
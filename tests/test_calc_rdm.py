@@ -123,6 +123,117 @@ class TestCalcRDM(unittest.TestCase):
                            method='euclidean')
         assert np.all(rdm.rdm_descriptors['subj'] == np.array([0, 0, 0]))
 
+    def test_calc_list_batched(self):
+        from rsatoolbox.rdm.combine import from_partials
+        datasets = [self.test_data, self.test_data_balanced,
+                    self.test_data_balanced]
+        datasets[1] = rsa.data.Dataset(
+            measurements=np.random.rand(20, 5),
+            descriptors={'session': 1, 'subj': 1},
+            obs_descriptors=self.test_data.obs_descriptors)
+        for method in ['euclidean', 'correlation', 'mahalanobis',
+                       'poisson']:
+            rdm = rsr.calc_rdm(datasets[:2], descriptor='conds',
+                               method=method)
+            rdm_single = from_partials(
+                [rsr.calc_rdm(d, descriptor='conds', method=method)
+                 for d in datasets[:2]],
+                descriptor='conds')
+            assert_array_almost_equal(rdm.dissimilarities,
+                                      rdm_single.dissimilarities)
+            self.assertEqual(rdm.dissimilarity_measure,
+                             rdm_single.dissimilarity_measure)
+            self.assertEqual(rdm.rdm_descriptors['subj'], [0, 1])
+
+    def test_calc_list_batched_noise_list(self):
+        noise = np.random.randn(2, 10, 5)
+        noise = np.einsum('ijk,ijl->ikl', noise, noise)
+        rdm = rsr.calc_rdm([self.test_data, self.test_data],
+                           descriptor='conds', method='mahalanobis',
+                           noise=noise)
+        for i in range(2):
+            rdm_single = rsr.calc_rdm(self.test_data, descriptor='conds',
+                                      method='mahalanobis', noise=noise[i])
+            assert_array_almost_equal(rdm.dissimilarities[i],
+                                      rdm_single.dissimilarities[0])
+
+    def test_calc_approx_jl(self):
+        data = rsa.data.Dataset(np.random.randn(10, 5000))
+        for method in ['euclidean', 'correlation']:
+            rdm = rsr.calc_rdm(data, method=method)
+            rdm_approx = rsr.calc_rdm(data, method=method, approx='jl',
+                                      approx_eps=0.5, approx_seed=1)
+            self.assertEqual(rdm_approx.descriptors['approx'], 'jl')
+            self.assertLess(rdm_approx.descriptors['approx_dim'], 5000)
+            eps = rdm_approx.descriptors['approx_eps']
+            self.assertLessEqual(eps, 0.5)
+            assert np.all(np.abs(rdm_approx.dissimilarities
+                                 / rdm.dissimilarities - 1) < eps)
+            rdm_repeat = rsr.calc_rdm(data, method=method, approx='jl',
+                                      approx_eps=0.5, approx_seed=1)
+            assert_array_almost_equal(rdm_approx.dissimilarities,
+                                      rdm_repeat.dissimilarities)
+        rdm_exact = rsr.calc_rdm(data, approx='jl', approx_dim=6000)
+        self.assertEqual(rdm_exact.descriptors['approx_eps'], 0)
+        with self.assertRaises(ValueError):
+            rsr.calc_rdm(data, method='poisson', approx='jl')
+
+    def test_calc_structured_noise(self):
+        diag = np.random.rand(5) + 0.1
+        U = np.random.randn(5, 2)
+        noise_model = rsa.data.NoiseModel(diag, U, np.ones(2))
+        noises = {'diag': (diag, np.diag(diag)),
+                  'low_rank': (noise_model, noise_model.precision),
+                  'list': ([noise_model, rsa.data.NoiseModel(diag)],
+                           [noise_model.precision, np.diag(diag)])}
+        for method in ['mahalanobis', 'crossnobis']:
+            for name, (noise, noise_dense) in noises.items():
+                if name == 'list' and method == 'mahalanobis':
+                    continue
+                rdm = rsr.calc_rdm(self.test_data, descriptor='conds',
+                                   method=method, noise=noise,
+                                   cv_descriptor='fold')
+                rdm_dense = rsr.calc_rdm(self.test_data, descriptor='conds',
+                                         method=method, noise=noise_dense,
+                                         cv_descriptor='fold')
+                assert_array_almost_equal(rdm.dissimilarities,
+                                          rdm_dense.dissimilarities)
+
+    def test_calc_poisson_cv_folds(self):
+        rdm = rsr.calc_rdm(self.test_data, descriptor='conds',
+                           method='poisson_cv', cv_descriptor='fold')
+        rdm_folds = []
+        for fold in [0, 1]:
+            data_train = self.test_data.subset_obs('fold', 1 - fold)
+            data_test = self.test_data.subset_obs('fold', fold)
+            means_train, _, _ = rsa.data.average_dataset_by(
+                data_train, 'conds')
+            means_test, _, _ = rsa.data.average_dataset_by(
+                data_test, 'conds')
+            means_train = (means_train + 0.1) / 1.1
+            means_test = (means_test + 0.1) / 1.1
+            diff = means_train[:, None] - means_train[None]
+            diff_log = np.log(means_test[:, None]) \
+                - np.log(means_test[None])
+            rdm_folds.append(np.mean(diff * diff_log, axis=2)[
+                np.triu_indices(6, 1)])
+        assert_array_almost_equal(rdm.dissimilarities[0],
+                                  np.mean(rdm_folds, axis=0))
+
+    def test_calc_list_n_jobs(self):
+        datasets = [self.test_data, self.test_data_balanced,
+                    self.test_data]
+        for method in ['euclidean', 'crossnobis']:
+            rdm = rsr.calc_rdm(datasets, descriptor='conds', method=method,
+                               cv_descriptor='fold')
+            rdm_parallel = rsr.calc_rdm(datasets, descriptor='conds',
+                                        method=method, cv_descriptor='fold',
+                                        n_jobs=2)
+            assert_array_almost_equal(rdm.dissimilarities,
+                                      rdm_parallel.dissimilarities)
+            self.assertEqual(rdm.pattern_descriptors['conds'],
+                             rdm_parallel.pattern_descriptors['conds'])
+
     def test_calc_mahalanobis(self):
         rdm = rsr.calc_rdm(self.test_data, descriptor='conds',
                            method='mahalanobis')
@@ -132,12 +243,47 @@ class TestCalcRDM(unittest.TestCase):
                            method='mahalanobis', noise=noise)
         assert rdm.n_cond == 6
 
+    def test_calc_mahalanobis_noise_model(self):
+        noise = np.linalg.inv(np.cov(np.random.randn(10, 5).T))
+        rdm = rsr.calc_rdm(self.test_data, descriptor='conds',
+                           method='mahalanobis', noise=noise)
+        rdm_model = rsr.calc_rdm(self.test_data, descriptor='conds',
+                                 method='mahalanobis',
+                                 noise=rsa.data.NoiseModel(noise))
+        measurements, _, _ = rsa.data.average_dataset_by(
+            self.test_data, 'conds')
+        diff = measurements[0] - measurements[1]
+        self.assertAlmostEqual(rdm.dissimilarities[0, 0],
+                               diff @ noise @ diff / 5)
+        assert_array_almost_equal(rdm.dissimilarities,
+                                  rdm_model.dissimilarities)
+
     def test_calc_crossnobis(self):
         rdm = rsr.calc_rdm_crossnobis(self.test_data,
                                       descriptor='conds',
                                       cv_descriptor='fold')
         assert rdm.n_cond == 6
 
+    def test_calc_crossnobis_folds(self):
+        noise = np.random.randn(10, 5)
+        noise = np.matmul(noise.T, noise)
+        rdm = rsr.calc_rdm_crossnobis(self.test_data,
+                                      descriptor='conds',
+                                      cv_descriptor='fold',
+                                      noise=noise)
+        rdms = []
+        for fold in [0, 1]:
+            test = self.test_data.subset_obs('fold', fold)
+            train = self.test_data.subset_obs('fold', 1 - fold)
+            m_test = rsa.data.average_dataset_by(test, 'conds')[0]
+            m_train = rsa.data.average_dataset_by(train, 'conds')[0]
+            kernel = m_train @ noise @ m_test.T
+            diag = np.diag(kernel)
+            rdm_fold = diag[:, None] + diag[None] - kernel - kernel.T
+            rdms.append(squareform(rdm_fold, checks=False) / 5)
+        assert_array_almost_equal(rdm.dissimilarities[0],
+                                  np.mean(rdms, axis=0))
+
     def test_calc_crossnobis_no_descriptors(self):
         rdm = rsr.calc_rdm_crossnobis(self.test_data_balanced,
                                       descriptor='conds')
@@ -171,6 +317,21 @@ class TestCalcRDM(unittest.TestCase):
                                       descriptor='conds', noise=noise)
         assert rdm.n_cond == 6
 
+    def test_calc_block_size(self):
+        for method in ['euclidean', 'correlation', 'mahalanobis',
+                       'crossnobis', 'poisson', 'poisson_cv']:
+            rdm = rsr.calc_rdm(self.test_data, descriptor='conds',
+                               cv_descriptor='fold', method=method)
+            rdm_blocked = rsr.calc_rdm(self.test_data, descriptor='conds',
+                                       cv_descriptor='fold', method=method,
+                                       block_size=2)
+            assert_array_almost_equal(rdm.dissimilarities,
+                                      rdm_blocked.dissimilarities)
+        for block_size in [0, -1, 1.5]:
+            with self.assertRaises(ValueError):
+                rsr.calc_rdm(self.test_data, descriptor='conds',
+                             block_size=block_size)
+
     def test_calc_poisson_6_conditions(self):
         rdm = rsr.calc_rdm(
             self.test_data,
@@ -239,6 +400,40 @@ class TestCalcRDMMovie(unittest.TestCase):
             time_descriptors=tim_des
             )
 
+    def test_calc_rdm_movie_per_time(self):
+        noise = np.random.rand(10, 5)
+        noise = np.linalg.inv(noise.T @ noise)
+        for method in ['euclidean', 'correlation', 'mahalanobis',
+                       'poisson', 'crossnobis', 'poisson_cv']:
+            rdm = rsr.calc_rdm_movie(
+                self.test_data_time, descriptor='conds', method=method,
+                noise=noise, cv_descriptor='fold')
+            self.assertEqual(rdm.n_rdm, 15)
+            assert_array_almost_equal(
+                rdm.rdm_descriptors['time'],
+                self.test_data_time.time_descriptors['time'])
+            for i_time, dat in enumerate(
+                    self.test_data_time.split_time('time')):
+                rdm_time = rsr.calc_rdm(
+                    dat.convert_to_dataset('time'), descriptor='conds',
+                    method=method, noise=noise, cv_descriptor='fold')
+                assert_array_almost_equal(
+                    rdm.dissimilarities[i_time],
+                    rdm_time.dissimilarities[0])
+
+    def test_calc_rdm_movie_window(self):
+        rdm = rsr.calc_rdm_movie(
+            self.test_data_time, descriptor='conds',
+            method='euclidean', window=3, window_step=2)
+        windowed = self.test_data_time.sliding_window(3, 2)
+        rdm_windowed = rsr.calc_rdm_movie(
+            windowed, descriptor='conds', method='euclidean')
+        self.assertEqual(rdm.n_rdm, 7)
+        assert_array_almost_equal(rdm.dissimilarities,
+                                  rdm_windowed.dissimilarities)
+        assert_array_almost_equal(rdm.rdm_descriptors['time'],
+                                  windowed.time_descriptors['time'])
+
     def test_calc_rdm_movie_mahalanobis(self):
         rdm = rsr.calc_rdm_movie(
             self.test_data_time, descriptor='conds',
@@ -309,3 +504,72 @@ class TestCalcRDMMovie(unittest.TestCase):
         assert rdm.n_cond == 6
         assert len([r for r in rdm]) == 5
         assert rdm.rdm_descriptors['time'][0] == np.mean(time[:3])
+
+
+class TestRDMAccumulator(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = rsa.data.Dataset(
+            measurements=np.random.rand(20, 5),
+            descriptors={'subj': 0},
+            obs_descriptors={
+                'conds': np.array([0, 0, 1, 1, 2, 2, 2, 3, 4, 5,
+                                   0, 0, 1, 1, 2, 2, 2, 3, 4, 5]),
+                'fold': np.array([0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
+                                  1, 1, 1, 1, 1, 1, 1, 1, 1, 1])})
+
+    def test_batches(self):
+        noise = np.linalg.inv(np.cov(np.random.randn(10, 5).T))
+        accumulator = rsr.RDMAccumulator(
+            'conds', cv_descriptor='fold', descriptors={'subj': 0})
+        order = np.random.permutation(20)
+        for batch in np.array_split(order, 4):
+            accumulator.update(
+                self.test_data.measurements[batch],
+                {key: value[batch] for key, value
+                 in self.test_data.obs_descriptors.items()})
+        self.assertEqual(accumulator.n_obs, 20)
+        self.assertEqual(accumulator.n_cond, 6)
+        for method in ['euclidean', 'correlation', 'mahalanobis',
+                       'crossnobis']:
+            rdm = accumulator.get_rdm(method, noise=noise)
+            rdm_check = rsr.calc_rdm(
+                self.test_data, method=method, descriptor='conds',
+                noise=noise, cv_descriptor='fold')
+            assert_array_almost_equal(rdm.dissimilarities,
+                                      rdm_check.dissimilarities)
+            self.assertEqual(rdm.dissimilarity_measure,
+                             rdm_check.dissimilarity_measure)
+            assert_array_almost_equal(rdm.pattern_descriptors['conds'],
+                                      rdm_check.pattern_descriptors['conds'])
+            self.assertEqual(rdm.rdm_descriptors['subj'], [0])
+
+    def test_rejected_batch(self):
+        accumulator = rsr.RDMAccumulator('conds', cv_descriptor='fold')
+        accumulator.update(self.test_data.measurements[:10],
+                           {key: value[:10] for key, value
+                            in self.test_data.obs_descriptors.items()})
+        rdm = accumulator.get_rdm()
+        with self.assertRaises(ValueError):
+            accumulator.update(self.test_data.measurements[10:15],
+                               {'conds': np.array([6, 7, 8, 9]),
+                                'fold': np.array([2, 2, 2, 2])})
+        with self.assertRaises(ValueError):
+            accumulator.update(np.random.rand(2, 3),
+                               {'conds': np.array([6, 7]),
+                                'fold': np.array([2, 2])})
+        self.assertEqual(accumulator.n_cond, 6)
+        self.assertEqual(accumulator.n_obs, 10)
+        assert_array_almost_equal(accumulator.get_rdm().dissimilarities,
+                                  rdm.dissimilarities)
+        empty = rsr.RDMAccumulator('conds')
+        with self.assertRaises(ValueError):
+            empty.update(np.random.rand(3, 5), {'conds': [0, 1]})
+        self.assertIsNone(empty.n_channel)
+
+    def test_crossnobis_requires_cv(self):
+        accumulator = rsr.RDMAccumulator('conds')
+        accumulator.update(self.test_data.measurements,
+                           self.test_data.obs_descriptors)
+        with self.assertRaises(ValueError):
+            accumulator.get_rdm('crossnobis')
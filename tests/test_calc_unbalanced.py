@@ -179,6 +179,20 @@ class TestCalcRDM(unittest.TestCase):
             rdm_check.dissimilarities.flatten()
             )
 
+    def test_calc_structured_noise(self):
+        diag = np.random.rand(5) + 0.1
+        noise_model = rsa.data.NoiseModel(diag, np.random.randn(5, 2))
+        for noise in [diag, noise_model]:
+            rdm = rsr.calc_rdm_unbalanced(
+                self.test_data, descriptor='conds', cv_descriptor='fold',
+                noise=noise, method='crossnobis')
+            rdm_dense = rsr.calc_rdm_unbalanced(
+                self.test_data, descriptor='conds', cv_descriptor='fold',
+                noise=rsa.data.get_noise_model(noise).precision,
+                method='crossnobis')
+            assert_array_almost_equal(rdm.dissimilarities,
+                                      rdm_dense.dissimilarities)
+
     def test_calc_poisson(self):
         """ for the poisson-KL the dissimilarities differ! This is explained
         in more detail in the demo on this computation"""
@@ -213,3 +227,37 @@ class TestCalcRDM(unittest.TestCase):
             cv_descriptor='fold',
             method='poisson_cv')
         assert rdm.n_cond == 6
+
+    def test_calc_pairwise_reference(self):
+        from rsatoolbox.rdm.calc_unbalanced import calc_one_similarity
+        measurements = self.test_data.measurements.copy()
+        measurements[np.random.rand(20, 5) < 0.2] = np.nan
+        data = rsa.data.Dataset(
+            measurements=measurements,
+            obs_descriptors=self.test_data.obs_descriptors)
+        for method in ['euclidean', 'correlation', 'poisson_cv',
+                       'crossnobis']:
+            for weighting in ['number', 'equal']:
+                rdm = rsr.calc_rdm_unbalanced(
+                    data, descriptor='conds', cv_descriptor='fold',
+                    method=method, weighting=weighting)
+                conds = rdm.pattern_descriptors['conds']
+                sim = np.array([[calc_one_similarity(
+                    data, 'conds', i_des, j_des, method=method,
+                    weighting=weighting, cv_descriptor='fold')[0]
+                    for j_des in conds] for i_des in conds])
+                rdm_check = np.diag(sim)[:, None] + np.diag(sim)[None] \
+                    - 2 * sim
+                assert_array_almost_equal(
+                    rdm.dissimilarities[0],
+                    rdm_check[np.triu_indices(6, 1)])
+
+    def test_calc_list_n_jobs(self):
+        rdm = rsr.calc_rdm_unbalanced(
+            [self.test_data, self.test_data], descriptor='conds',
+            method='euclidean')
+        rdm_parallel = rsr.calc_rdm_unbalanced(
+            [self.test_data, self.test_data], descriptor='conds',
+            method='euclidean', n_jobs=2)
+        assert_array_almost_equal(rdm.dissimilarities,
+                                  rdm_parallel.dissimilarities)
@@ -6,11 +6,31 @@
 """
 
 import unittest
+from unittest.mock import patch
 import numpy as np
+import h5py
 from numpy.testing import assert_array_almost_equal
 import rsatoolbox as rsa
 
 
+def _check_comparison_plan(reference, others):
+    """ checks that ComparisonPlan matches compare for all its methods """
+    from rsatoolbox.rdm.compare import compare
+    from rsatoolbox.rdm.compare import ComparisonPlan
+    n_cond = reference.n_cond
+    sigma_k = np.eye(n_cond) + 0.5
+    for method in ['cosine', 'corr', 'spearman', 'rho-a', 'kendall',
+                   'cosine_cov', 'corr_cov']:
+        for sigma in [None, np.arange(1, n_cond + 1), sigma_k]:
+            if sigma is not None and not method.endswith('_cov'):
+                continue
+            plan = ComparisonPlan(reference, method, sigma)
+            for rdm in others:
+                assert_array_almost_equal(
+                    plan.compare(rdm),
+                    compare(reference, rdm, method, sigma))
+
+
 class TestCompareRDM(unittest.TestCase):
 
     def setUp(self):
@@ -122,6 +142,28 @@ class TestCompareRDM(unittest.TestCase):
         assert result.shape[0] == 5
         assert result.shape[1] == 7
         assert np.all(result < 0)
+        result_jobs = compare_neg_riemannian_distance(rdms2, rdms3, n_jobs=2)
+        assert_array_almost_equal(result, result_jobs)
+
+    def test_neg_riemannian_distance_optimum(self):
+        from scipy.linalg import eigvalsh
+        from scipy.optimize import minimize
+        from rsatoolbox.rdm.compare import compare_neg_riemannian_distance
+        rdms = rsa.rdm.calc_rdm(
+            [rsa.data.Dataset(np.random.rand(6, 20)) for _ in range(3)])
+        result = compare_neg_riemannian_distance(rdms[[0, 1]], rdms)
+        P = np.block([-np.ones((5, 1)), np.eye(5)])
+        G = [-0.5 * P @ rdm @ P.T for rdm in rdms.get_matrices()]
+        sigma_k = P @ P.T
+        for i in range(2):
+            for j in range(3):
+                def fun(theta):
+                    return np.sqrt(np.sum(np.log(eigvalsh(
+                        np.exp(theta[0]) * G[i] + np.exp(theta[1]) * sigma_k,
+                        G[j])) ** 2))
+                dist = minimize(fun, (0, 0), method='Nelder-Mead').fun
+                self.assertGreater(result[i, j], -dist - 1e-4)
+                self.assertLess(result[i, j], -dist + 1e-2)
 
     def test_compare_corr_loop(self):
         from rsatoolbox.rdm.compare import compare_correlation
@@ -195,6 +237,147 @@ class TestCompareRDM(unittest.TestCase):
         result = compare_kendall_tau_a(self.test_rdm1, self.test_rdm2)
         assert np.all(result < 1)
 
+    def test_compare_kendall_tau_ties(self):
+        from scipy.stats import kendalltau
+        from rsatoolbox.rdm.compare import compare_kendall_tau
+        from rsatoolbox.rdm.compare import compare_kendall_tau_a
+        vectors1 = np.random.randint(0, 4, size=(4, 15)).astype(float)
+        vectors2 = np.concatenate([
+            np.random.randint(0, 3, size=(2, 15)).astype(float),
+            np.random.rand(1, 15)])
+        tau_b = compare_kendall_tau(vectors1, vectors2)
+        tau_a = compare_kendall_tau_a(vectors1, vectors2)
+        self.assertEqual(tau_b.shape, (4, 3))
+        n_pairs = 15 * 14 / 2
+        for i, vec1 in enumerate(vectors1):
+            for j, vec2 in enumerate(vectors2):
+                self.assertAlmostEqual(
+                    tau_b[i, j], kendalltau(vec1, vec2).correlation)
+                con_minus_dis = np.sum(
+                    np.triu(np.sign(vec1[:, None] - vec1[None])
+                            * np.sign(vec2[:, None] - vec2[None]), 1))
+                self.assertAlmostEqual(tau_a[i, j], con_minus_dis / n_pairs)
+        # the numpy fallback for scipy's private helper
+        with patch('rsatoolbox.rdm.compare._kendall_dis', None):
+            assert_array_almost_equal(
+                compare_kendall_tau(vectors1, vectors2), tau_b)
+            assert_array_almost_equal(
+                compare_kendall_tau_a(vectors1, vectors2), tau_a)
+
+    def test_comparison_plan(self):
+        _check_comparison_plan(
+            self.test_rdm3,
+            [self.test_rdm1, self.test_rdm2, self.test_rdm2.get_vectors()])
+
+    def test_compare_library(self):
+        import io
+        from rsatoolbox.rdm.compare import compare
+        from rsatoolbox.rdm.compare import compare_library
+        library = rsa.rdm.RDMs(np.random.rand(50, 15))
+        query = rsa.rdm.concat(self.test_rdm1, self.test_rdm2)
+        for method in ['cosine', 'corr', 'spearman', 'kendall']:
+            idx, sim = compare_library(query, library, method=method,
+                                       top_k=4, chunk_size=7)
+            full = compare(query, library, method=method)
+            # rank correlations tie often and chunking may change the
+            # rounding, such that only the similarities are unique
+            assert_array_almost_equal(sim, -np.sort(-full, axis=1)[:, :4])
+            assert_array_almost_equal(sim, np.take_along_axis(full, idx, 1))
+            self.assertTrue(all(len(set(row)) == 4 for row in idx))
+        f = io.BytesIO()
+        library.save(f, file_type='hdf5')
+        chunks = [library.dissimilarities[:20],
+                  library.subset('index', np.arange(20, 50))]
+        idx, _ = compare_library(query, library, top_k=4)
+        for library_iter in [f, chunks]:
+            idx_file, _ = compare_library(query, library_iter, top_k=4)
+            np.testing.assert_array_equal(idx_file, idx)
+        idx, sim = compare_library(query, library, top_k=60)
+        np.testing.assert_array_equal(idx[:, 50:], -1)
+        self.assertTrue(np.all(np.isnan(sim[:, 50:])))
+
+    def test_compare_datasets(self):
+        from rsatoolbox.rdm.compare import compare
+        from rsatoolbox.rdm.compare import compare_datasets
+        measurements = np.random.rand(12, 5)
+        dataset1 = rsa.data.Dataset(measurements)
+        dataset2 = [
+            rsa.data.Dataset(measurements @ np.random.rand(5, 7)
+                             + np.random.rand(12, 7)),
+            rsa.data.Dataset(np.random.rand(12, 40))]
+        rdm1 = rsa.rdm.calc_rdm(dataset1)
+        rdm2 = rsa.rdm.calc_rdm(dataset2)
+        sigma_k = np.eye(12) + 0.5
+        for sigma in [None, np.arange(1, 13), sigma_k]:
+            assert_array_almost_equal(
+                compare_datasets(dataset1, dataset2, sigma_k=sigma),
+                compare(rdm1, rdm2, method='cosine_cov', sigma_k=sigma))
+        assert_array_almost_equal(
+            compare_datasets(dataset1, dataset2, method='cka'),
+            compare(rdm1, rdm2, method='cosine_cov'))
+        sketched = compare_datasets(dataset1, dataset2, sketch_dim=10)
+        assert_array_almost_equal(sketched[0, 0],
+                                  compare(rdm1, rdm2[0], 'cosine_cov')[0, 0])
+        self.assertEqual(sketched.shape, (1, 2))
+        wide = [rsa.data.Dataset(measurements @ np.random.rand(5, 2000)),
+                rsa.data.Dataset(np.random.rand(12, 5)
+                                 @ np.random.rand(5, 1500))]
+        exact = compare_datasets(wide, wide)
+        assert_array_almost_equal(
+            exact, compare(rsa.rdm.calc_rdm(wide), rsa.rdm.calc_rdm(wide),
+                           method='cosine_cov'))
+        sketched = compare_datasets(wide, wide, sketch_dim=200)
+        np.testing.assert_allclose(sketched, sketched.T)
+        np.testing.assert_allclose(np.diag(sketched), 1)
+        np.testing.assert_allclose(sketched, exact, atol=0.1)
+
+    def test_compare_blocked(self):
+        import io
+        from rsatoolbox.rdm.compare import compare
+        from rsatoolbox.rdm.compare import compare_blocked
+        sigma_k = np.arange(1, 7)
+        for method, sigma in [('cosine', None), ('corr', None),
+                              ('rho-a', None), ('cosine_cov', None),
+                              ('cosine_cov', sigma_k)]:
+            assert_array_almost_equal(
+                compare_blocked(self.test_rdm1, self.test_rdm3, method,
+                                sigma_k=sigma, block_size=4),
+                compare(self.test_rdm1, self.test_rdm3, method, sigma))
+        f = io.BytesIO()
+        self.test_rdm3.save(f, file_type='hdf5')
+        with h5py.File(f, 'r') as file:
+            assert_array_almost_equal(
+                compare(self.test_rdm2, file, 'corr', block_size=5),
+                compare(self.test_rdm2, self.test_rdm3, 'corr'))
+        dissimilarities = self.test_rdm3.get_vectors()
+        dissimilarities[:, [2, 7]] = np.nan
+        for method in ['cosine', 'corr', 'rho-a']:
+            assert_array_almost_equal(
+                compare_blocked(dissimilarities[:2], dissimilarities, method,
+                                block_size=3),
+                compare(dissimilarities[:2], dissimilarities, method))
+        with self.assertRaises(ValueError):
+            compare_blocked(self.test_rdm1, dissimilarities)
+
+    def test_compare_blocked_ties(self):
+        from rsatoolbox.rdm.compare import compare
+        from rsatoolbox.rdm.compare import compare_blocked
+        from rsatoolbox.util.rdm_utils import rank_data
+        dissimilarities = np.random.randint(2, size=(3, 1770)) \
+            .astype(float)
+        ranked_sizes = []
+
+        def recording_rank_data(values, *args, **kwargs):
+            ranked_sizes.append(np.size(values))
+            return rank_data(values, *args, **kwargs)
+        with patch('rsatoolbox.rdm.compare.rank_data',
+                   side_effect=recording_rank_data):
+            result = compare_blocked(dissimilarities[:1], dissimilarities,
+                                     'rho-a', block_size=50)
+        assert_array_almost_equal(
+            result, compare(dissimilarities[:1], dissimilarities, 'rho-a'))
+        self.assertLessEqual(max(ranked_sizes, default=0), 50)
+
     def test_compare(self):
         from rsatoolbox.rdm.compare import compare
         result = compare(self.test_rdm1, self.test_rdm1)
@@ -237,6 +420,11 @@ class TestCompareRDMNaN(unittest.TestCase):
         self.test_rdm3 = test_rdm3.subsample_pattern('index',
                                                      [0, 1, 1, 3, 4, 5])
 
+    def test_comparison_plan(self):
+        _check_comparison_plan(
+            self.test_rdm3,
+            [self.test_rdm1, self.test_rdm2, self.test_rdm2.get_vectors()])
+
     def test_compare_cosine(self):
         from rsatoolbox.rdm.compare import compare_cosine
         result = compare_cosine(self.test_rdm1, self.test_rdm1)
@@ -418,3 +606,16 @@ class TestCompareCov(unittest.TestCase):
             sigma_k=np.eye(6))
         assert_array_almost_equal(result, result_1D)
         assert_array_almost_equal(result, result_2D)
+
+    def test_cos_nan_identity_equal(self):
+        from rsatoolbox.rdm.compare import compare, _nan_centering
+        rdm1 = self.test_rdm1.subsample_pattern('index', [0, 1, 1, 2, 4, 5])
+        rdm2 = self.test_rdm2.subsample_pattern('index', [0, 1, 1, 2, 4, 5])
+        result = compare(rdm1, rdm2, method='cosine_cov')
+        hits = _nan_centering.cache_info().hits
+        result_cached = compare(rdm1, rdm2, method='cosine_cov')
+        self.assertGreater(_nan_centering.cache_info().hits, hits)
+        result_2D = compare(rdm1, rdm2, method='cosine_cov',
+                            sigma_k=np.eye(6))
+        assert_array_almost_equal(result, result_cached)
+        assert_array_almost_equal(result, result_2D)
@@ -231,6 +231,30 @@ class TestTemporalDataset(unittest.TestCase):
         self.assertEqual(binned_data.time_descriptors['time'][0], np.mean(bins[0]))
         self.assertEqual(binned_data.measurements[0,0,0], np.mean(measurements[0,0,:3]))
 
+    def test_temporaldataset_sliding_window(self):
+        measurements = np.random.randn(10, 5, 15)
+        obs_des = {'conds': np.array([0, 0, 1, 1, 2, 2, 2, 3, 4, 5])}
+        tim_des = {'time': np.linspace(0, 1000, 15),
+                   'label': np.array(['t%d' % i for i in range(15)])}
+        data = rsd.TemporalDataset(measurements=measurements,
+                                   obs_descriptors=obs_des,
+                                   time_descriptors=tim_des)
+        windowed = data.sliding_window(4, step=2)
+        self.assertEqual(windowed.n_obs, 10)
+        self.assertEqual(windowed.n_channel, 5)
+        self.assertEqual(windowed.n_time, 6)
+        for i_window, start in enumerate(range(0, 12, 2)):
+            np.testing.assert_allclose(
+                windowed.measurements[:, :, i_window],
+                np.mean(measurements[:, :, start:start + 4], axis=2))
+            self.assertAlmostEqual(
+                windowed.time_descriptors['time'][i_window],
+                np.mean(tim_des['time'][start:start + 4]))
+            self.assertEqual(windowed.time_descriptors['label'][i_window],
+                             't%d' % start)
+        with self.assertRaises(ValueError):
+            data.sliding_window(16)
+
     def test_temporaldataset_subset_obs(self):
         measurements = np.zeros((10, 5, 15))
         des = {'session': 0, 'subj': 0}
@@ -353,6 +377,20 @@ class TestDataComputations(unittest.TestCase):
         self.assertEqual(descriptor[-1], 5)
         assert(np.all(self.test_data.measurements[-1] == avg[-1]))
 
+    def test_group_means(self):
+        weights = np.random.rand(10)
+        means, values, counts, sum_sq = rsd.group_means(
+            self.test_data, 'conds', weights=weights, sum_sq=True)
+        self.assertEqual(means.shape, (6, 5))
+        np.testing.assert_array_equal(counts, [2, 2, 3, 1, 1, 1])
+        sel = self.test_data.obs_descriptors['conds'] == 2
+        meas = self.test_data.measurements[sel]
+        mean = weights[sel] @ meas / np.sum(weights[sel])
+        np.testing.assert_allclose(means[2], mean)
+        np.testing.assert_allclose(
+            sum_sq[2], weights[sel] @ ((meas - mean) ** 2))
+        np.testing.assert_allclose(sum_sq[3], 0, atol=1e-12)
+
 
 class TestNoiseComputations(unittest.TestCase):
     def setUp(self):
@@ -408,6 +446,57 @@ class TestNoiseComputations(unittest.TestCase):
         np.testing.assert_allclose(cov1, cov2)
 
 
+class TestNoiseModel(unittest.TestCase):
+    def setUp(self):
+        noise = np.random.randn(20, 5)
+        self.prec = np.linalg.inv(noise.T @ noise)
+
+    def test_whiten(self):
+        model = rsd.NoiseModel(self.prec)
+        x = np.random.randn(4, 5)
+        x_w = model.whiten(x)
+        np.testing.assert_allclose(x_w @ x_w.T, x @ self.prec @ x.T)
+
+    def test_singular(self):
+        prec = np.diag([1., 2., 0.])
+        model = rsd.NoiseModel(prec)
+        np.testing.assert_allclose(model.factor @ model.factor.T, prec,
+                                   atol=1e-12)
+
+    def test_cache(self):
+        model = rsd.get_noise_model(self.prec)
+        self.assertIs(model, rsd.get_noise_model(self.prec.copy()))
+        self.assertIs(model, rsd.get_noise_model(model))
+        self.assertIsNot(model, rsd.get_noise_model(2 * self.prec))
+
+    def test_diagonal(self):
+        diag = np.random.rand(5) + 0.1
+        model = rsd.NoiseModel(diag)
+        self.assertTrue(model.structured)
+        x = np.random.randn(4, 5)
+        x_w = model.whiten(x)
+        np.testing.assert_allclose(x_w @ x_w.T, x @ np.diag(diag) @ x.T)
+        np.testing.assert_allclose(model.inverse().diag, 1 / diag)
+
+    def test_low_rank(self):
+        diag = np.random.rand(8) + 0.1
+        U = np.random.randn(8, 2)
+        S = np.array([0.5, 2.])
+        model = rsd.NoiseModel(diag, U, S)
+        prec = np.diag(diag) + U @ np.diag(S) @ U.T
+        np.testing.assert_allclose(model.precision, prec)
+        x = np.random.randn(4, 8)
+        x_w = model.whiten(x)
+        np.testing.assert_allclose(x_w @ x_w.T, x @ prec @ x.T)
+        inverse = model.inverse()
+        self.assertTrue(inverse.structured)
+        np.testing.assert_allclose(inverse.precision @ prec, np.eye(8),
+                                   atol=1e-10)
+        x_w = inverse.whiten(x)
+        np.testing.assert_allclose(x_w @ x_w.T,
+                                   x @ np.linalg.inv(prec) @ x.T)
+
+
 class TestSave(unittest.TestCase):
     def test_dict_conversion(self):
         measurements = np.zeros((10, 5))
@@ -204,6 +204,32 @@ class TestConsistency(unittest.TestCase):
                 places=4, msg='regression fit differs from optimization fit!'
                 + '\nfor %s' % i_method)
 
+    def test_regress_nn_sigma_k(self):
+        from rsatoolbox.model import ModelWeighted
+        from rsatoolbox.model.fitter import fit_regress_nn
+        from rsatoolbox.model.fitter import fit_optimize_positive
+        from rsatoolbox.rdm import concat, compare
+        model_weighted = ModelWeighted(
+            'm_weighted',
+            concat([self.rdms[0], self.rdms[1]]))
+        sigma_k = np.eye(6) + 0.5
+        for i_method in ['cosine_cov', 'corr_cov']:
+            theta_nn = fit_regress_nn(
+                model_weighted, self.rdms, method=i_method, sigma_k=sigma_k)
+            theta_pos = fit_optimize_positive(
+                model_weighted, self.rdms, method=i_method, sigma_k=sigma_k)
+            self.assertTrue(np.all(theta_nn >= 0))
+            eval_nn = np.mean(compare(model_weighted.predict_rdm(theta_nn),
+                                      self.rdms, method=i_method,
+                                      sigma_k=sigma_k))
+            eval_pos = np.mean(compare(model_weighted.predict_rdm(theta_pos),
+                                       self.rdms, method=i_method,
+                                       sigma_k=sigma_k))
+            self.assertAlmostEqual(
+                eval_nn, eval_pos, places=4,
+                msg='non-negative regression differs from optimization fit!'
+                + '\nfor %s' % i_method)
+
     def test_two_rdms_nan(self):
         from rsatoolbox.model import ModelInterpolate, ModelWeighted
         from rsatoolbox.model.fitter import fit_regress, fit_optimize_positive
@@ -273,6 +299,23 @@ class TestNNLS(unittest.TestCase):
             loss_rsatoolbox_v, loss_rsatoolbox,
             places=5, msg='nnls loss changes with np.eye')
 
+    def test_nnls_v(self):
+        from scipy.optimize import nnls
+        from rsatoolbox.model.fitter import _nn_least_squares
+        A = np.random.rand(10, 3)
+        b = A @ np.array([1, -0.1, -0.1]) + 0.1 * np.random.randn(10)
+        L = np.eye(10) + 0.3 * np.tril(np.random.rand(10, 10), -1)
+        V = L @ L.T
+        x_scipy, loss_scipy = nnls(np.linalg.solve(L, A),
+                                   np.linalg.solve(L, b))
+        x_rsatoolbox_v, loss_rsatoolbox_v = _nn_least_squares(A, b, V=V)
+        assert_allclose(
+            x_scipy, x_rsatoolbox_v, atol=1e-4,
+            err_msg='non-negative-least squares with V different from scipy')
+        self.assertAlmostEqual(
+            loss_scipy, np.sqrt(loss_rsatoolbox_v),
+            places=4, msg='nnls loss with V different from scipy')
+
     def test_nnls_eye_ridge(self):
         from rsatoolbox.model.fitter import _nn_least_squares
         A = np.random.rand(10, 3)
@@ -450,6 +450,35 @@ class TestRDM(unittest.TestCase):
             )
         )
 
+    def test_rank_cache(self):
+        from rsatoolbox.rdm import RDMs
+        from rsatoolbox.util.rdm_utils import rank_data
+        dis = np.random.rand(4, 10)
+        rdms = RDMs(dis.copy(), rdm_descriptors={'subj': [0, 1, 2, 3]})
+        ranks = rdms.get_ranks()
+        self.assertIs(rdms.get_ranks(), ranks)
+        rdms_subset = rdms.subset('subj', [1, 2])
+        self.assertIsNotNone(rdms_subset._rank_cache)
+        assert_array_equal(rdms_subset.get_ranks(), ranks[[1, 2]])
+        assert_array_equal(rdms[3].get_ranks(), ranks[[3]])
+        modified = dis.copy()
+        modified[0, 0] = 2
+        rdms.dissimilarities = modified
+        self.assertEqual(rdms.get_ranks()[0, 0], 10)
+        self.assertFalse(rdms.get_ranks().flags.writeable)
+        rdms.dissimilarities = -dis
+        self.assertIsNone(rdms._rank_cache)
+        assert_array_equal(rdms.get_ranks(), 11 - ranks)
+        # ranks passed on to a selection follow the parent's array
+        selected = rdms[0]
+        self.assertIsNotNone(selected._rank_cache)
+        rdms.dissimilarities = dis[::-1].copy()
+        assert_array_equal(selected.get_ranks(),
+                           rank_data(selected.dissimilarities, axis=1))
+        self.assertAlmostEqual(
+            rsa.rdm.compare(selected, selected.dissimilarities.copy(),
+                            'spearman')[0, 0], 1)
+
 
 class TestSave(unittest.TestCase):
     def test_dict_conversion(self):
@@ -650,5 +679,155 @@ class TestRDMLists(unittest.TestCase):
         self.assertEqual(long_rdm.n_rdm, 6)
 
 
+class TestRDMIndex(unittest.TestCase):
+
+    def setUp(self):
+        centers = np.random.rand(10, 15)
+        self.library = centers[np.arange(300) % 10] \
+            + 0.1 * np.random.rand(300, 15)
+        self.query = rsa.rdm.RDMs(self.library[:3]
+                                  + 0.01 * np.random.rand(3, 15))
+
+    def test_search(self):
+        for method in ['cosine', 'corr']:
+            for store, rtol in [(True, 1e-7), (False, 1e-5)]:
+                index = rsr.RDMIndex(method=method, n_lists=10, n_probe=10,
+                                     random_state=0,
+                                     store_dissimilarities=store)
+                index.add(rsa.rdm.RDMs(self.library[:200]))
+                index.add(self.library[200:])
+                self.assertEqual(index.n_rdm, 300)
+                self.assertEqual(len(index._vectors), 2)
+                idx, sim = index.search(self.query, k=5, n_rerank=300)
+                full = rsr.compare(self.query, self.library, method=method)
+                assert_array_equal(idx, np.argsort(-full, axis=1)[:, :5])
+                np.testing.assert_allclose(
+                    sim, np.take_along_axis(full, idx, 1), rtol=rtol)
+                idx_approx, _ = index.search(self.query, k=5, n_probe=2)
+                self.assertTrue(np.all(idx_approx[:, 0] == idx[:, 0]))
+
+    def test_save_load(self):
+        import io
+        for store in [True, False]:
+            f = io.BytesIO()
+            index = rsr.RDMIndex(method='corr', random_state=0,
+                                 store_dissimilarities=store)
+            index.add(self.library[:100])
+            index.add(self.library[100:])
+            index.save(f, file_type='hdf5')
+            index_loaded = rsr.load_rdm_index(f, file_type='hdf5')
+            self.assertEqual(index_loaded.method, 'corr')
+            self.assertEqual(index_loaded.n_lists, index.n_lists)
+            self.assertEqual(index_loaded.n_rdm, 300)
+            if store:
+                assert_array_equal(index_loaded.dissimilarities,
+                                   self.library)
+            else:
+                self.assertIsNone(index_loaded.dissimilarities)
+            for res_loaded, res in zip(index_loaded.search(self.query),
+                                       index.search(self.query)):
+                assert_array_equal(res_loaded, res)
+
+    def test_empty(self):
+        idx, sim = rsr.RDMIndex().search(self.query, k=2)
+        assert_array_equal(idx, -1)
+        self.assertTrue(np.all(np.isnan(sim)))
+
+
+class TestRDMsView(unittest.TestCase):
+
+    def setUp(self):
+        self.rdms = rsa.rdm.RDMs(
+            np.random.rand(6, 10),
+            dissimilarity_measure='euclidean',
+            rdm_descriptors={'session': [0, 0, 1, 1, 2, 2]},
+            pattern_descriptors={'cond': list(range(5))})
+
+    def test_iteration(self):
+        for i, rdm in enumerate(self.rdms):
+            self.assertIsInstance(rdm, rsr.RDMsView)
+            self.assertEqual(rdm.n_rdm, 1)
+            self.assertTrue(np.shares_memory(rdm._peek_vectors(),
+                                             self.rdms.dissimilarities))
+            assert_array_equal(rdm.get_vectors(),
+                               self.rdms.dissimilarities[[i]])
+            self.assertEqual(rdm.rdm_descriptors['session'],
+                             [self.rdms.rdm_descriptors['session'][i]])
+        self.assertEqual(i, 5)
+        assert_array_equal(self.rdms[-1].dissimilarities,
+                           self.rdms.dissimilarities[[5]])
+        with self.assertRaises(IndexError):
+            self.rdms[6]
+
+    def test_write_through_view(self):
+        original = self.rdms.dissimilarities.copy()
+        for view in [self.rdms[0], self.rdms.subset('session', 2),
+                     self.rdms.subsample('session', [2, 0])]:
+            expected = view.get_vectors().copy()
+            view.dissimilarities[0, 0] = 5
+            view.dissimilarities *= 2
+            view.get_vectors()[-1, -1] = 3
+            expected[0, 0] = 5
+            expected *= 2
+            expected[-1, -1] = 3
+            assert_array_equal(view.dissimilarities, expected)
+            assert_array_equal(view[0].dissimilarities, expected[[0]])
+            assert_array_equal(self.rdms.dissimilarities, original)
+        copied = self.rdms[1:3].to_rdms()
+        copied.dissimilarities *= 0
+        assert_array_equal(self.rdms.dissimilarities, original)
+
+    def test_parent_changes(self):
+        from rsatoolbox.util.rdm_utils import rank_data
+        original = self.rdms.dissimilarities.copy()
+        self.rdms.get_ranks()
+        views = [self.rdms[1], self.rdms[[4, 0]], self.rdms[1:5][::2]]
+        expected = [original[[1]], original[[4, 0]], original[[1, 3]]]
+        self.rdms.dissimilarities = original[::-1].copy()
+        self.rdms.sort_by(cond=[4, 3, 2, 1, 0])
+        self.rdms.append(self.rdms[0])
+        for view, vectors in zip(views, expected):
+            assert_array_equal(view.dissimilarities, vectors)
+            self.assertEqual(view.n_cond, 5)
+        self.assertEqual(views[1].rdm_descriptors['session'], [2, 0])
+        for view, vectors in zip(views, expected):
+            assert_array_equal(view.get_ranks(), rank_data(vectors, axis=1))
+
+    def test_subset_subsample(self):
+        rdms_subset = self.rdms.subset('session', [0, 2])
+        assert_array_equal(rdms_subset.dissimilarities,
+                           self.rdms.dissimilarities[[0, 1, 4, 5]])
+        self.assertEqual(rdms_subset.rdm_descriptors['index'], [0, 1, 4, 5])
+        self.assertIs(rdms_subset.pattern_descriptors,
+                      self.rdms.pattern_descriptors)
+        rdms_sample = self.rdms.subsample('session', [2, 2])
+        self.assertEqual(rdms_sample.n_rdm, 4)
+        self.assertEqual(rdms_sample.rdm_descriptors['index'], [4, 5, 4, 5])
+        self.assertEqual(self.rdms.subset('session', 3).n_rdm, 0)
+        nested = self.rdms[1:5][[0, 2]]
+        self.assertIs(nested._source, self.rdms.dissimilarities)
+        assert_array_equal(nested.dissimilarities,
+                           self.rdms.dissimilarities[[1, 3]])
+
+    def test_mutation(self):
+        import pickle
+        from copy import deepcopy
+        rdm = self.rdms[2]
+        rdm.dissimilarities = np.zeros((1, 10))
+        rdm.rdm_descriptors['session'] = [5]
+        self.assertTrue(np.all(self.rdms.dissimilarities[2] > 0))
+        self.assertEqual(self.rdms.rdm_descriptors['session'][2], 1)
+        self.assertEqual(rdm[0].rdm_descriptors['session'], [5])
+        rdms_subset = self.rdms.subset('session', 1)
+        rdms_subset.append(self.rdms[0])
+        self.assertEqual(rdms_subset.n_rdm, 3)
+        self.assertEqual(self.rdms.n_rdm, 6)
+        for copied in [deepcopy(rdms_subset),
+                       pickle.loads(pickle.dumps(rdms_subset))]:
+            self.assertIs(type(copied), rsr.RDMs)
+            assert_array_equal(copied.dissimilarities,
+                               rdms_subset.dissimilarities)
+
+
 if __name__ == '__main__':
     unittest.main()
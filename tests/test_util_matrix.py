@@ -45,6 +45,67 @@ class TestIndicator(unittest.TestCase):
         self.assertEqual(n_row, 10)
         self.assertEqual(n_col, 10)
 
+    def test_centering_operator(self):
+        H = rsu.matrix.centering(10)
+        operator = rsu.matrix.centering_operator(10)
+        X = np.random.randn(10, 3)
+        np.testing.assert_allclose(operator @ X, H @ X)
+        np.testing.assert_allclose(operator.matvec(X[:, 0]), H @ X[:, 0])
+        np.testing.assert_allclose(operator.rmatvec(X[:, 0]), H @ X[:, 0])
+
+    def test_pairwise_sparse(self):
+        a = np.array([3, 1, 1, 2, 3, 0, 0, 2, 5])
+        X = rsu.matrix.pairwise_contrast_sparse(a)
+        self.assertEqual(X.shape, (10, 9))
+        self.assertEqual(X.nnz, 36)
+        c_unique = np.unique(a)
+        n_row = 0
+        for i in range(5):
+            for j in range(i + 1, 5):
+                expected = (a == c_unique[i]) / np.sum(a == c_unique[i]) \
+                    - (a == c_unique[j]) / np.sum(a == c_unique[j])
+                np.testing.assert_allclose(X[n_row].toarray()[0], expected)
+                n_row += 1
+
+    def test_row_col_indicator_sparse(self):
+        n_cond = 6
+        G = np.random.randn(n_cond, n_cond)
+        G = G + G.T
+        row_i, col_i = rsu.matrix.row_col_indicator_g_sparse(n_cond)
+        rows, cols = np.triu_indices(n_cond, 1)
+        np.testing.assert_allclose(
+            np.sum(col_i.multiply(row_i @ G), axis=1).A1,
+            np.concatenate((G[rows, cols], np.diag(G))))
+        row_i, col_i = rsu.matrix.row_col_indicator_rdm_sparse(n_cond)
+        self.assertEqual(row_i.nnz, 15)
+        row_dense, col_dense = rsu.matrix.row_col_indicator_rdm(n_cond)
+        np.testing.assert_array_equal(row_i.toarray(), row_dense)
+        np.testing.assert_array_equal(col_i.toarray(), col_dense)
+
+    def test_v_solver(self):
+        n_cond = 7
+        n_dist = n_cond * (n_cond - 1) // 2
+        sigma_k = np.random.randn(n_cond, n_cond)
+        sigma_k = sigma_k @ sigma_k.T + np.eye(n_cond)
+        nan_idx = np.ones(n_dist, bool)
+        nan_idx[[2, 9, 10]] = False
+        for sigma in [None, np.random.rand(n_cond) + 0.5, sigma_k]:
+            for valid in [None, nan_idx]:
+                solver = rsu.matrix.get_v_solver(n_cond, sigma, valid)
+                if valid is None:
+                    valid = np.ones(n_dist, bool)
+                if sigma is not None and sigma.ndim == 1:
+                    sigma = np.diag(sigma)
+                v = rsu.matrix.get_v(n_cond, sigma).toarray()
+                v = v[valid][:, valid]
+                vectors = np.random.randn(3, np.sum(valid))
+                np.testing.assert_allclose(
+                    solver.solve(vectors) @ v, vectors, atol=1e-10)
+                np.testing.assert_allclose(
+                    solver.solve(vectors[0]), solver.solve(vectors)[0])
+        self.assertIs(rsu.matrix.get_v_solver(n_cond, sigma_k.copy()),
+                      rsu.matrix.get_v_solver(n_cond, sigma_k))
+
 
 if __name__ == '__main__':
     unittest.main()
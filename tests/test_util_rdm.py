@@ -31,6 +31,22 @@ class TestRdmUtils(unittest.TestCase):
         assert n_rdm == 8
         assert n_cond == 5
 
+    def test_rank_data(self):
+        from scipy.stats import rankdata
+        from rsatoolbox.util.rdm_utils import rank_data
+        values = np.random.randint(0, 5, size=(3, 10, 4)).astype(float)
+        values[0, [2, 5], 1] = np.nan
+        for method in ['average', 'min', 'max', 'dense', 'ordinal']:
+            ranks = rank_data(values, axis=1, method=method)
+            self.assertEqual(ranks.shape, values.shape)
+            for i in range(3):
+                for j in range(4):
+                    valid = ~np.isnan(values[i, :, j])
+                    np.testing.assert_array_equal(
+                        ranks[i, valid, j],
+                        rankdata(values[i, valid, j], method=method))
+                    assert np.all(np.isnan(ranks[i, ~valid, j]))
+
 class TestPoolRDM(unittest.TestCase):
 
     def test_pool_standard(self):